@@ -14,11 +14,14 @@ done
 
 # Run database migrations
 python ./manage.py migrate
+python ./manage.py createcachetable
 
 if [ "$DJANGO_RUN_ENV" = "dev" ]; then
   # Load fixtures, only in dev environment.
   echo "Loading sample data set..."
   python ./manage.py loaddata sample_data
+  # Fixtures load without signals, so build the report summaries from them.
+  python ./manage.py rebuild_summaries
 
   # Create default superuser for dev environment, using django env vars.
   # Logs will show error if this exists, which is OK.
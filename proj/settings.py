@@ -1,5 +1,6 @@
 import locale
 import os
+import tempfile
 
 
 locale.setlocale(locale.LC_ALL, ("en_US", "UTF-8"))
@@ -49,12 +50,14 @@ CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
 MIDDLEWARE = [
+    "terra.query_budget.QueryBudgetMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "terra.access.AccessMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -96,6 +99,20 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Shared by all gunicorn workers, e.g. for the org tree version stamp.
+# The database cache table is created by "manage.py createcachetable".
+
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "DJANGO_CACHE_BACKEND", "django.core.cache.backends.db.DatabaseCache"
+        ),
+        "LOCATION": os.getenv("DJANGO_CACHE_LOCATION", "terra_cache"),
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -154,3 +171,39 @@ DEFAULT_AUTO_FIELD = "django.db.models.AutoField"
 LOGIN_REDIRECT_URL = "/"
 
 INCEPTION_DATE = 2019
+
+# Fiscal years past the current one to precompute dates for; see
+# terra.utils.FiscalCalendar.
+FISCAL_CALENDAR_HORIZON = int(os.getenv("DJANGO_FISCAL_CALENDAR_HORIZON", "10"))
+
+# Read report totals from the FiscalYearSummary table instead of aggregating
+# the raw travel data. Run "python manage.py rebuild_summaries" first.
+REPORT_SUMMARIES = os.getenv("DJANGO_REPORT_SUMMARIES") in ["true", "True"]
+
+# Seconds to keep a cached report page's rows. Edits retire cached reports
+# as soon as they are committed; see terra.report_cache.
+REPORT_CACHE_TIMEOUT = int(os.getenv("DJANGO_REPORT_CACHE_TIMEOUT", "3600"))
+
+# Serve the report built before the latest edit while a fresh one is built
+# in the background, rather than making the request wait for it.
+REPORT_SERVE_STALE = os.getenv("DJANGO_REPORT_SERVE_STALE") in ["true", "True"]
+
+# Workers on one host take a lock file here while building a report, so
+# concurrent requests for it wait for that one build instead of repeating it.
+REPORT_LOCK_DIR = os.getenv("DJANGO_REPORT_LOCK_DIR", tempfile.gettempdir())
+
+# Seconds to wait for another worker's build before building anyway.
+REPORT_LOCK_TIMEOUT = int(os.getenv("DJANGO_REPORT_LOCK_TIMEOUT", "60"))
+
+# Log each request's query count, repeated queries and database time to the
+# terra.query_budget logger; see terra.query_budget.
+QUERY_BUDGET_LOG = os.getenv("DJANGO_QUERY_BUDGET_LOG") in ["true", "True"]
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "terra.query_budget": {"handlers": ["console"], "level": "INFO"},
+    },
+}
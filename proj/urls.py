@@ -86,6 +86,18 @@ urlpatterns = [
         EmployeeDetailExportView.as_view(),
         name="employee_detail_csv",
     ),
+    path(
+        "employee/<int:pk>/<int:start_year>-<int:end_year>/by_year/",
+        EmployeeDetailView.as_view(
+            template_name="terra/employee_by_year.html", by_year=True
+        ),
+        name="employee_by_year",
+    ),
+    path(
+        "employee/<int:pk>/<int:start_year>-<int:end_year>/by_year/export/",
+        EmployeeDetailExportView.as_view(by_year=True),
+        name="employee_by_year_csv",
+    ),
     path(
         "treq/<int:pk>/",
         TreqDetailView.as_view(template_name="terra/treq.html"),
@@ -101,6 +113,16 @@ urlpatterns = [
         UnitExportView.as_view(),
         name="unit_csv",
     ),
+    path(
+        "unit/<int:pk>/<int:start_year>-<int:end_year>/by_year/",
+        UnitDetailView.as_view(template_name="terra/unit_by_year.html", by_year=True),
+        name="unit_by_year",
+    ),
+    path(
+        "unit/<int:pk>/<int:start_year>-<int:end_year>/by_year/export/",
+        UnitExportView.as_view(by_year=True),
+        name="unit_by_year_csv",
+    ),
     path(
         "unit/<int:pk>/<int:start_year>-<int:end_year>/org_export/",
         UnitOrgExportView.as_view(),
@@ -121,6 +143,16 @@ urlpatterns = [
         FundDetailView.as_view(template_name="terra/fund.html"),
         name="fund_detail",
     ),
+    path(
+        "fund/<int:pk>/<int:start_year>-<int:end_year>/by_year/",
+        FundDetailView.as_view(template_name="terra/fund_by_year.html", by_year=True),
+        name="fund_by_year",
+    ),
+    path(
+        "fund/<int:pk>/<int:start_year>-<int:end_year>/by_year/export/",
+        FundExportView.as_view(by_year=True),
+        name="fund_by_year_csv",
+    ),
     path(
         "fund/",
         FundListView.as_view(template_name="terra/fund_list.html"),
@@ -0,0 +1,100 @@
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.db.models import Exists, OuterRef, Q
+from django.utils.functional import SimpleLazyObject, cached_property
+
+from .models import MANAGED_SUBTREE_SQL, Employee, Fund, Unit
+from .orgtree import get_org_tree
+
+
+class Access:
+    """
+    What the current user may see, worked out once per request. The roles
+    come from a single query; the manageable unit and employee ids are only
+    looked up when a view asks for them.
+    """
+
+    def __init__(self, user):
+        self.employee = None
+        self.full_access = False
+        self.is_ul = False
+        self.is_unit_manager = False
+        self.is_fund_manager = False
+        if not user.is_authenticated:
+            return
+        self.employee = (
+            Employee.objects.select_related("user")
+            .annotate(
+                lbs_staff=Exists(
+                    Group.objects.filter(user=OuterRef("user"), name="LBS Staff")
+                ),
+                manages_unit=Exists(Unit.objects.filter(manager=OuterRef("pk"))),
+                manages_fund=Exists(Fund.objects.filter(manager=OuterRef("pk"))),
+            )
+            .filter(user=user)
+            .first()
+        )
+        if self.employee is None:
+            return
+        # Superusers and members of LBS Staff have full access to reports.
+        self.full_access = user.is_superuser or self.employee.lbs_staff
+        self.is_ul = self.employee.type == "ULBR"
+        self.is_unit_manager = self.employee.manages_unit
+        self.is_fund_manager = self.employee.manages_fund
+
+    @cached_property
+    def unit_ids(self):
+        # Units the employee manages, directly or through a parent unit.
+        if not self.is_unit_manager:
+            return set()
+        tree = get_org_tree()
+        if tree is not None:
+            return tree.managed_units(self.employee.pk)
+        with connection.cursor() as cursor:
+            cursor.execute(MANAGED_SUBTREE_SQL, [self.employee.pk])
+            return {row[0] for row in cursor.fetchall()}
+
+    @cached_property
+    def employee_ids(self):
+        # The employee, their direct reports and the staff of their units.
+        if self.employee is None:
+            return set()
+        tree = get_org_tree()
+        if tree is not None:
+            ids = {self.employee.pk}
+            ids.update(tree.reports.get(self.employee.pk, []))
+            for unit_id in self.unit_ids:
+                ids.update(tree.staff.get(unit_id, []))
+            return ids
+        return {self.employee.pk} | set(
+            Employee.objects.filter(
+                Q(supervisor=self.employee) | Q(unit__in=self.unit_ids)
+            ).values_list("id", flat=True)
+        )
+
+    def can_view_unit(self, unit_id):
+        return self.full_access or unit_id in self.unit_ids
+
+    def can_view_employee(self, employee_id):
+        return self.full_access or employee_id in self.employee_ids
+
+    def can_view_treq(self, treq):
+        if self.can_view_employee(treq.traveler_id):
+            return True
+        # Fund managers see the requests their funds paid for.
+        if not self.is_fund_manager:
+            return False
+        funds = Fund.objects.filter(manager=self.employee)
+        return (
+            treq.funding_set.filter(fund__in=funds).exists()
+            or treq.actualexpense_set.filter(fund__in=funds).exists()
+        )
+
+
+class AccessMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.access = SimpleLazyObject(lambda: Access(request.user))
+        return self.get_response(request)
@@ -1,6 +1,9 @@
+from decimal import Decimal
+
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-
+from django.db.models import Count, DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 
 from .models import (
     Unit,
@@ -12,6 +15,7 @@ from .models import (
     Funding,
     ActualExpense,
 )
+from .utils import format_currency
 
 
 def custom_titled_filter(title):
@@ -24,6 +28,22 @@ def custom_titled_filter(title):
     return Wrapper
 
 
+def treq_sum(model, field):
+    # Total of field over the rows of model belonging to each travel request.
+    # A subquery per total keeps funding and expense rows from multiplying.
+    total = (
+        model.objects.filter(treq=OuterRef("pk"))
+        .values("treq")
+        .annotate(total=Sum(field))
+        .values("total")
+    )
+    return Coalesce(
+        Subquery(total),
+        Value(Decimal(0)),
+        output_field=DecimalField(max_digits=10, decimal_places=5),
+    )
+
+
 # Class to add fields to admin user creation popup form
 class UserAdmin(UserAdmin):
     UserAdmin.add_fieldsets = (
@@ -56,13 +76,22 @@ class ActualExpenseInline(admin.TabularInline):
     autocomplete_fields = ["fund"]
 
 
+@admin.display(description="Employee count", ordering="num_employees")
+def employee_count(obj):
+    return obj.num_employees
+
+
 @admin.register(Unit)
 class UnitAdmin(admin.ModelAdmin):
-    list_display = ("name", "manager", "employee_count", "parent_unit")
+    list_display = ("name", "manager", employee_count, "parent_unit")
+    list_select_related = ("manager__user", "parent_unit")
     list_filter = (("parent_unit", custom_titled_filter("parent unit")),)
     search_fields = ["name"]
     autocomplete_fields = ["manager", "parent_unit"]
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(num_employees=Count("employee"))
+
 
 @admin.register(Employee)
 class EmployeeAdmin(admin.ModelAdmin):
@@ -77,37 +106,31 @@ class EmployeeAdmin(admin.ModelAdmin):
         "active",
     )
     list_display_links = ("uid", "name")
+    list_select_related = ("user", "unit", "supervisor__user")
     list_filter = ("active", "type")
     search_fields = ["user__last_name", "user__first_name", "unit__name"]
     autocomplete_fields = ["supervisor", "unit", "user"]
 
 
 # Functions to rename travelrequest list columns
-@admin.display(
-    description="Days Out"
-)
+@admin.display(description="Days Out", ordering="days_ooo")
 def days_ooo(obj):
     return obj.days_ooo
 
 
+@admin.display(boolean=True, ordering="funding_total")
+def funded(obj):
+    return obj.funding_total > 0
 
 
-@admin.display(
-    description="Funding"
-)
+@admin.display(description="Funding", ordering="funding_total")
 def approved_total(obj):
-    return obj.approved_total()
-
-
+    return format_currency(obj.funding_total)
 
 
-@admin.display(
-    description="Actual"
-)
+@admin.display(description="Actual", ordering="expense_total")
 def expenditures_total(obj):
-    return obj.expenditures_total()
-
-
+    return format_currency(obj.expense_total)
 
 
 @admin.register(TravelRequest)
@@ -121,11 +144,12 @@ class TravelRequestAdmin(admin.ModelAdmin):
         "administrative",
         "canceled",
         "approved",
-        "funded",
+        funded,
         "closed",
         approved_total,
         expenditures_total,
     )
+    list_select_related = ("traveler__user", "activity")
     list_filter = (
         ("departure_date", custom_titled_filter("departure date")),
         ("return_date", custom_titled_filter("return date")),
@@ -142,6 +166,16 @@ class TravelRequestAdmin(admin.ModelAdmin):
     autocomplete_fields = ["activity", "approved_by", "traveler"]
     inlines = (FundingInline, ActualExpenseInline)
 
+    def get_queryset(self, request):
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(
+                funding_total=treq_sum(Funding, "amount"),
+                expense_total=treq_sum(ActualExpense, "total"),
+            )
+        )
+
 
 @admin.register(Activity)
 class ActivityAdmin(admin.ModelAdmin):
@@ -159,6 +193,7 @@ class ActivityAdmin(admin.ModelAdmin):
 @admin.register(Vacation)
 class VacationAdmin(admin.ModelAdmin):
     list_display = ("id", "treq", "start", "end")
+    list_select_related = ("treq__traveler__user", "treq__activity")
     list_filter = (
         ("start", custom_titled_filter("start date")),
         ("end", custom_titled_filter("end date")),
@@ -174,6 +209,7 @@ class VacationAdmin(admin.ModelAdmin):
 @admin.register(Fund)
 class FundAdmin(admin.ModelAdmin):
     list_display = ("__str__", "manager")
+    list_select_related = ("manager__user",)
     search_fields = [
         "account",
         "cost_center",
@@ -187,6 +223,12 @@ class FundAdmin(admin.ModelAdmin):
 @admin.register(Funding)
 class FundingAdmin(admin.ModelAdmin):
     list_display = ("id", "treq", "fund", "funded_by", "funded_on", "amount")
+    list_select_related = (
+        "treq__traveler__user",
+        "treq__activity",
+        "fund",
+        "funded_by__user",
+    )
     list_filter = ("fund", ("funded_on", custom_titled_filter("funding date")))
     search_fields = [
         "treq__traveler__user__last_name",
@@ -199,6 +241,7 @@ class FundingAdmin(admin.ModelAdmin):
 @admin.register(ActualExpense)
 class ActualExpenseAdmin(admin.ModelAdmin):
     list_display = ("id", "treq", "fund", "type", "total_dollars", "date_paid")
+    list_select_related = ("treq__traveler__user", "treq__activity", "fund")
     list_filter = ("type", "fund")
     search_fields = [
         "treq__traveler__user__last_name",
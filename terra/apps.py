@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class TerraConfig(AppConfig):
     name = "terra"
+
+    def ready(self):
+        from . import signals  # noqa: F401
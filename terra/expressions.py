@@ -0,0 +1,68 @@
+from django.db.models import Func, IntegerField
+
+from .utils import FISCAL_YEAR_START_MONTH
+
+
+class FiscalYear(Func):
+    """
+    The fiscal year a date falls in, computed in the database: dates from
+    FISCAL_YEAR_START_MONTH on belong to the fiscal year ending the next
+    calendar year.
+    Only uses immutable SQL, so it can back generated columns and indexes.
+    """
+
+    arity = 1
+    output_field = IntegerField()
+
+    def months(self):
+        # Shifting a date this far forward lands it in its fiscal year.
+        return 13 - FISCAL_YEAR_START_MONTH
+
+    def as_sql(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler,
+            connection,
+            template=f"CAST(EXTRACT(YEAR FROM %(expressions)s + "
+            f"INTERVAL '{self.months()} months') AS integer)",
+            **extra_context,
+        )
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler,
+            connection,
+            template=f"CAST(substr(date(%(expressions)s, "
+            f"'+{self.months()} months'), 1, 4) AS integer)",
+            **extra_context,
+        )
+
+
+class InclusiveDays(Func):
+    """
+    Days from start through end, counting both, computed in the database.
+    """
+
+    arity = 2
+    output_field = IntegerField()
+
+    def __init__(self, start, end, **extra):
+        # Compiled as end - start.
+        super().__init__(end, start, **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler,
+            connection,
+            template="(%(expressions)s + 1)",
+            arg_joiner=" - ",
+            **extra_context,
+        )
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler,
+            connection,
+            template="CAST(julianday(%(expressions)s) + 1 AS integer)",
+            arg_joiner=") - julianday(",
+            **extra_context,
+        )
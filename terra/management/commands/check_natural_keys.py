@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from terra.models import Activity, Fund, TravelRequest
+
+
+def _duplicates(model, fields):
+    # The ids of each set of rows that share a natural key.
+    groups = (
+        model.objects.values(*fields)
+        .annotate(count=Count("id"))
+        .filter(count__gt=1)
+        .order_by()
+    )
+    for group in groups:
+        key = {field: group[field] for field in fields}
+        yield list(
+            model.objects.filter(**key).order_by("id").values_list("id", flat=True)
+        )
+
+
+def _has_constraint(model, name):
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            # SQLite's introspection can't parse the generated fiscal_year
+            # column, and Django writes these constraints into the table SQL.
+            cursor.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = %s",
+                [model._meta.db_table],
+            )
+            return f'CONSTRAINT "{name}"' in cursor.fetchone()[0]
+        constraints = connection.introspection.get_constraints(
+            cursor, model._meta.db_table
+        )
+    return name in constraints
+
+
+def check_natural_keys(self, add_constraints):
+    """
+    Lists the rows that keep each natural-key constraint from being added,
+    and adds the missing constraints that nothing breaks any more.
+    """
+    problems = 0
+    for model in (Activity, Fund, TravelRequest):
+        for constraint in model._meta.constraints:
+            if _has_constraint(model, constraint.name):
+                continue
+            duplicates = list(_duplicates(model, constraint.fields))
+            for ids in duplicates:
+                self.stderr.write(
+                    f"\tERROR: {model._meta.verbose_name_plural} {ids} share "
+                    f"{', '.join(constraint.fields)}; merge or correct them"
+                )
+            if duplicates:
+                problems += 1
+            elif add_constraints:
+                with connection.schema_editor() as schema_editor:
+                    schema_editor.add_constraint(model, constraint)
+                self.stdout.write(f"Added {constraint.name}")
+            else:
+                problems += 1
+                self.stderr.write(
+                    f"\tERROR: {constraint.name} is missing; "
+                    "run with --add-constraints to add it"
+                )
+    if problems:
+        raise CommandError(f"{problems} natural-key constraints are missing")
+    self.stdout.write("All natural-key constraints are in place")
+
+
+class Command(BaseCommand):
+    help = (
+        "List activities, funds and travel requests that share a natural key, "
+        "which keep migration 0019 from adding its unique constraints"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--add-constraints",
+            action="store_true",
+            help="Add the constraints that no rows break any more",
+        )
+
+    def handle(self, *args, **options):
+        check_natural_keys(self, options["add_constraints"])
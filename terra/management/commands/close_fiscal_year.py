@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from terra.models import Employee, Fund, ReportSnapshot, Unit
+from terra.report_cache import closing, invalidate_reports
+from terra.reports import (
+    actual_expense_report,
+    employee_total_report,
+    fund_report,
+    merge_data_type,
+    unit_report,
+)
+from terra.utils import current_fiscal_year, fiscal_year_bookends
+
+
+def close_fiscal_year(fiscal_year):
+    """
+    Replaces the fiscal year's report snapshots with freshly computed ones:
+    every unit, fund and employee report, the Employee Type report and the
+    Actual Expense report. Returns the number of snapshots stored.
+    """
+    start_date, end_date = fiscal_year_bookends(fiscal_year)
+    employee_ids = list(Employee.objects.values_list("pk", flat=True))
+    with transaction.atomic():
+        with closing(fiscal_year) as snapshots:
+            for unit in Unit.objects.all():
+                unit_report(unit, start_date, end_date)
+                if unit.parent_unit_id is None:
+                    actual_expense_report(unit, start_date, end_date)
+            for fund in Fund.objects.all():
+                fund_report(fund, start_date, end_date)
+            merge_data_type(employee_ids, start_date, end_date)
+            for employee_id in employee_ids:
+                employee_total_report([employee_id], start_date, end_date)
+        ReportSnapshot.objects.filter(fiscal_year=fiscal_year).delete()
+        ReportSnapshot.objects.bulk_create(snapshots, batch_size=500)
+        # Cached reports may have been computed from the old snapshots.
+        invalidate_reports()
+    return len(snapshots)
+
+
+class Command(BaseCommand):
+    help = "Freeze the reports for closed fiscal years into snapshots"
+
+    def add_arguments(self, parser):
+        parser.add_argument("fiscal_years", nargs="*", type=int)
+        parser.add_argument(
+            "--stale",
+            action="store_true",
+            help="Also close again every year with snapshots edits have made stale",
+        )
+        parser.add_argument(
+            "--reopen",
+            action="store_true",
+            help="Drop the years' snapshots, so their reports use the travel data",
+        )
+
+    def handle(self, *args, **options):
+        fiscal_years = set(options["fiscal_years"])
+        if options["stale"]:
+            fiscal_years.update(
+                ReportSnapshot.objects.filter(stale=True).values_list(
+                    "fiscal_year", flat=True
+                )
+            )
+        if not fiscal_years and not options["stale"]:
+            raise CommandError("Give the fiscal years to close, or --stale")
+        for fiscal_year in sorted(fiscal_years):
+            if fiscal_year >= current_fiscal_year() and not options["reopen"]:
+                raise CommandError(f"FY{fiscal_year} has not ended yet")
+            if options["reopen"]:
+                with transaction.atomic():
+                    ReportSnapshot.objects.filter(fiscal_year=fiscal_year).delete()
+                    invalidate_reports()
+                self.stdout.write(f"Reopened FY{fiscal_year}")
+            else:
+                count = close_fiscal_year(fiscal_year)
+                self.stdout.write(f"Closed FY{fiscal_year}: {count} snapshots")
@@ -1,56 +1,139 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
-from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
 from terra.models import Employee, Unit, EMPLOYEE_TYPES
+from terra.orgtree import invalidate_org_tree
+from terra.report_cache import invalidate_reports
 
-import csv
+import csv, time
 
 
-def create_employees(self, employee_file):
+def load_employees(self, employee_file):
     """
-    Does initial creation of Employees, and their underlying Users.
+    Creates Employees and their underlying Users, then sets supervisors, in
+    one pass over the file. Units, users and employees are read into maps up
+    front, so the load runs a fixed number of queries however long the file.
+    Rows that can't be loaded and supervisors that can't be found are
+    collected into one report at the end.
     """
+    started = time.monotonic()
     self.stdout.write(f"Parsing {employee_file}")
     # Windows-derived CSV has leading BOM, so specify utf-8-sig, not utf-8
     with open(employee_file, encoding="utf-8-sig", newline="") as csvfile:
         reader = csv.DictReader(csvfile, dialect="excel")
         # Field names from CSV, for reference:
         # ['department_code', 'employee_name', 'employee_id', 'ucla_id', 'email', job_code', 'job_code_desc', 'job_class_description', 'supervisor', 'department', 'aul_ul']
+        rows = []
         for row in reader:
-            # Get relevant data from CSV
-            department = row["department"]
-            email = row["email"]
-            employee_name = row["employee_name"]
-            ucla_id = row["ucla_id"]
-            staff_type = row["staff_type"]
-
-            self.stdout.write(f"\tProcessing {employee_name}...")
-
-            # User & Employee
-            user = _get_user(employee_name, email)
-            # Employees must have units; fetch from database
-            unit = Unit.objects.get(name__exact=department)
-            employee = _get_employee(user, ucla_id, unit, staff_type)
-
-
-def _get_user(employee_name, email):
-    # Employees are based on Users, so create user first.
-    # Use the email name as username for now, with unusable password.
-    username = email.split("@")[0]
-    # Users might already exist, via small initial load
-    user, created = User.objects.get_or_create(username=username, email=email)
-    # Add first/last name to the user
-    user.last_name, user.first_name = _split_name(employee_name)
-    user.save()
-    return user
-
-
-def _get_employee(user, ucla_id, unit, staff_type):
-    staff_type = _get_employee_type_key(staff_type)
-    employee, created = Employee.objects.get_or_create(
-        user=user, uid=ucla_id, unit=unit, type=staff_type
+            # Don't include CSV header rows in line number
+            row["line_num"] = reader.line_num - 1
+            rows.append(row)
+
+    errors = []
+    with transaction.atomic():
+        units = {unit.name: unit for unit in Unit.objects.all()}
+        users = {user.username: user for user in User.objects.all()}
+        users_by_id = {user.pk: user for user in users.values()}
+        employees = {}
+        for employee in Employee.objects.all():
+            # Share the user instances, so renames below show up in names.
+            employee.user = users_by_id[employee.user_id]
+            employees[employee.user.username] = employee
+        uids = {employee.uid for employee in employees.values()}
+
+        new_users = []
+        renamed_users = {}
+        new_employees = []
+        changed_employees = {}
+        loaded = []
+        for row in rows:
+            try:
+                last_name, first_name = _split_name(row["employee_name"])
+                staff_type = _get_employee_type_key(row["staff_type"])
+            except ValueError:
+                message = f"can't read {row['employee_name']} ({row['staff_type']})"
+                errors.append((row["line_num"], message))
+                continue
+            username = row["email"].split("@")[0]
+            user = users.get(username)
+            employee = employees.get(username)
+            unit = units.get(row["department"])
+            error = None
+            if unit is None:
+                error = f"unit {row['department']} not found"
+            elif user is not None and user.email != row["email"]:
+                error = f"user {username} already exists with email {user.email}"
+            elif employee is not None and employee.uid != row["ucla_id"]:
+                error = f"{username} already exists with UCLA id {employee.uid}"
+            elif employee is None and row["ucla_id"] in uids:
+                error = f"UCLA id {row['ucla_id']} belongs to another employee"
+            if error:
+                errors.append((row["line_num"], error))
+                continue
+
+            if user is None:
+                user = users[username] = User(username=username, email=row["email"])
+                new_users.append(user)
+            elif (user.last_name, user.first_name) != (last_name, first_name):
+                renamed_users[username] = user
+            user.last_name = last_name
+            user.first_name = first_name
+
+            if employee is None:
+                employee = employees[username] = Employee(
+                    user=user, uid=row["ucla_id"], unit=unit, type=staff_type
+                )
+                uids.add(employee.uid)
+                new_employees.append(employee)
+            elif (employee.unit_id, employee.type) != (unit.pk, staff_type):
+                employee.unit = unit
+                employee.type = staff_type
+                changed_employees[username] = employee
+            loaded.append((row, employee))
+
+        User.objects.bulk_create(new_users)
+        User.objects.bulk_update(renamed_users.values(), ["last_name", "first_name"])
+        Employee.objects.bulk_create(new_employees)
+        new_names = {employee.user.username for employee in new_employees}
+
+        # Supervisors are named "Last, First"; resolve them against everyone
+        # employed once this file's rows are in.
+        names = {}
+        for employee in employees.values():
+            key = (employee.user.last_name, employee.user.first_name)
+            names.setdefault(key, []).append(employee)
+        for row, employee in loaded:
+            supervisor_name = row["supervisor"]
+            if not supervisor_name:
+                continue
+            try:
+                matches = names.get(_split_name(supervisor_name), [])
+            except ValueError:
+                matches = []
+            if len(matches) != 1:
+                problem = "is ambiguous" if matches else "not found"
+                errors.append(
+                    (row["line_num"], f"supervisor {supervisor_name} {problem}")
+                )
+            elif employee.supervisor_id != matches[0].pk:
+                employee.supervisor = matches[0]
+                changed_employees[employee.user.username] = employee
+        Employee.objects.bulk_update(
+            changed_employees.values(), ["unit", "type", "supervisor"]
+        )
+
+        # bulk_create skips the signals that keep these up to date.
+        invalidate_org_tree()
+        invalidate_reports()
+
+    for line_num, message in sorted(errors):
+        self.stderr.write(f"\tERROR: line {line_num}: {message}")
+    elapsed = time.monotonic() - started
+    self.stdout.write(
+        f"Loaded {len(loaded)} employees in {elapsed:.1f} seconds: "
+        f"{len(new_employees)} new, {len(changed_employees.keys() - new_names)} "
+        f"updated, {len(errors)} errors"
     )
-    return employee
 
 
 def _get_employee_type_key(value):
@@ -60,42 +143,6 @@ def _get_employee_type_key(value):
     return list(d.keys())[list(d.values()).index(value)]
 
 
-def add_supervisors(self, employee_file):
-    """
-    Adds supervisors to employees.
-    """
-    self.stdout.write("\nAdding supervisors...")
-    with open(employee_file, encoding="utf-8-sig", newline="") as csvfile:
-        reader = csv.DictReader(csvfile, dialect="excel")
-        for row in reader:
-            employee_name = row["employee_name"]
-            supervisor_name = row["supervisor"]
-            if supervisor_name:
-                self.stdout.write(f"Adding {supervisor_name} to {employee_name}")
-                supervisor = find_employee_by_name(self, supervisor_name)
-                employee = find_employee_by_name(self, employee_name)
-                employee.supervisor = supervisor
-                employee.save()
-            else:
-                self.stderr.write(f"\tNo supervisor found for {employee_name}")
-
-
-def find_employee_by_name(self, employee_name):
-    """
-    Find Employee with the given name, using data from the employees csv file.
-    """
-    last_name, first_name = _split_name(employee_name)
-    try:
-        employee = Employee.objects.get(
-            user=User.objects.get(
-                last_name__exact=last_name, first_name__exact=first_name
-            )
-        )
-        return employee
-    except ObjectDoesNotExist:
-        self.stderr.write(f"\tERROR: {employee_name} not found")
-
-
 def _split_name(employee_name):
     """
     Utility method for splitting 'Last, First' into 'Last' and 'First'.
@@ -112,5 +159,4 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         employee_file = options["employee_file"]
-        create_employees(self, employee_file)
-        add_supervisors(self, employee_file)
+        load_employees(self, employee_file)
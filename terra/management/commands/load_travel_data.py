@@ -1,204 +1,846 @@
-from django.core.management.base import BaseCommand
-from django.contrib.auth.models import User
-from django.core.exceptions import ObjectDoesNotExist
-from terra.models import (
-    Activity,
-    ActualExpense,
-    Funding,
-    Employee,
-    Fund,
-    TravelRequest,
-    Unit,
-)
-
-from datetime import datetime
-import csv, pytz
-
-
-def load_data(self, travel_file):
-    """
-    Loads historical data: everything except units and employees.
-    """
-    # For now, we need a fake employee to use as fund manager.
-    fund_manager = _create_placeholder_employee()
-    unit_head = fund_manager
-    self.stdout.write(f"Parsing {travel_file}")
-    # Windows-derived CSV has leading BOM, so specify utf-8-sig, not utf-8
-    with open(travel_file, encoding="utf-8-sig", newline="") as csvfile:
-        reader = csv.DictReader(csvfile, dialect="excel")
-        # Field names from CSV, for reference:
-        # employee_name,employee_id,ucla_id,email,start_date,end_date,workdays,vac_days,t_and_e,purpose,department,unit_head,supervisor,aul,account,cc,fund,amount_approved,amount_paid,date_paid
-        for row in reader:
-            # Get relevant data from CSV, with placeholders for now as needed
-            employee_name = row["employee_name"]
-            email = row["email"]
-            ucla_id = row["ucla_id"]
-            department = row["department"]
-            purpose = row["purpose"]
-            start_date = row["start_date"]
-            end_date = row["end_date"]
-            workdays = row["workdays"]
-            account = row["account"]
-            cost_center = row["cc"]
-            fund_part = row["fund"]
-            amount_approved = row["amount_approved"]
-            amount_paid = row["amount_paid"]
-            date_paid = row["date_paid"]
-
-            # Clean up bad input data
-            start_date = _convert_MDY(start_date)
-            end_date = _convert_MDY(end_date)
-            date_paid = _convert_MDY(date_paid)
-            if workdays == "":
-                workdays = 0
-
-            # Don't include CSV header rows in line number
-            line_num = reader.line_num - 1
-            self.stdout.write(f"\tProcessing row {line_num}...")
-
-            # User & Employee
-            user = _get_user(employee_name, email)
-            # Employees must have units; fetch from database
-            unit = Unit.objects.get(name__exact=department)
-            employee = _get_employee(user, ucla_id, unit)
-
-            # Activity
-            activity = _get_activity(purpose, start_date, end_date)
-
-            # Fund
-            fund = _get_fund(account, cost_center, fund_part, fund_manager)
-
-            # TravelRequest
-            treq = _get_treq(employee, activity, start_date, end_date, workdays)
-
-            # Funding
-            # start_date was changed from "naive" to "aware" above, to avoid warnings, but doesn't matter since Funding.funded_on is an automatic timestamp.....
-            if amount_approved != "":
-                funding = _get_funding(
-                    start_date, unit_head, treq, fund, amount_approved
-                )
-
-            # Expenses: Create only if data present, not blank
-            if amount_paid != "":
-                act_expense = _get_actual_expense(treq, amount_paid, fund, date_paid)
-
-
-def _get_user(employee_name, email):
-    # Employees are based on Users, so create user first.
-    # Use the email name as username for now, with unusable password.
-    username = email.split("@")[0]
-    # Users might already exist, via small initial load
-    user, created = User.objects.get_or_create(username=username, email=email)
-    # Add first/last name to the user
-    user.last_name, user.first_name = _split_name(employee_name)
-    user.save()
-    return user
-
-
-def _get_employee(user, ucla_id, unit):
-    # Create Employee only if needed - should have been created earlier.
-    try:
-        employee = Employee.objects.get(user=user, uid=ucla_id)
-    except ObjectDoesNotExist:
-        employee, created = Employee.objects.get_or_create(
-            user=user, uid=ucla_id, unit=unit
-        )
-    return employee
-
-
-def _get_activity(purpose, start_date, end_date):
-    activity, created = Activity.objects.get_or_create(
-        name=purpose, start=start_date, end=end_date
-    )
-    return activity
-
-
-def _get_fund(account, cost_center, fund_part, fund_manager):
-    fund, created = Fund.objects.get_or_create(
-        account=account, cost_center=cost_center, fund=fund_part, manager=fund_manager
-    )
-    return fund
-
-
-def _get_treq(employee, activity, start_date, end_date, workdays):
-    treq, created = TravelRequest.objects.get_or_create(
-        traveler=employee,
-        activity=activity,
-        departure_date=start_date,
-        return_date=end_date,
-        days_ooo=workdays,
-    )
-    return treq
-
-
-def _get_funding(funding_date, funded_by, treq, fund, amount_approved):
-    funding, created = Funding.objects.get_or_create(
-        funded_on=funding_date,
-        funded_by=funded_by,
-        treq=treq,
-        fund=fund,
-        amount=amount_approved,
-    )
-    return funding
-
-
-def _get_actual_expense(treq, amount, fund, date_paid):
-    # Create, without check for existing
-    expense = ActualExpense.objects.create(
-        treq=treq,
-        total=amount,
-        fund=fund,
-        type="OTH",
-        rate=1,
-        quantity=1,
-        date_paid=date_paid,
-    )
-    return expense
-
-
-def _convert_MDY(MDY_string):
-    """
-    Utility method for converting naive m/d/y strings to aware datetimes.
-    Forces time to noon, and applies America/LA time zone.
-    """
-    d = datetime.strptime(MDY_string + " 12", "%m/%d/%Y %H")
-    tz = pytz.timezone("America/Los_Angeles")
-    d = tz.localize(d)
-    return d
-
-
-def _split_name(employee_name):
-    """
-    Utility method for splitting 'Last, First' into 'Last' and 'First'.
-    """
-    last_name, first_name = [word.strip() for word in employee_name.split(",")]
-    return (last_name, first_name)
-
-
-def _create_placeholder_employee():
-    """
-    Creates fake Employee for use as a placeholder until data cleanup is finished.
-    """
-    fake_user, created = User.objects.get_or_create(
-        username="fakeuser",
-        email="fakeuser@example.com",
-        first_name="Fakey",
-        last_name="McFakester",
-    )
-    fake_employee, created = Employee.objects.get_or_create(
-        user=fake_user,
-        unit=Unit.objects.get(name__exact="Library Business Services"),
-        uid="000000000",
-    )
-    return fake_employee
-
-
-class Command(BaseCommand):
-    help = "Load historical travel data from CSV into database"
-
-    def add_arguments(self, parser):
-        parser.add_argument("travel_file")
-
-    def handle(self, *args, **options):
-        travel_file = options["travel_file"]
-        load_data(self, travel_file)
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import connection, transaction
+from django.utils import timezone
+from terra.models import (
+    Activity,
+    ActualExpense,
+    Funding,
+    Employee,
+    Fund,
+    ImportCheckpoint,
+    TravelRequest,
+    Unit,
+)
+from terra.orgtree import invalidate_org_tree
+from terra.report_cache import mark_snapshots_stale
+from terra.summaries import rebuild_summaries
+from terra.utils import current_fiscal_year
+
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+import csv, hashlib, os, pytz, time
+
+# Natural keys the bulk loader upserts on, matching the models' unique
+# constraints, and the fields a repeated load updates. Activities and funds
+# have nothing to update, so they rewrite a key field to get their ids back.
+ACTIVITY_UPSERT = (["name", "start", "end"], ["name"])
+FUND_UPSERT = (["account", "cost_center", "fund"], ["fund"])
+# Loaded trips are all professional development, not administrative.
+TREQ_UPSERT = (
+    ["traveler", "activity", "departure_date", "return_date", "administrative"],
+    ["days_ooo"],
+)
+
+
+# Set-based version of _load_chunk for --copy. Rows are staged in
+# travel_stage, one per CSV line with its traveler already resolved.
+STAGE_COLUMNS = (
+    "line_num, traveler_id, purpose, start_date, end_date, workdays, account, "
+    "cost_center, fund, amount_approved, amount_paid, date_paid"
+)
+STAGE_SQL = """
+CREATE TEMPORARY TABLE travel_stage (
+    line_num integer PRIMARY KEY,
+    traveler_id integer NOT NULL,
+    purpose varchar(128) NOT NULL,
+    start_date date NOT NULL,
+    end_date date NOT NULL,
+    workdays integer NOT NULL,
+    account varchar(6) NOT NULL,
+    cost_center varchar(2) NOT NULL,
+    fund varchar(5) NOT NULL,
+    amount_approved numeric(10, 5),
+    amount_paid numeric(10, 5),
+    date_paid date NOT NULL
+) ON COMMIT DROP
+"""
+COPY_SQL = [
+    """
+    INSERT INTO terra_activity
+        (name, start, "end", url, description, city, state, country)
+    SELECT DISTINCT purpose, start_date, end_date, '', '', '', '', 'USA'
+    FROM travel_stage
+    ON CONFLICT (name, start, "end") DO NOTHING
+    """,
+    """
+    INSERT INTO terra_fund (account, cost_center, fund, manager_id)
+    SELECT DISTINCT account, cost_center, fund, %(manager)s
+    FROM travel_stage
+    ON CONFLICT (account, cost_center, fund) DO NOTHING
+    """,
+    # As with update_or_create, the last line for a trip sets its days out.
+    """
+    INSERT INTO terra_travelrequest
+        (traveler_id, activity_id, departure_date, return_date, days_ooo, closed,
+         administrative, justification, note, canceled)
+    SELECT DISTINCT ON (s.traveler_id, a.id, s.start_date, s.end_date)
+        s.traveler_id, a.id, s.start_date, s.end_date, s.workdays, false,
+        false, '', '', false
+    FROM travel_stage s
+    JOIN terra_activity a
+        ON a.name = s.purpose AND a.start = s.start_date AND a."end" = s.end_date
+    ORDER BY s.traveler_id, a.id, s.start_date, s.end_date, s.line_num DESC
+    ON CONFLICT (traveler_id, activity_id, departure_date, return_date, administrative)
+    DO UPDATE SET days_ooo = EXCLUDED.days_ooo
+    """,
+    """
+    INSERT INTO terra_funding (funded_on, funded_by_id, treq_id, fund_id, amount, note)
+    SELECT %(now)s, %(manager)s, t.id, f.id, s.amount_approved, ''
+    FROM travel_stage s
+    JOIN terra_activity a
+        ON a.name = s.purpose AND a.start = s.start_date AND a."end" = s.end_date
+    JOIN terra_travelrequest t
+        ON t.traveler_id = s.traveler_id AND t.activity_id = a.id
+        AND t.departure_date = s.start_date AND t.return_date = s.end_date
+        AND NOT t.administrative
+    JOIN terra_fund f
+        ON f.account = s.account AND f.cost_center = s.cost_center
+        AND f.fund = s.fund
+    WHERE s.amount_approved IS NOT NULL
+    ORDER BY s.line_num
+    """,
+    """
+    INSERT INTO terra_actualexpense
+        (treq_id, type, rate, quantity, total, fund_id, date_paid, reimbursed)
+    SELECT t.id, 'OTH', 1, 1, s.amount_paid, f.id, s.date_paid, false
+    FROM travel_stage s
+    JOIN terra_activity a
+        ON a.name = s.purpose AND a.start = s.start_date AND a."end" = s.end_date
+    JOIN terra_travelrequest t
+        ON t.traveler_id = s.traveler_id AND t.activity_id = a.id
+        AND t.departure_date = s.start_date AND t.return_date = s.end_date
+        AND NOT t.administrative
+    JOIN terra_fund f
+        ON f.account = s.account AND f.cost_center = s.cost_center
+        AND f.fund = s.fund
+    WHERE s.amount_paid IS NOT NULL
+    ORDER BY s.line_num
+    """,
+]
+
+
+def load_data(self, travel_file):
+    """
+    Loads historical data: everything except units and employees.
+    """
+    # For now, we need a fake employee to use as fund manager.
+    fund_manager = _create_placeholder_employee()
+    unit_head = fund_manager
+    self.stdout.write(f"Parsing {travel_file}")
+    # Windows-derived CSV has leading BOM, so specify utf-8-sig, not utf-8
+    with open(travel_file, encoding="utf-8-sig", newline="") as csvfile:
+        reader = csv.DictReader(csvfile, dialect="excel")
+        # Field names from CSV, for reference:
+        # employee_name,employee_id,ucla_id,email,start_date,end_date,workdays,vac_days,t_and_e,purpose,department,unit_head,supervisor,aul,account,cc,fund,amount_approved,amount_paid,date_paid
+        for row in reader:
+            # Get relevant data from CSV, with placeholders for now as needed
+            employee_name = row["employee_name"]
+            email = row["email"]
+            ucla_id = row["ucla_id"]
+            department = row["department"]
+            purpose = row["purpose"]
+            start_date = row["start_date"]
+            end_date = row["end_date"]
+            workdays = row["workdays"]
+            account = row["account"]
+            cost_center = row["cc"]
+            fund_part = row["fund"]
+            amount_approved = row["amount_approved"]
+            amount_paid = row["amount_paid"]
+            date_paid = row["date_paid"]
+
+            # Clean up bad input data
+            start_date = _convert_MDY(start_date)
+            end_date = _convert_MDY(end_date)
+            date_paid = _convert_MDY(date_paid)
+            if workdays == "":
+                workdays = 0
+
+            # Don't include CSV header rows in line number
+            line_num = reader.line_num - 1
+            self.stdout.write(f"\tProcessing row {line_num}...")
+
+            # User & Employee
+            user = _get_user(employee_name, email)
+            # Employees must have units; fetch from database
+            unit = Unit.objects.get(name__exact=department)
+            employee = _get_employee(user, ucla_id, unit)
+
+            # Activity
+            activity = _get_activity(purpose, start_date, end_date)
+
+            # Fund
+            fund = _get_fund(account, cost_center, fund_part, fund_manager)
+
+            # TravelRequest
+            treq = _get_treq(employee, activity, start_date, end_date, workdays)
+
+            # Funding
+            # start_date was changed from "naive" to "aware" above, to avoid warnings, but doesn't matter since Funding.funded_on is an automatic timestamp.....
+            if amount_approved != "":
+                funding = _get_funding(
+                    start_date, unit_head, treq, fund, amount_approved
+                )
+
+            # Expenses: Create only if data present, not blank
+            if amount_paid != "":
+                act_expense = _get_actual_expense(treq, amount_paid, fund, date_paid)
+
+
+def load_data_bulk(
+    self, travel_file, batch_size=1000, chunk_size=5000, resume=False, error_file=None
+):
+    """
+    Loads the same data as load_data, committing chunk_size rows at a time.
+    Existing rows are found through in-memory lookups and new rows are
+    inserted with bulk_create. Each chunk records a checkpoint, so a failed
+    load can be resumed after the last committed line. Rows that can't be
+    loaded are reported and skipped, and retried when the load is resumed.
+    """
+    started = time.monotonic()
+    checkpoint = _get_checkpoint(travel_file, resume)
+    retry = set(checkpoint.skipped_lines)
+    rows, errors, last_line, digest = _read_rows(self, travel_file, checkpoint)
+    fund_manager = _create_placeholder_employee()
+    lookups = _load_lookups(rows)
+    loaded = 0
+    try:
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start : start + chunk_size]
+            with transaction.atomic():
+                chunk_loaded, chunk_errors = _load_chunk(
+                    chunk, lookups, fund_manager, batch_size
+                )
+                retry.difference_update(row["line_num"] for row in chunk)
+                _save_checkpoint(
+                    checkpoint,
+                    max(checkpoint.last_line, chunk[-1]["line_num"]),
+                    errors + chunk_errors,
+                    retry,
+                    digest,
+                )
+            loaded += chunk_loaded
+            errors.extend(chunk_errors)
+        _save_checkpoint(checkpoint, last_line, errors, retry, digest)
+    finally:
+        _report_errors(self, sorted(errors), error_file)
+
+    # bulk_create skips the signals that keep these up to date.
+    rebuild_summaries()
+    mark_snapshots_stale(_fiscal_years(rows))
+    invalidate_org_tree()
+
+    _report_rate(self, started, loaded, errors)
+
+
+def load_data_copy(self, travel_file, batch_size=1000, resume=False, error_file=None):
+    """
+    PostgreSQL-only variant of load_data_bulk for large backfills. Travelers
+    are resolved as in bulk mode, then the trips are staged in a temporary
+    table with COPY and inserted into the terra tables with a few set-based
+    statements, all in one transaction.
+    """
+    if connection.vendor != "postgresql":
+        raise CommandError("--copy needs a PostgreSQL database")
+    started = time.monotonic()
+    checkpoint = _get_checkpoint(travel_file, resume)
+    rows, errors, last_line, digest = _read_rows(self, travel_file, checkpoint)
+    fund_manager = _create_placeholder_employee()
+    try:
+        with transaction.atomic():
+            rows, traveler_errors = _resolve_travelers(
+                rows, _load_lookups(rows), batch_size
+            )
+            errors.extend(traveler_errors)
+            with connection.cursor() as cursor:
+                cursor.execute(STAGE_SQL)
+                with cursor.copy(
+                    f"COPY travel_stage ({STAGE_COLUMNS}) FROM STDIN"
+                ) as copy:
+                    for row in rows:
+                        copy.write_row(
+                            [
+                                row["line_num"],
+                                row["employee"].pk,
+                                row["purpose"],
+                                row["start"],
+                                row["end"],
+                                row["workdays"],
+                                row["account"],
+                                row["cost_center"],
+                                row["fund_part"],
+                                row["amount_approved"],
+                                row["amount_paid"],
+                                row["date_paid"],
+                            ]
+                        )
+                params = {"manager": fund_manager.pk, "now": timezone.now()}
+                for sql in COPY_SQL:
+                    cursor.execute(sql, params)
+                # ON COMMIT DROP doesn't fire when called inside a transaction.
+                cursor.execute("DROP TABLE travel_stage")
+            _save_checkpoint(checkpoint, last_line, errors, set(), digest)
+    finally:
+        _report_errors(self, sorted(errors), error_file)
+
+    # The inserts skip the signals that keep these up to date.
+    rebuild_summaries()
+    mark_snapshots_stale(_fiscal_years(rows))
+    invalidate_org_tree()
+    _report_rate(self, started, len(rows), errors)
+
+
+def _read_rows(self, travel_file, checkpoint):
+    """
+    Parses the lines after the checkpoint and the lines it skipped, returning
+    the parsed rows, the (line, error) pairs for lines that couldn't be
+    parsed, the last line, and the file's _FileDigest.
+    """
+    retry = set(checkpoint.skipped_lines)
+    if checkpoint.last_line:
+        self.stdout.write(
+            f"Resuming {travel_file} after line {checkpoint.last_line}, "
+            f"retrying {len(retry)} skipped lines"
+        )
+    else:
+        self.stdout.write(f"Parsing {travel_file}")
+    rows = []
+    errors = []
+    last_line = checkpoint.last_line
+    digest = _FileDigest()
+    with open(travel_file, encoding="utf-8-sig", newline="") as csvfile:
+        reader = csv.DictReader(csvfile, dialect="excel")
+        for row in reader:
+            last_line = reader.line_num - 1
+            loaded = last_line <= checkpoint.last_line and last_line not in retry
+            digest.add(last_line, row, keep=not loaded)
+            if loaded:
+                continue
+            try:
+                rows.append(_parse_row(row, last_line))
+            except (KeyError, ValueError) as e:
+                errors.append((last_line, f"{type(e).__name__}: {e}"))
+    return rows, errors, last_line, digest
+
+
+class _FileDigest:
+    """
+    Stands for a travel file's lines, less the ones a load skipped, so a
+    checkpoint can tell whether it is resuming the same file. Line digests
+    are combined with XOR, so skipped lines can be taken out again without
+    rereading the file; keep the digests of the lines that may be skipped.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.lines = {}
+
+    def add(self, line_num, row, keep=True):
+        data = repr((line_num, list(row.values()))).encode()
+        line_digest = int.from_bytes(hashlib.sha256(data).digest()[:8], "big")
+        self.total ^= line_digest
+        if keep:
+            self.lines[line_num] = line_digest
+
+    def hexdigest(self, skipped):
+        total = self.total
+        for line_num in skipped:
+            total ^= self.lines.get(line_num, 0)
+        return f"{total:016x}"
+
+
+def _file_hash(travel_file, skipped):
+    digest = _FileDigest()
+    with open(travel_file, encoding="utf-8-sig", newline="") as csvfile:
+        reader = csv.DictReader(csvfile, dialect="excel")
+        for row in reader:
+            line_num = reader.line_num - 1
+            digest.add(line_num, row, keep=line_num in skipped)
+    return digest.hexdigest(skipped)
+
+
+def _fiscal_years(rows):
+    # Trips count in the fiscal year they return in, expenses in the one
+    # they were paid in.
+    return {
+        current_fiscal_year(day)
+        for row in rows
+        for day in (row["end"], row["date_paid"])
+    }
+
+
+def _report_rate(self, started, loaded, errors):
+    elapsed = time.monotonic() - started
+    self.stdout.write(
+        f"Loaded {loaded} rows in {elapsed:.1f} seconds "
+        f"({loaded / max(elapsed, 0.001):.0f} rows/sec), "
+        f"skipped {len(errors)} rows with errors"
+    )
+
+
+def _get_checkpoint(travel_file, resume):
+    # Checkpoints are kept per file path, and hold a hash of the lines that
+    # weren't skipped. A file whose bad lines were fixed after a load picks
+    # up where that load left off, but a different file at the same path
+    # doesn't.
+    checkpoint, created = ImportCheckpoint.objects.get_or_create(
+        file_name=os.path.abspath(travel_file)
+    )
+    if checkpoint.last_line and not resume:
+        raise CommandError(
+            f"{travel_file} was already loaded through line "
+            f"{checkpoint.last_line}; use --resume to continue it"
+        )
+    if (
+        checkpoint.last_line
+        and checkpoint.file_hash
+        and _file_hash(travel_file, set(checkpoint.skipped_lines))
+        != checkpoint.file_hash
+    ):
+        raise CommandError(
+            f"{travel_file} has changed since it was loaded through line "
+            f"{checkpoint.last_line}, other than in the lines it skipped, so "
+            "it can't be resumed; to load it as a new file, give it a new name"
+        )
+    return checkpoint
+
+
+def _save_checkpoint(checkpoint, last_line, errors, retry, digest):
+    # Lines still to be retried stay skipped until they are loaded.
+    checkpoint.last_line = last_line
+    checkpoint.skipped_lines = sorted(retry | {line for line, _ in errors})
+    checkpoint.file_hash = digest.hexdigest(checkpoint.skipped_lines)
+    checkpoint.save()
+
+
+def _report_errors(self, errors, error_file):
+    for line_num, message in errors:
+        self.stderr.write(f"\tERROR: line {line_num}: {message}")
+    if error_file:
+        with open(error_file, "w", newline="") as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(["line", "error"])
+            writer.writerows(errors)
+
+
+def _parse_row(row, line_num):
+    # Cleans a CSV row into the values load_data would store.
+    last_name, first_name = _split_name(row["employee_name"])
+    return {
+        "line_num": line_num,
+        "username": row["email"].split("@")[0],
+        "email": row["email"],
+        "last_name": last_name,
+        "first_name": first_name,
+        "ucla_id": row["ucla_id"],
+        "department": row["department"],
+        "purpose": row["purpose"],
+        "start": _convert_MDY_date(row["start_date"]),
+        "end": _convert_MDY_date(row["end_date"]),
+        "workdays": int(row["workdays"] or 0),
+        "account": row["account"],
+        "cost_center": row["cc"],
+        "fund_part": row["fund"],
+        "amount_approved": _to_decimal(row["amount_approved"]),
+        "amount_paid": _to_decimal(row["amount_paid"]),
+        "date_paid": _convert_MDY_date(row["date_paid"]),
+    }
+
+
+def _load_lookups(rows):
+    """
+    Reads the existing users, employees and units a load can reuse. Chunks
+    add the rows they create, and the activities, funds and travel requests
+    they upsert.
+    """
+    users = {
+        u.username: u
+        for u in User.objects.filter(username__in={row["username"] for row in rows})
+    }
+    employees = {
+        e.user.username: e
+        for e in Employee.objects.select_related("user").filter(
+            user__in=[u.pk for u in users.values()]
+        )
+    }
+    return {
+        "units": {u.name: u for u in Unit.objects.all()},
+        "users": users,
+        "employees": employees,
+        "uids": set(Employee.objects.values_list("uid", flat=True)),
+        "activities": {},
+        "funds": {},
+        "treqs": {},
+    }
+
+
+def _load_chunk(rows, lookups, fund_manager, batch_size):
+    """
+    Loads rows, returning the number loaded and the (line, error) pairs for
+    the rows skipped.
+    """
+    valid_rows, errors = _resolve_travelers(rows, lookups, batch_size)
+
+    _bulk_upsert(
+        Activity,
+        lookups["activities"],
+        ACTIVITY_UPSERT,
+        [
+            {"name": row["purpose"], "start": row["start"], "end": row["end"]}
+            for row in valid_rows
+        ],
+        batch_size,
+    )
+    _bulk_upsert(
+        Fund,
+        lookups["funds"],
+        FUND_UPSERT,
+        [
+            {
+                "account": row["account"],
+                "cost_center": row["cost_center"],
+                "fund": row["fund_part"],
+                "manager": fund_manager,
+            }
+            for row in valid_rows
+        ],
+        batch_size,
+    )
+    for row in valid_rows:
+        row["activity"] = lookups["activities"][
+            (row["purpose"], row["start"], row["end"])
+        ]
+        row["fund"] = lookups["funds"][
+            (row["account"], row["cost_center"], row["fund_part"])
+        ]
+    _bulk_upsert(
+        TravelRequest,
+        lookups["treqs"],
+        TREQ_UPSERT,
+        [
+            {
+                "traveler": row["employee"],
+                "activity": row["activity"],
+                "departure_date": row["start"],
+                "return_date": row["end"],
+                "days_ooo": row["workdays"],
+            }
+            for row in valid_rows
+        ],
+        batch_size,
+    )
+
+    fundings = []
+    expenses = []
+    for row in valid_rows:
+        treq = lookups["treqs"][
+            (row["employee"].pk, row["activity"].pk, row["start"], row["end"], False)
+        ]
+        # funded_on is set on creation, so load_data never finds an
+        # existing Funding to reuse; every approved amount is a new row.
+        if row["amount_approved"] is not None:
+            fundings.append(
+                Funding(
+                    funded_by=fund_manager,
+                    treq=treq,
+                    fund=row["fund"],
+                    amount=row["amount_approved"],
+                )
+            )
+        if row["amount_paid"] is not None:
+            expenses.append(
+                ActualExpense(
+                    treq=treq,
+                    total=row["amount_paid"],
+                    fund=row["fund"],
+                    type="OTH",
+                    rate=1,
+                    quantity=1,
+                    date_paid=row["date_paid"],
+                )
+            )
+    Funding.objects.bulk_create(fundings, batch_size=batch_size)
+    ActualExpense.objects.bulk_create(expenses, batch_size=batch_size)
+    return len(valid_rows), errors
+
+
+def _resolve_travelers(rows, lookups, batch_size):
+    """
+    Finds or creates the user and employee for each row, as _get_user and
+    _get_employee would. Returns the rows that can be loaded, each with its
+    employee, and the (line, error) pairs for the rest.
+    """
+    errors = []
+    valid_rows = []
+    new_users = []
+    renamed_users = {}
+    new_employees = []
+    for row in rows:
+        username = row["username"]
+        user = lookups["users"].get(username)
+        employee = lookups["employees"].get(username)
+        unit = lookups["units"].get(row["department"])
+        if user is not None and user.email != row["email"]:
+            error = f"user {username} already exists with email {user.email}"
+        elif employee is not None and employee.uid != row["ucla_id"]:
+            error = f"{username} already exists with UCLA id {employee.uid}"
+        elif unit is None:
+            error = f"unit {row['department']} not found"
+        elif employee is None and row["ucla_id"] in lookups["uids"]:
+            error = f"UCLA id {row['ucla_id']} belongs to another employee"
+        else:
+            error = None
+        if error:
+            errors.append((row["line_num"], error))
+            continue
+        valid_rows.append(row)
+
+        # As in _get_user, the name on the last row for a user wins.
+        if user is None:
+            user = lookups["users"][username] = User(
+                username=username, email=row["email"]
+            )
+            new_users.append(user)
+        elif user.pk and (user.last_name, user.first_name) != (
+            row["last_name"],
+            row["first_name"],
+        ):
+            renamed_users[username] = user
+        user.last_name = row["last_name"]
+        user.first_name = row["first_name"]
+        if employee is None:
+            employee = lookups["employees"][username] = Employee(
+                user=user, uid=row["ucla_id"], unit=unit
+            )
+            lookups["uids"].add(employee.uid)
+            new_employees.append(employee)
+        row["employee"] = employee
+    User.objects.bulk_create(new_users, batch_size=batch_size)
+    User.objects.bulk_update(
+        renamed_users.values(), ["last_name", "first_name"], batch_size
+    )
+    Employee.objects.bulk_create(new_employees, batch_size=batch_size)
+    return valid_rows, errors
+
+
+def _bulk_upsert(model, instances, upsert, values, batch_size):
+    """
+    Inserts a row for each dict in values, or updates the row with the same
+    natural key, in one statement per batch. instances maps keys to the rows
+    already upserted by this load, and gains the new ones.
+    """
+    unique_fields, update_fields = upsert
+    key_fields = [model._meta.get_field(field).attname for field in unique_fields]
+    upserts = {}
+    for kwargs in values:
+        instance = model(**kwargs)
+        key = tuple(getattr(instance, field) for field in key_fields)
+        done = instances.get(key)
+        if done is None or any(
+            getattr(done, field) != getattr(instance, field) for field in update_fields
+        ):
+            # A key can only be upserted once per statement; the last row wins.
+            upserts[key] = instance
+    model.objects.bulk_create(
+        upserts.values(),
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=unique_fields,
+        update_fields=update_fields,
+    )
+    instances.update(upserts)
+
+
+def _get_user(employee_name, email):
+    # Employees are based on Users, so create user first.
+    # Use the email name as username for now, with unusable password.
+    username = email.split("@")[0]
+    # Users might already exist, via small initial load
+    user, created = User.objects.get_or_create(username=username, email=email)
+    # Add first/last name to the user
+    user.last_name, user.first_name = _split_name(employee_name)
+    user.save()
+    return user
+
+
+def _get_employee(user, ucla_id, unit):
+    # Create Employee only if needed - should have been created earlier.
+    try:
+        employee = Employee.objects.get(user=user, uid=ucla_id)
+    except ObjectDoesNotExist:
+        employee, created = Employee.objects.get_or_create(
+            user=user, uid=ucla_id, unit=unit
+        )
+    return employee
+
+
+def _get_activity(purpose, start_date, end_date):
+    activity, created = Activity.objects.get_or_create(
+        name=purpose, start=start_date, end=end_date
+    )
+    return activity
+
+
+def _get_fund(account, cost_center, fund_part, fund_manager):
+    fund, created = Fund.objects.get_or_create(
+        account=account,
+        cost_center=cost_center,
+        fund=fund_part,
+        defaults={"manager": fund_manager},
+    )
+    return fund
+
+
+def _get_treq(employee, activity, start_date, end_date, workdays):
+    treq, created = TravelRequest.objects.update_or_create(
+        traveler=employee,
+        activity=activity,
+        departure_date=start_date,
+        return_date=end_date,
+        administrative=False,
+        defaults={"days_ooo": workdays},
+    )
+    return treq
+
+
+def _get_funding(funding_date, funded_by, treq, fund, amount_approved):
+    funding, created = Funding.objects.get_or_create(
+        funded_on=funding_date,
+        funded_by=funded_by,
+        treq=treq,
+        fund=fund,
+        amount=amount_approved,
+    )
+    return funding
+
+
+def _get_actual_expense(treq, amount, fund, date_paid):
+    # Create, without check for existing
+    expense = ActualExpense.objects.create(
+        treq=treq,
+        total=amount,
+        fund=fund,
+        type="OTH",
+        rate=1,
+        quantity=1,
+        date_paid=date_paid,
+    )
+    return expense
+
+
+def _convert_MDY(MDY_string):
+    """
+    Utility method for converting naive m/d/y strings to aware datetimes.
+    Forces time to noon, and applies America/LA time zone.
+    """
+    d = datetime.strptime(MDY_string + " 12", "%m/%d/%Y %H")
+    tz = pytz.timezone("America/Los_Angeles")
+    d = tz.localize(d)
+    return d
+
+
+@lru_cache(maxsize=None)
+def _convert_MDY_date(MDY_string):
+    # The date a DateField stores for _convert_MDY(MDY_string). Files repeat
+    # the same few thousand dates, so each is only converted once.
+    aware_datetime = _convert_MDY(MDY_string)
+    return timezone.make_naive(aware_datetime, timezone.get_default_timezone()).date()
+
+
+def _to_decimal(amount):
+    if amount == "":
+        return None
+    try:
+        return Decimal(amount)
+    except InvalidOperation:
+        raise ValueError(f"invalid amount {amount!r}")
+
+
+def _split_name(employee_name):
+    """
+    Utility method for splitting 'Last, First' into 'Last' and 'First'.
+    """
+    last_name, first_name = [word.strip() for word in employee_name.split(",")]
+    return (last_name, first_name)
+
+
+def _create_placeholder_employee():
+    """
+    Creates fake Employee for use as a placeholder until data cleanup is finished.
+    """
+    fake_user, created = User.objects.get_or_create(
+        username="fakeuser",
+        email="fakeuser@example.com",
+        first_name="Fakey",
+        last_name="McFakester",
+    )
+    fake_employee, created = Employee.objects.get_or_create(
+        user=fake_user,
+        unit=Unit.objects.get(name__exact="Library Business Services"),
+        uid="000000000",
+    )
+    return fake_employee
+
+
+class Command(BaseCommand):
+    help = "Load historical travel data from CSV into database"
+
+    def add_arguments(self, parser):
+        parser.add_argument("travel_file")
+        parser.add_argument(
+            "--bulk",
+            action="store_true",
+            help="Load the whole file in one transaction with bulk inserts",
+        )
+        parser.add_argument(
+            "--copy",
+            action="store_true",
+            help="Load the whole file in one transaction through COPY (PostgreSQL)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Rows per bulk insert (default 1000)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5000,
+            help="Rows per committed chunk in bulk mode (default 5000)",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Continue a bulk load of this file after its last committed line, "
+            "retrying the lines it skipped",
+        )
+        parser.add_argument(
+            "--error-file",
+            help="Write the line number and error of each skipped row to this CSV",
+        )
+
+    def handle(self, *args, **options):
+        travel_file = options["travel_file"]
+        if options["copy"]:
+            load_data_copy(
+                self,
+                travel_file,
+                options["batch_size"],
+                options["resume"],
+                options["error_file"],
+            )
+        elif options["bulk"] or options["resume"]:
+            load_data_bulk(
+                self,
+                travel_file,
+                options["batch_size"],
+                options["chunk_size"],
+                options["resume"],
+                options["error_file"],
+            )
+        else:
+            load_data(self, travel_file)
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from terra.summaries import rebuild_summaries, verify_summaries
+
+
+def check_summaries(self):
+    """
+    Compares the stored summaries against the live travel data.
+    """
+    mismatches = verify_summaries()
+    for employee_id, fiscal_year, administrative in mismatches:
+        kind = "administrative" if administrative else "professional development"
+        self.stderr.write(
+            f"\tERROR: FY{fiscal_year} {kind} summary for employee {employee_id} "
+            "does not match travel data"
+        )
+    if mismatches:
+        raise CommandError(f"{len(mismatches)} summaries do not match travel data")
+    self.stdout.write("All summaries match travel data")
+
+
+class Command(BaseCommand):
+    help = "Rebuild per-employee fiscal year summaries from travel data and verify them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify-only",
+            action="store_true",
+            help="Check the summaries without rebuilding them",
+        )
+
+    def handle(self, *args, **options):
+        if not options["verify_only"]:
+            count = rebuild_summaries()
+            self.stdout.write(f"Rebuilt {count} summaries")
+        check_summaries(self)
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("terra", "0015_travelrequest_canceled"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FiscalYearSummary",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("fiscal_year", models.IntegerField()),
+                ("administrative", models.BooleanField(default=False)),
+                (
+                    "requested",
+                    models.DecimalField(decimal_places=5, default=0, max_digits=12),
+                ),
+                (
+                    "spent",
+                    models.DecimalField(decimal_places=5, default=0, max_digits=12),
+                ),
+                ("days_away", models.IntegerField(default=0)),
+                ("vacation_days", models.IntegerField(default=0)),
+                (
+                    "employee",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="terra.employee"
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("employee", "fiscal_year", "administrative"),
+                        name="unique_employee_fiscal_year_summary",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,58 @@
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def _duplicates(model, fields, details):
+    # Yields (kept id, duplicate ids) for each natural key used more than
+    # once by rows that agree on every field in details.
+    groups = (
+        model.objects.values(*fields)
+        .annotate(count=Count("id"), keep=Min("id"))
+        .filter(count__gt=1)
+        .order_by()
+    )
+    for group in groups:
+        rows = model.objects.filter(**{field: group[field] for field in fields})
+        if rows.order_by().values(*details).distinct().count() == 1:
+            ids = rows.exclude(pk=group["keep"]).values_list("id", flat=True)
+            yield group["keep"], list(ids)
+
+
+def merge_duplicates(apps, schema_editor):
+    """
+    Activities and funds duplicated by get_or_create races are merged into
+    the oldest row, as long as the copies agree on every other field.
+    Copies that don't, and duplicate travel requests, which have their own
+    approvals and amounts, are left for a person; 0019 then skips their
+    constraints, and check_natural_keys lists them.
+    """
+    Activity = apps.get_model("terra", "Activity")
+    Fund = apps.get_model("terra", "Fund")
+    TravelRequest = apps.get_model("terra", "TravelRequest")
+    Funding = apps.get_model("terra", "Funding")
+    ActualExpense = apps.get_model("terra", "ActualExpense")
+
+    activities = _duplicates(
+        Activity,
+        ["name", "start", "end"],
+        ["url", "description", "city", "state", "country"],
+    )
+    for keep, ids in list(activities):
+        TravelRequest.objects.filter(activity__in=ids).update(activity=keep)
+        Activity.objects.filter(pk__in=ids).delete()
+    funds = _duplicates(Fund, ["account", "cost_center", "fund"], ["manager", "unit"])
+    for keep, ids in list(funds):
+        Funding.objects.filter(fund__in=ids).update(fund=keep)
+        ActualExpense.objects.filter(fund__in=ids).update(fund=keep)
+        Fund.objects.filter(pk__in=ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("terra", "0017_importcheckpoint"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
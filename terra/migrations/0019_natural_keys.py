@@ -0,0 +1,73 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:17
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+class AddConstraintUnlessDuplicated(migrations.AddConstraint):
+    """
+    Adds the unique constraint only if no rows break it, so migrate doesn't
+    fail on deploy. Otherwise it says so, and check_natural_keys lists the
+    rows and adds the constraint once they are fixed.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        duplicated = (
+            model.objects.values(*self.constraint.fields)
+            .annotate(count=Count("id"))
+            .filter(count__gt=1)
+            .order_by()
+            .exists()
+        )
+        if duplicated:
+            print(
+                f"\n  Skipped {self.constraint.name}: some {model._meta.verbose_name} "
+                "rows share a natural key. Run check_natural_keys to list them."
+            )
+        else:
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        with schema_editor.connection.cursor() as cursor:
+            constraints = schema_editor.connection.introspection.get_constraints(
+                cursor, model._meta.db_table
+            )
+        if self.constraint.name in constraints:
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("terra", "0018_merge_duplicates"),
+    ]
+
+    operations = [
+        AddConstraintUnlessDuplicated(
+            model_name="activity",
+            constraint=models.UniqueConstraint(
+                fields=("name", "start", "end"), name="unique_activity"
+            ),
+        ),
+        AddConstraintUnlessDuplicated(
+            model_name="fund",
+            constraint=models.UniqueConstraint(
+                fields=("account", "cost_center", "fund"), name="unique_fund"
+            ),
+        ),
+        AddConstraintUnlessDuplicated(
+            model_name="travelrequest",
+            constraint=models.UniqueConstraint(
+                fields=(
+                    "traveler",
+                    "activity",
+                    "departure_date",
+                    "return_date",
+                    "administrative",
+                ),
+                name="unique_travelrequest",
+            ),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("terra", "0019_natural_keys"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="actualexpense",
+            index=models.Index(
+                fields=["fund", "date_paid", "total"], name="expense_fund_paid_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="actualexpense",
+            index=models.Index(
+                fields=["treq", "date_paid", "total"], name="expense_treq_paid_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="actualexpense",
+            index=models.Index(fields=["date_paid"], name="expense_paid_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="funding",
+            index=models.Index(
+                fields=["fund", "treq", "amount"], name="funding_fund_treq_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="funding",
+            index=models.Index(fields=["treq", "amount"], name="funding_treq_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="travelrequest",
+            index=models.Index(
+                fields=[
+                    "traveler",
+                    "departure_date",
+                    "return_date",
+                    "administrative",
+                    "canceled",
+                    "days_ooo",
+                ],
+                name="treq_report_idx",
+            ),
+        ),
+    ]
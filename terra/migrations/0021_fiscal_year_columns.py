@@ -0,0 +1,73 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:32
+
+import terra.expressions
+from django.db import migrations, models
+
+
+def backfill_duration(apps, schema_editor):
+    # Undoing the generated column: store each vacation's days again.
+    Vacation = apps.get_model("terra", "Vacation")
+    Vacation.objects.update(duration=terra.expressions.InclusiveDays("start", "end"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("terra", "0020_report_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="actualexpense",
+            name="fiscal_year",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=terra.expressions.FiscalYear("date_paid"),
+                output_field=models.IntegerField(),
+            ),
+        ),
+        migrations.AddField(
+            model_name="travelrequest",
+            name="fiscal_year",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=terra.expressions.FiscalYear("return_date"),
+                output_field=models.IntegerField(),
+            ),
+        ),
+        # Columns can't be altered into generated ones, so recreate it. It
+        # is made nullable first, so that undoing this can add it back to
+        # existing rows and fill it in before it is required again.
+        migrations.AlterField(
+            model_name="vacation",
+            name="duration",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, backfill_duration),
+        migrations.RemoveField(
+            model_name="vacation",
+            name="duration",
+        ),
+        migrations.AddField(
+            model_name="vacation",
+            name="duration",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=terra.expressions.InclusiveDays("start", "end"),
+                output_field=models.IntegerField(),
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="actualexpense",
+            index=models.Index(
+                fields=["fiscal_year", "treq", "total"], name="expense_fiscal_year_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="travelrequest",
+            index=models.Index(
+                fields=["fiscal_year", "traveler", "administrative"],
+                name="treq_fiscal_year_idx",
+            ),
+        ),
+    ]
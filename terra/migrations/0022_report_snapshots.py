@@ -0,0 +1,45 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("terra", "0021_fiscal_year_columns"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReportSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("kind", models.CharField(max_length=32)),
+                ("key", models.CharField(max_length=32)),
+                ("fiscal_year", models.IntegerField()),
+                ("data", models.BinaryField()),
+                ("stale", models.BooleanField(default=False)),
+                ("created", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["fiscal_year", "stale"], name="snapshot_fiscal_year_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("kind", "key"), name="unique_report_snapshot"
+                    )
+                ],
+            },
+        ),
+    ]
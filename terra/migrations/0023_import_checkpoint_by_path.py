@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:14
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def keep_latest_checkpoints(apps, schema_editor):
+    # Checkpoints were kept per file content; keep each file's latest one.
+    # Their hashes covered the whole file, not the lines loaded, so they
+    # are cleared and those checkpoints resume by path alone.
+    ImportCheckpoint = apps.get_model("terra", "ImportCheckpoint")
+    latest = ImportCheckpoint.objects.values("file_name").annotate(keep=Max("id"))
+    ImportCheckpoint.objects.exclude(id__in=[row["keep"] for row in latest]).delete()
+    ImportCheckpoint.objects.update(file_hash="")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("terra", "0022_report_snapshots"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="importcheckpoint",
+            name="file_hash",
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.RunPython(keep_latest_checkpoints, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name="importcheckpoint",
+            name="skipped_lines",
+            field=models.JSONField(default=list),
+        ),
+        migrations.AlterField(
+            model_name="importcheckpoint",
+            name="file_name",
+            field=models.CharField(max_length=255, unique=True),
+        ),
+    ]
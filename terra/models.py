@@ -3,6 +3,8 @@ from django.contrib.auth.models import User
 from django.db.models import Sum, F
 
 from terra import utils
+from terra.expressions import FiscalYear, InclusiveDays
+from terra.orgtree import get_org_tree
 
 
 UNIT_TYPES = (("1", "Library"), ("2", "Executive Division"), ("3", "Managerial Unit"))
@@ -30,6 +32,51 @@ EMPLOYEE_TYPES = (
     ("OTHR", "Other"),
 )
 
+# Recursive queries over the org chart, so walking a hierarchy costs one
+# query however deep it is.
+UNIT_SUBTREE_SQL = """
+WITH RECURSIVE subtree(id) AS (
+    SELECT id FROM terra_unit WHERE id = %s
+    UNION
+    SELECT u.id FROM terra_unit u JOIN subtree s ON u.parent_unit_id = s.id
+)
+SELECT terra_unit.* FROM terra_unit JOIN subtree ON terra_unit.id = subtree.id
+ORDER BY terra_unit.name
+"""
+
+MANAGED_SUBTREE_SQL = """
+WITH RECURSIVE subtree(id) AS (
+    SELECT id FROM terra_unit WHERE manager_id = %s
+    UNION
+    SELECT u.id FROM terra_unit u JOIN subtree s ON u.parent_unit_id = s.id
+)
+SELECT id FROM subtree
+"""
+
+UNIT_MANAGER_CHAIN_SQL = """
+WITH RECURSIVE chain(id, manager_id, parent_unit_id, depth) AS (
+    SELECT id, manager_id, parent_unit_id, 0 FROM terra_unit WHERE id = %s
+    UNION ALL
+    SELECT u.id, u.manager_id, u.parent_unit_id, c.depth + 1
+    FROM terra_unit u JOIN chain c ON u.id = c.parent_unit_id
+)
+SELECT terra_employee.* FROM chain
+JOIN terra_employee ON terra_employee.id = chain.manager_id
+ORDER BY chain.depth
+"""
+
+SUPERVISOR_CHAIN_SQL = """
+WITH RECURSIVE chain(id, supervisor_id, depth) AS (
+    SELECT id, supervisor_id, 0 FROM terra_employee WHERE id = %s
+    UNION ALL
+    SELECT e.id, e.supervisor_id, c.depth + 1
+    FROM terra_employee e JOIN chain c ON e.id = c.supervisor_id
+)
+SELECT terra_employee.* FROM chain
+JOIN terra_employee ON terra_employee.id = chain.id
+ORDER BY chain.depth
+"""
+
 
 class Unit(models.Model):
     name = models.CharField(max_length=128)
@@ -57,19 +104,47 @@ class Unit(models.Model):
     def employee_count(self):
         return self.employee_set.count()
 
-    def super_managers(self, mgrs=None):
-        if mgrs is None:
-            mgrs = []
-        mgrs.append(self.manager)
-        if self.parent_unit is None:
-            return mgrs
-        return self.parent_unit.super_managers(mgrs)
+    def super_managers(self):
+        # Managers of this unit and every unit above it, nearest first.
+        tree = get_org_tree()
+        if tree is not None:
+            return [tree.employee(e) for e in tree.manager_chain(self.pk)]
+        return list(Employee.objects.raw(UNIT_MANAGER_CHAIN_SQL, [self.pk]))
+
+    def subtree(self):
+        """
+        Returns this unit and every unit below it in org chart order (each
+        unit followed by its subunits, by name), and their employees keyed
+        by unit id. Two queries regardless of depth, none from the org tree.
+        """
+        tree = get_org_tree()
+        if tree is not None:
+            units = [self]
+            units.extend(tree.unit(u) for u in tree.subtree(self.pk)[1:])
+            employees = {
+                u.pk: [tree.employee(e) for e in tree.staff.get(u.pk, [])]
+                for u in units
+            }
+            return units, employees
+        children = {}
+        for unit in Unit.objects.raw(UNIT_SUBTREE_SQL, [self.pk]):
+            children.setdefault(unit.parent_unit_id, []).append(unit)
+        units = []
+        stack = [self]
+        while stack:
+            unit = stack.pop()
+            units.append(unit)
+            stack.extend(reversed(children.get(unit.pk, [])))
+        employees = {}
+        for e in Employee.objects.filter(unit__in=[u.pk for u in units]).select_related(
+            "user"
+        ):
+            employees.setdefault(e.unit_id, []).append(e)
+        return units, employees
 
     def all_employees(self):
-        team = list(self.employee_set.all())
-        for subunit in self.subunits.all():
-            team.extend(subunit.all_employees())
-        return team
+        units, employees = self.subtree()
+        return [e for unit in units for e in employees.get(unit.pk, [])]
 
 
 class Employee(models.Model):
@@ -116,25 +191,31 @@ class Employee(models.Model):
         return self.fund_set.count() > 0
 
     def direct_reports(self):
-        return Employee.objects.filter(supervisor=self)
+        tree = get_org_tree()
+        if tree is not None:
+            return [tree.employee(e) for e in tree.reports.get(self.pk, [])]
+        return list(Employee.objects.filter(supervisor=self))
 
-    def full_team(self):
+    def full_team(self, tree=None):
         staff = [self]
         managers = []
-        direct_reports = self.direct_reports()
+        tree = get_org_tree() if tree is None else tree
+        if tree is not None:
+            direct_reports = [tree.employee(e) for e in tree.reports.get(self.pk, [])]
+        else:
+            direct_reports = self.direct_reports()
         if len(direct_reports) > 0:
             managers.append(self)
             for e in direct_reports:
-                substaff, submgrs = e.full_team()
+                substaff, submgrs = e.full_team(tree)
                 staff.extend(substaff)
                 managers.extend(submgrs)
         return staff, managers
 
     def treqs_in_fiscal_year(self, fiscal_year=None):
-        start, end = utils.fiscal_year_bookends(fiscal_year)
-        return TravelRequest.objects.filter(
-            traveler=self, return_date__lte=end, return_date__gte=start
-        )
+        if fiscal_year is None:
+            fiscal_year = utils.current_fiscal_year()
+        return TravelRequest.objects.filter(traveler=self, fiscal_year=fiscal_year)
 
     def profdev_cap_applies(self):
         if self.type == "HEAD" or self.type == "LIBR" or self.type == "SENR":
@@ -154,6 +235,11 @@ class Fund(models.Model):
 
     class Meta:
         ordering = ["account", "cost_center", "fund"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["account", "cost_center", "fund"], name="unique_fund"
+            )
+        ]
 
     def __str__(self):
         return "{}-{}-{}".format(self.account, self.cost_center, self.fund)
@@ -162,10 +248,11 @@ class Fund(models.Model):
         return "<Fund {}: {}>".format(self.id, self)
 
     def super_managers(self):
-        mgrs = [self.manager]
-        while mgrs[-1].supervisor is not None:
-            mgrs.append(mgrs[-1].supervisor)
-        return mgrs
+        # The fund manager and their supervisors up the chain, nearest first.
+        tree = get_org_tree()
+        if tree is not None:
+            return [tree.employee(e) for e in tree.supervisor_chain(self.manager_id)]
+        return list(Employee.objects.raw(SUPERVISOR_CHAIN_SQL, [self.manager_id]))
 
 
 class TravelRequest(models.Model):
@@ -173,6 +260,12 @@ class TravelRequest(models.Model):
     activity = models.ForeignKey("Activity", on_delete=models.PROTECT)
     departure_date = models.DateField()
     return_date = models.DateField()
+    # Trips count in the fiscal year they return in.
+    fiscal_year = models.GeneratedField(
+        expression=FiscalYear("return_date"),
+        output_field=models.IntegerField(),
+        db_persist=True,
+    )
     days_ooo = models.IntegerField("Days Out of Office")
     closed = models.BooleanField(default=False)
     administrative = models.BooleanField(default=False)
@@ -190,6 +283,42 @@ class TravelRequest(models.Model):
     note = models.TextField(blank=True)
     canceled = models.BooleanField(default=False)
 
+    class Meta:
+        # One trip per traveler, activity and dates, and per request type,
+        # since a trip can have both administrative and professional
+        # development requests. Loaders upsert on this.
+        constraints = [
+            models.UniqueConstraint(
+                fields=[
+                    "traveler",
+                    "activity",
+                    "departure_date",
+                    "return_date",
+                    "administrative",
+                ],
+                name="unique_travelrequest",
+            )
+        ]
+        # Reports select a traveler's trips by dates, then split them by
+        # type. The trailing columns let day counts come from the index alone.
+        indexes = [
+            models.Index(
+                fields=[
+                    "traveler",
+                    "departure_date",
+                    "return_date",
+                    "administrative",
+                    "canceled",
+                    "days_ooo",
+                ],
+                name="treq_report_idx",
+            ),
+            models.Index(
+                fields=["fiscal_year", "traveler", "administrative"],
+                name="treq_fiscal_year_idx",
+            ),
+        ]
+
     def __str__(self):
         return str(repr(self))
 
@@ -251,7 +380,11 @@ class Vacation(models.Model):
     treq = models.ForeignKey("TravelRequest", on_delete=models.CASCADE)
     start = models.DateField()
     end = models.DateField()
-    duration = models.IntegerField(blank=True)
+    duration = models.GeneratedField(
+        expression=InclusiveDays("start", "end"),
+        output_field=models.IntegerField(),
+        db_persist=True,
+    )
 
     def __str__(self):
         return str(repr(self))
@@ -263,10 +396,6 @@ class Vacation(models.Model):
         # Assuming vacation days are inclusive, so add 1 to the difference.
         return (self.end - self.start).days + 1
 
-    def save(self, *args, **kwargs):
-        self.duration = self.vacation_days()
-        super().save(*args, **kwargs)
-
 
 class Activity(models.Model):
     name = models.CharField(max_length=128)
@@ -281,6 +410,11 @@ class Activity(models.Model):
     class Meta:
         ordering = ["name", "-end"]
         verbose_name_plural = "Activities"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["name", "start", "end"], name="unique_activity"
+            )
+        ]
 
     def __str__(self):
         return self.name
@@ -302,6 +436,12 @@ class Funding(models.Model):
 
     class Meta:
         verbose_name_plural = "Funding"
+        indexes = [
+            models.Index(
+                fields=["fund", "treq", "amount"], name="funding_fund_treq_idx"
+            ),
+            models.Index(fields=["treq", "amount"], name="funding_treq_idx"),
+        ]
 
     def __str__(self):
         return str(repr(self))
@@ -320,8 +460,30 @@ class ActualExpense(models.Model):
     total = models.DecimalField(max_digits=10, decimal_places=5)
     fund = models.ForeignKey("Fund", on_delete=models.PROTECT)
     date_paid = models.DateField()
+    fiscal_year = models.GeneratedField(
+        expression=FiscalYear("date_paid"),
+        output_field=models.IntegerField(),
+        db_persist=True,
+    )
     reimbursed = models.BooleanField(default=False)
 
+    class Meta:
+        # Expenses are reported by the date paid, per fund, per trip or for
+        # everyone at once.
+        indexes = [
+            models.Index(
+                fields=["fund", "date_paid", "total"], name="expense_fund_paid_idx"
+            ),
+            models.Index(
+                fields=["treq", "date_paid", "total"], name="expense_treq_paid_idx"
+            ),
+            models.Index(fields=["date_paid"], name="expense_paid_idx"),
+            models.Index(
+                fields=["fiscal_year", "treq", "total"],
+                name="expense_fiscal_year_idx",
+            ),
+        ]
+
     def __str__(self):
         return str(repr(self))
 
@@ -338,3 +500,87 @@ class ActualExpense(models.Model):
 
     def in_fiscal_year(self, fiscal_year=None):
         return utils.in_fiscal_year(self.date_paid, fiscal_year)
+
+
+class FiscalYearSummary(models.Model):
+    # Maintained by terra.signals; rebuild with manage.py rebuild_summaries.
+    # Trips count in the fiscal year they return in, expenses in the fiscal
+    # year they were paid in.
+    employee = models.ForeignKey("Employee", on_delete=models.CASCADE)
+    fiscal_year = models.IntegerField()
+    administrative = models.BooleanField(default=False)
+    requested = models.DecimalField(max_digits=12, decimal_places=5, default=0)
+    spent = models.DecimalField(max_digits=12, decimal_places=5, default=0)
+    days_away = models.IntegerField(default=0)
+    vacation_days = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["employee", "fiscal_year", "administrative"],
+                name="unique_employee_fiscal_year_summary",
+            )
+        ]
+
+    def __str__(self):
+        return str(repr(self))
+
+    def __repr__(self):
+        return "<FiscalYearSummary {}: {} FY{} {}>".format(
+            self.id,
+            self.employee_id,
+            self.fiscal_year,
+            "admin" if self.administrative else "profdev",
+        )
+
+
+class ImportCheckpoint(models.Model):
+    # Last line of a travel data file committed by load_travel_data --bulk,
+    # and the lines it skipped, so a failed load can be resumed, and lines
+    # fixed since retried, with --resume. file_hash covers the lines that
+    # weren't skipped, so a different file at the same path isn't resumed.
+    file_name = models.CharField(max_length=255, unique=True)
+    file_hash = models.CharField(max_length=64, blank=True)
+    last_line = models.IntegerField(default=0)
+    skipped_lines = models.JSONField(default=list)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return str(repr(self))
+
+    def __repr__(self):
+        return "<ImportCheckpoint {}: {} line {}>".format(
+            self.id, self.file_name, self.last_line
+        )
+
+
+class ReportSnapshot(models.Model):
+    # A report for a closed fiscal year, frozen by manage.py close_fiscal_year
+    # and read instead of the travel data. Edits to travel in the year mark
+    # it stale until the year is closed again. See terra.report_cache.
+    kind = models.CharField(max_length=32)
+    key = models.CharField(max_length=32)
+    fiscal_year = models.IntegerField()
+    data = models.BinaryField()
+    stale = models.BooleanField(default=False)
+    created = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["kind", "key"], name="unique_report_snapshot"
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["fiscal_year", "stale"], name="snapshot_fiscal_year_idx"
+            )
+        ]
+
+    def __str__(self):
+        return str(repr(self))
+
+    def __repr__(self):
+        return "<ReportSnapshot {}: {} FY{}{}>".format(
+            self.id, self.kind, self.fiscal_year, " stale" if self.stale else ""
+        )
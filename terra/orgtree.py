@@ -0,0 +1,159 @@
+import time
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+
+VERSION_KEY = "terra:org_tree_version"
+
+# How often a process checks the shared version stamp for changes made by
+# other processes. Changes made in this process are seen immediately.
+CHECK_INTERVAL = 10
+
+USER_FIELDS = (
+    "id",
+    "username",
+    "first_name",
+    "last_name",
+    "email",
+    "is_superuser",
+    "is_staff",
+    "is_active",
+)
+
+_tree = None
+
+
+class OrgTree:
+    """
+    Read-only snapshot of units and employees, holding only field values and
+    id maps. Every lookup returns fresh model instances, so callers can
+    annotate them (e.g. employee.data) without leaking into other requests.
+    """
+
+    def __init__(self, version):
+        from django.contrib.auth.models import User
+        from .models import Employee, Unit
+
+        self.version = version
+        self.checked = time.monotonic()
+        self.unit_fields = [f.attname for f in Unit._meta.concrete_fields]
+        self.employee_fields = [f.attname for f in Employee._meta.concrete_fields]
+        # from_db expects values in the model's field order.
+        self.user_fields = [
+            f.attname for f in User._meta.concrete_fields if f.attname in USER_FIELDS
+        ]
+        self.units = {}
+        self.subunits = {}
+        for values in Unit.objects.values_list(*self.unit_fields):
+            unit = dict(zip(self.unit_fields, values))
+            self.units[unit["id"]] = values
+            self.subunits.setdefault(unit["parent_unit_id"], []).append(unit["id"])
+        self.employees = {}
+        self.staff = {}
+        self.reports = {}
+        user_fields = ["user__" + f for f in self.user_fields]
+        for values in Employee.objects.values_list(*self.employee_fields, *user_fields):
+            employee = dict(zip(self.employee_fields, values))
+            self.employees[employee["id"]] = values
+            self.staff.setdefault(employee["unit_id"], []).append(employee["id"])
+            self.reports.setdefault(employee["supervisor_id"], []).append(
+                employee["id"]
+            )
+
+    def unit(self, unit_id):
+        from .models import Unit
+
+        return Unit.from_db(DEFAULT_DB_ALIAS, self.unit_fields, self.units[unit_id])
+
+    def employee(self, employee_id):
+        from django.contrib.auth.models import User
+        from .models import Employee
+
+        values = self.employees[employee_id]
+        split = len(self.employee_fields)
+        employee = Employee.from_db(
+            DEFAULT_DB_ALIAS, self.employee_fields, values[:split]
+        )
+        # Fields left out of the snapshot (e.g. password) load on access.
+        employee.user = User.from_db(DEFAULT_DB_ALIAS, self.user_fields, values[split:])
+        return employee
+
+    def manager_chain(self, unit_id):
+        # Manager ids of the unit and every unit above it, nearest first.
+        managers = []
+        seen = set()
+        while unit_id is not None and unit_id not in seen:
+            seen.add(unit_id)
+            unit = dict(zip(self.unit_fields, self.units[unit_id]))
+            if unit["manager_id"] is not None:
+                managers.append(unit["manager_id"])
+            unit_id = unit["parent_unit_id"]
+        return managers
+
+    def supervisor_chain(self, employee_id):
+        # The employee and their supervisors up the chain, nearest first.
+        chain = []
+        index = self.employee_fields.index("supervisor_id")
+        while employee_id is not None and employee_id not in chain:
+            chain.append(employee_id)
+            employee_id = self.employees[employee_id][index]
+        return chain
+
+    def managed_units(self, employee_id):
+        # Ids of the units the employee manages and every unit below them.
+        index = self.unit_fields.index("manager_id")
+        units = []
+        for unit_id, values in self.units.items():
+            if values[index] == employee_id:
+                units.extend(self.subtree(unit_id))
+        return set(units)
+
+    def subtree(self, unit_id):
+        # Unit ids below and including unit_id, each followed by its subunits.
+        units = []
+        stack = [unit_id]
+        while stack:
+            unit_id = stack.pop()
+            if unit_id in units:
+                continue
+            units.append(unit_id)
+            stack.extend(reversed(self.subunits.get(unit_id, [])))
+        return units
+
+
+def get_org_tree():
+    """
+    Returns the snapshot for this process, or None inside a transaction,
+    where the snapshot may not match what this connection sees.
+    """
+    global _tree
+    if connection.in_atomic_block:
+        return None
+    tree = _tree
+    if tree is None or time.monotonic() - tree.checked > CHECK_INTERVAL:
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            version = uuid4().hex
+            cache.add(VERSION_KEY, version, None)
+            version = cache.get(VERSION_KEY, version)
+        if tree is None or tree.version != version:
+            tree = _tree = OrgTree(version)
+        tree.checked = time.monotonic()
+    return tree
+
+
+def _bump_version():
+    global _tree
+    _tree = None
+    cache.set(VERSION_KEY, uuid4().hex, None)
+
+
+def invalidate_org_tree(**kwargs):
+    """
+    Drops this process's snapshot and, once the change is committed, tells
+    the other processes to drop theirs.
+    """
+    global _tree
+    _tree = None
+    transaction.on_commit(_bump_version)
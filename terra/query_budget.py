@@ -0,0 +1,98 @@
+import logging
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class QueryStats:
+    """
+    The queries run while recording: how many, how many repeated one
+    already run with the same parameters, and the seconds spent in them.
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, params, time.perf_counter() - start))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duplicates(self):
+        return self.count - len(
+            {(sql, repr(params)) for sql, params, _ in self.queries}
+        )
+
+    @property
+    def time(self):
+        return sum(duration for _, _, duration in self.queries)
+
+    def __str__(self):
+        return (
+            f"{self.count} queries, {self.duplicates} duplicates, "
+            f"{self.time * 1000:.1f} ms"
+        )
+
+
+@contextmanager
+def record_queries(stats=None):
+    """
+    Records the queries run on the default database inside the with block
+    into the QueryStats it yields, a new one unless stats is given. Works
+    whether or not DEBUG is on.
+    """
+    if stats is None:
+        stats = QueryStats()
+    with connection.execute_wrapper(stats):
+        yield stats
+
+
+class QueryBudgetMiddleware:
+    """
+    Logs the queries each request ran, with the view that handled it, when
+    QUERY_BUDGET_LOG is on. Streamed responses are logged once they have
+    been sent, since exports run most of their queries while streaming.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_BUDGET_LOG:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with record_queries() as stats:
+            response = self.get_response(request)
+        if response.streaming:
+            response.streaming_content = self.stream(
+                request, response.streaming_content, stats
+            )
+        else:
+            self.log(request, stats)
+        return response
+
+    def stream(self, request, content, stats):
+        with record_queries(stats):
+            yield from content
+        self.log(request, stats)
+
+    def log(self, request, stats):
+        match = request.resolver_match
+        logger.info(
+            "%s %s (%s): %s",
+            request.method,
+            request.path,
+            match.view_name if match else "-",
+            stats,
+        )
@@ -0,0 +1,228 @@
+import fcntl
+import hashlib
+import os
+import pickle
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from .models import ReportSnapshot
+from .utils import current_fiscal_year, fiscal_year_bookends
+
+VERSION_KEY = "terra:report_version"
+
+# Set by closing() to the fiscal year being closed and the snapshots taken.
+_closing = ContextVar("closing", default=None)
+
+
+def report_version():
+    """
+    Stamp for the current state of the travel data. Every edit replaces it,
+    so cached reports from before the edit are never read again.
+    """
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = uuid4().hex
+        cache.add(VERSION_KEY, version, None)
+        version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def _key_part(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return ",".join(_key_part(v) for v in value)
+    return str(value)
+
+
+def _digest(parts):
+    # Hashed, since id lists can run past the key length some backends allow.
+    return hashlib.md5(_key_part(parts).encode()).hexdigest()
+
+
+def _snapshot_year(parts):
+    # The fiscal year the report covers, if its dates span exactly one.
+    dates = [part for part in parts if isinstance(part, date)]
+    if len(dates) != 2:
+        return None
+    year = current_fiscal_year(dates[0])
+    return year if tuple(dates) == fiscal_year_bookends(year) else None
+
+
+def _pack(report):
+    return zlib.compress(pickle.dumps(report, pickle.HIGHEST_PROTOCOL))
+
+
+def _read_snapshot(kind, parts):
+    data = (
+        ReportSnapshot.objects.filter(kind=kind, key=_digest(parts), stale=False)
+        .values_list("data", flat=True)
+        .first()
+    )
+    return None if data is None else pickle.loads(zlib.decompress(data))
+
+
+def _lock_file(path, timeout):
+    # The locked file at path, or None if it is still held after timeout
+    # seconds.
+    deadline = time.monotonic() + timeout
+    while True:
+        lock_file = open(path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(0.05)
+            continue
+        try:
+            current = os.stat(path).st_ino == os.fstat(lock_file.fileno()).st_ino
+        except FileNotFoundError:
+            current = False
+        if current:
+            return lock_file
+        # The worker that held it removed the file when it was done; lock
+        # the one at path now.
+        lock_file.close()
+
+
+@contextmanager
+def report_lock(name, timeout):
+    """
+    Holds an exclusive lock on a file named by a hash of the report's name,
+    so only one worker on this host computes it at a time. Waits up to
+    timeout seconds for a worker already holding it, then yields whether
+    it was taken. The file is removed when the lock is released, and the
+    lock goes with the process, so a killed worker doesn't leave it held.
+    """
+    digest = hashlib.md5(name.encode()).hexdigest()
+    path = os.path.join(settings.REPORT_LOCK_DIR, f"terra-report-{digest}.lock")
+    lock_file = _lock_file(path, timeout)
+    if lock_file is None:
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        # Removed while still locked, so no one can lock it in between.
+        os.remove(path)
+        lock_file.close()
+
+
+def _in_background(function):
+    def run():
+        try:
+            function()
+        finally:
+            # Threads get their own connection; don't leave it open.
+            connection.close()
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def cached_report(kind, parts, compute):
+    """
+    Returns compute(), a report built from plain rows, reading it from the
+    cache when the same report was built since the last edit. parts are
+    the ids, dates and flags that pick out the report. Reports for a
+    closed fiscal year are read from its snapshot rather than computed.
+
+    Concurrent requests for a report that isn't cached wait for the one
+    computing it rather than computing it again. With REPORT_SERVE_STALE,
+    they get the last result built before the latest edit at once, while
+    it is refreshed in the background.
+
+    Inside a transaction the cache is skipped, since edits made there
+    don't bump the version until they are committed.
+    """
+    year = _snapshot_year(parts)
+    closing = _closing.get()
+    if closing is not None:
+        report = compute()
+        if year == closing["fiscal_year"]:
+            closing["snapshots"][kind, _digest(parts)] = _pack(report)
+        return report
+
+    def build():
+        report = None if year is None else _read_snapshot(kind, parts)
+        return compute() if report is None else report
+
+    if connection.in_atomic_block:
+        return build()
+    digest = _digest(parts)
+    key = f"terra:report:{kind}:{report_version()}:{digest}"
+    latest_key = f"terra:report:{kind}:latest:{digest}"
+    report = cache.get(key)
+    if report is not None:
+        return report
+
+    def refresh(timeout, always=True):
+        with report_lock(f"{kind}-{digest}", timeout) as locked:
+            # Whoever held the lock may have just stored it.
+            report = cache.get(key)
+            if report is None and (locked or always):
+                report = build()
+                cache.set_many(
+                    {key: report, latest_key: report}, settings.REPORT_CACHE_TIMEOUT
+                )
+            return report
+
+    if settings.REPORT_SERVE_STALE:
+        report = cache.get(latest_key)
+        if report is not None:
+            # If the lock is held, a refresh is already under way.
+            _in_background(lambda: refresh(0, always=False))
+            return report
+    return refresh(settings.REPORT_LOCK_TIMEOUT)
+
+
+@contextmanager
+def closing(fiscal_year):
+    """
+    Reports run inside this are computed from the travel data, and those
+    covering fiscal_year are collected as unsaved ReportSnapshots in the
+    list it yields.
+    """
+    state = {"fiscal_year": fiscal_year, "snapshots": {}}
+    snapshots = []
+    token = _closing.set(state)
+    try:
+        yield snapshots
+    finally:
+        _closing.reset(token)
+    for (kind, key), data in state["snapshots"].items():
+        snapshots.append(
+            ReportSnapshot(kind=kind, key=key, fiscal_year=fiscal_year, data=data)
+        )
+
+
+def mark_snapshots_stale(fiscal_years):
+    """
+    Flags the snapshots of the given fiscal years for rebuilding.
+    """
+    fiscal_years = set(fiscal_years)
+    if fiscal_years:
+        ReportSnapshot.objects.filter(fiscal_year__in=fiscal_years, stale=False).update(
+            stale=True
+        )
+
+
+def _bump_version():
+    cache.set(VERSION_KEY, uuid4().hex, None)
+
+
+def invalidate_reports(**kwargs):
+    """
+    Retires every cached report once the change is committed.
+    """
+    transaction.on_commit(_bump_version)
@@ -1,5 +1,4 @@
 from decimal import Decimal
-from django.core.exceptions import ObjectDoesNotExist
 from django.db.models import (
     F,
     Q,
@@ -10,11 +9,31 @@ from django.db.models import (
     DecimalField,
     IntegerField,
 )
-from django.db.models.functions import Coalesce
+from django.db.models.functions import Cast, Coalesce
+
+
+from .expressions import FiscalYear
+from .models import (
+    TravelRequest,
+    Employee,
+    Funding,
+    ActualExpense,
+    Vacation,
+    FiscalYearSummary,
+    EMPLOYEE_TYPES,
+)
+from .report_cache import cached_report
+from .utils import (
+    current_fiscal_year,
+    fiscal_year_bookends,
+    profdev_spending_cap,
+    profdev_days_cap,
+)
 
 
-from .models import TravelRequest, Employee, Funding, ActualExpense
-from .utils import fiscal_year_bookends, profdev_spending_cap, profdev_days_cap
+def _full_name(last_name, first_name):
+    # As Employee.__str__ shows it, or blank for a missing employee.
+    return "" if last_name is None else f"{last_name}, {first_name}"
 
 
 def check_dates(start_date, end_date):
@@ -28,163 +47,290 @@ def check_dates(start_date, end_date):
 
 
 def get_subunits_and_employees(unit):
-    data = {
-        "subunits": {
-            unit.id: {
-                "subunit": unit,
-                "employees": {e.id: e for e in unit.employee_set.all()},
-            }
+    units, employees = unit.subtree()
+    data = {"subunits": {}}
+    # Each direct subunit collects the employees of its whole branch; the
+    # unit itself only its own staff.
+    branches = {unit.id: unit.id}
+    for subunit in units:
+        if subunit.id != unit.id:
+            branches[subunit.id] = (
+                subunit.id
+                if subunit.parent_unit_id == unit.id
+                else branches[subunit.parent_unit_id]
+            )
+        branch = branches[subunit.id]
+        if branch == subunit.id:
+            data["subunits"][branch] = {"subunit": subunit, "employees": {}}
+        data["subunits"][branch]["employees"].update(
+            (e.id, e) for e in employees.get(subunit.id, [])
+        )
+    return data
+
+
+def _empty_rows(employee_ids):
+    return {
+        eid: {
+            "id": eid,
+            "profdev_requested": Decimal(0),
+            "profdev_spent": Decimal(0),
+            "admin_requested": Decimal(0),
+            "admin_spent": Decimal(0),
+            "days_vacation": 0,
+            "profdev_days_away": 0,
+            "admin_days_away": 0,
         }
+        for eid in employee_ids
     }
-    for subunit in unit.subunits.all():
-        data["subunits"][subunit.id] = {
-            "subunit": subunit,
-            "employees": {e.id: e for e in subunit.all_employees()},
-        }
-    return data
 
 
-def get_individual_data(employee_ids, start_date=None, end_date=None):
-    start_date, end_date = check_dates(start_date, end_date)
-    # 4 subqueries plugged into the final query
+def _add_totals(rows, sources, sign=1):
+    for source in sources:
+        for row in source:
+            eid = row.pop("eid")
+            for key, value in row.items():
+                if value is not None:
+                    rows[eid][key] += sign * value
+    return rows
 
-    profdev_requested = (
-        TravelRequest.objects.filter(
-            traveler=OuterRef("pk"),
-            administrative=False,
-            departure_date__gte=start_date,
-            return_date__lte=end_date,
+
+def _trip_totals(employee_ids, **trips):
+    # Requested funding, days away and vacation for the trips matching the
+    # TravelRequest filter kwargs in trips.
+    treq_trips = {"treq__" + key: value for key, value in trips.items()}
+
+    requested = (
+        Funding.objects.filter(treq__traveler__in=employee_ids, **treq_trips)
+        .values(eid=F("treq__traveler"))
+        .annotate(
+            profdev_requested=Sum("amount", filter=Q(treq__administrative=False)),
+            admin_requested=Sum("amount", filter=Q(treq__administrative=True)),
         )
-        .values("traveler__pk")
-        .annotate(profdev_requested=Sum("funding__amount"))
-        .values("profdev_requested")
     )
 
-    profdev_spent = (
-        TravelRequest.objects.filter(traveler=OuterRef("pk"), administrative=False)
-        .values("traveler__pk")
+    days_away = (
+        TravelRequest.objects.filter(traveler__in=employee_ids, canceled=False, **trips)
+        .values(eid=F("traveler"))
         .annotate(
-            profdev_spent=Sum(
-                "actualexpense__total",
-                filter=Q(actualexpense__date_paid__lte=end_date)
-                & Q(actualexpense__date_paid__gte=start_date),
-            )
+            profdev_days_away=Sum("days_ooo", filter=Q(administrative=False)),
+            admin_days_away=Sum("days_ooo", filter=Q(administrative=True)),
         )
-        .values("profdev_spent")
     )
 
-    admin_requested = (
-        TravelRequest.objects.filter(
-            traveler=OuterRef("pk"),
-            administrative=True,
-            departure_date__gte=start_date,
-            return_date__lte=end_date,
-        )
-        .values("traveler__pk")
-        .annotate(admin_requested=Sum("funding__amount"))
-        .values("admin_requested")
+    days_vacation = (
+        Vacation.objects.filter(treq__traveler__in=employee_ids, **treq_trips)
+        .values(eid=F("treq__traveler"))
+        .annotate(days_vacation=Sum("duration"))
     )
+    return [requested, days_away, days_vacation]
 
-    admin_spent = (
-        TravelRequest.objects.filter(traveler=OuterRef("pk"), administrative=True)
-        .values("traveler__pk")
+
+def get_individual_data(employee_ids, start_date=None, end_date=None):
+    start_date, end_date = check_dates(start_date, end_date)
+    employee_ids = list(dict.fromkeys(employee_ids))
+    # One grouped pass over each source table, split into profdev and admin
+    # with conditional aggregation. Joining all of them in a single query
+    # would multiply the sums, one row per funding x expense x vacation.
+    spent = (
+        ActualExpense.objects.filter(
+            treq__traveler__in=employee_ids,
+            date_paid__gte=start_date,
+            date_paid__lte=end_date,
+        )
+        .values(eid=F("treq__traveler"))
         .annotate(
-            admin_spent=Sum(
-                "actualexpense__total",
-                filter=Q(actualexpense__date_paid__lte=end_date)
-                & Q(actualexpense__date_paid__gte=start_date),
-            )
+            profdev_spent=Sum("total", filter=Q(treq__administrative=False)),
+            admin_spent=Sum("total", filter=Q(treq__administrative=True)),
         )
-        .values("admin_spent")
     )
+    trips = _trip_totals(
+        employee_ids, departure_date__gte=start_date, return_date__lte=end_date
+    )
+    rows = _add_totals(_empty_rows(employee_ids), trips + [spent])
+    return list(rows.values())
 
-    days_vacation = TravelRequest.objects.filter(
-        traveler=OuterRef("pk"),
-        departure_date__gte=start_date,
-        return_date__lte=end_date,
-    ).annotate(days_vacation=Sum("vacation__duration"))
 
-    profdev_days_away = (
-        TravelRequest.objects.filter(
-            traveler=OuterRef("pk"),
-            departure_date__gte=start_date,
-            return_date__lte=end_date,
-            administrative=False,
-            canceled=False,
+def get_summary_data(employee_ids, start_date=None, end_date=None):
+    """
+    Same rows as get_individual_data, read from FiscalYearSummary. The dates
+    must be the start and end of fiscal years.
+    """
+    start_date, end_date = check_dates(start_date, end_date)
+    start_fy = current_fiscal_year(start_date)
+    end_fy = current_fiscal_year(end_date)
+    if (start_date, end_date) != (
+        fiscal_year_bookends(start_fy)[0],
+        fiscal_year_bookends(end_fy)[1],
+    ):
+        raise Exception("Summary reports need fiscal year start and end dates")
+    employee_ids = list(dict.fromkeys(employee_ids))
+
+    summaries = (
+        FiscalYearSummary.objects.filter(
+            employee__in=employee_ids,
+            fiscal_year__gte=start_fy,
+            fiscal_year__lte=end_fy,
+        )
+        .values(eid=F("employee"))
+        .annotate(
+            profdev_requested=Sum("requested", filter=Q(administrative=False)),
+            admin_requested=Sum("requested", filter=Q(administrative=True)),
+            profdev_spent=Sum("spent", filter=Q(administrative=False)),
+            admin_spent=Sum("spent", filter=Q(administrative=True)),
+            profdev_days_away=Sum("days_away", filter=Q(administrative=False)),
+            admin_days_away=Sum("days_away", filter=Q(administrative=True)),
+            days_vacation=Sum("vacation_days"),
         )
-        .values("traveler_id")
-        .annotate(profdev_days_away=Sum("days_ooo"))
     )
-    admin_days_away = (
-        TravelRequest.objects.filter(
-            traveler=OuterRef("pk"),
-            departure_date__gte=start_date,
+    rows = _add_totals(_empty_rows(employee_ids), [summaries])
+    # Summaries file a trip under the fiscal year it returns in, while the
+    # reports count trips that depart and return within the range. Correct
+    # for the trips that straddle the start of the range.
+    _add_totals(
+        rows,
+        _trip_totals(
+            employee_ids,
+            departure_date__lt=start_date,
+            return_date__gte=start_date,
             return_date__lte=end_date,
-            administrative=True,
-            canceled=False,
-        )
-        .values("traveler_id")
-        .annotate(admin_days_away=Sum("days_ooo"))
+        ),
+        sign=-1,
     )
-
-    # final query
-
-    rows = (
-        Employee.objects.filter(pk__in=employee_ids)
-        .annotate(
-            profdev_requested=Coalesce(
-                Subquery(profdev_requested, output_field=DecimalField()), Decimal(0)
-            ),
-            profdev_spent=Coalesce(
-                Subquery(profdev_spent, output_field=DecimalField()), Decimal(0)
-            ),
-            admin_requested=Coalesce(
-                Subquery(admin_requested, output_field=DecimalField()), Decimal(0)
-            ),
-            admin_spent=Coalesce(
-                Subquery(admin_spent, output_field=DecimalField()), Decimal(0)
+    _add_totals(
+        rows,
+        _trip_totals(
+            employee_ids, departure_date__gte=start_date, return_date__lt=start_date
+        ),
+    )
+    return list(rows.values())
+
+
+def _add_row_totals(row):
+    row["total_requested"] = row["profdev_requested"] + row["admin_requested"]
+    row["total_spent"] = row["profdev_spent"] + row["admin_spent"]
+    row["total_days_ooo"] = row["profdev_days_away"] + row["admin_days_away"]
+    return row
+
+
+def _sum_rows(rows):
+    total = _add_row_totals(_empty_rows([None])[None])
+    del total["id"]
+    for row in rows:
+        for key in total:
+            total[key] += row[key]
+    return total
+
+
+def get_yearly_data(employee_ids, start_year, end_year, fund=None):
+    """
+    The rows of get_individual_data for each fiscal year from start_year
+    through end_year, as {employee_id: {fiscal_year: row}}, plus the row
+    totals. A trip counts in a year when it departs and returns in it, so
+    each year matches that year's own report. Given a fund, only funding
+    and expenses on that fund are counted, as in the fund report.
+
+    The grouped sources are sent as one UNION ALL, so the whole range takes
+    one round trip whatever its length.
+    """
+    employee_ids = list(dict.fromkeys(employee_ids))
+    years = range(start_year, end_year + 1)
+    trips = {
+        "fiscal_year__gte": start_year,
+        "fiscal_year__lte": end_year,
+        "fiscal_year": FiscalYear("departure_date"),
+    }
+    treq_trips = {
+        "treq__fiscal_year__gte": start_year,
+        "treq__fiscal_year__lte": end_year,
+        "treq__fiscal_year": FiscalYear("treq__departure_date"),
+    }
+    on_fund = {} if fund is None else {"fund": fund}
+    zero = Value(Decimal(0), output_field=DecimalField())
+    # (rows, path to the trip, fiscal year field, metric)
+    sources = [
+        (
+            Funding.objects.filter(
+                treq__traveler__in=employee_ids, **treq_trips, **on_fund
             ),
-            days_vacation=Coalesce(
-                Subquery(
-                    days_vacation.values("days_vacation")[:1],
-                    output_field=IntegerField(),
-                ),
-                Value(0),
+            "treq__",
+            "treq__fiscal_year",
+            {"requested": Sum("amount")},
+        ),
+        (
+            ActualExpense.objects.filter(
+                treq__traveler__in=employee_ids,
+                fiscal_year__gte=start_year,
+                fiscal_year__lte=end_year,
+                **on_fund,
             ),
-            profdev_days_away=Coalesce(
-                Subquery(
-                    profdev_days_away.values("profdev_days_away")[:1],
-                    output_field=IntegerField(),
+            "treq__",
+            "fiscal_year",
+            {"spent": Sum("total")},
+        ),
+    ]
+    if fund is None:
+        sources += [
+            (
+                TravelRequest.objects.filter(
+                    traveler__in=employee_ids, canceled=False, **trips
                 ),
-                Value(0),
+                "",
+                "fiscal_year",
+                {"days_away": Sum("days_ooo")},
             ),
-            admin_days_away=Coalesce(
-                Subquery(
-                    admin_days_away.values("admin_days_away")[:1],
-                    output_field=IntegerField(),
-                ),
-                Value(0),
+            (
+                Vacation.objects.filter(treq__traveler__in=employee_ids, **treq_trips),
+                "treq__",
+                "treq__fiscal_year",
+                {"days_vacation": Sum("duration")},
             ),
+        ]
+    branches = []
+    for queryset, treq, fiscal_year, metric in sources:
+        # Every branch needs the same columns in the same order.
+        columns = {
+            "requested": zero,
+            "spent": zero,
+            "days_away": Value(0),
+            "days_vacation": Value(0),
+        }
+        columns.update(metric)
+        branches.append(
+            queryset.values(
+                eid=F(treq + "traveler"),
+                fy=F(fiscal_year),
+                admin=F(treq + "administrative"),
+            ).annotate(**columns)
         )
-        .values(
-            "id",
-            "profdev_requested",
-            "profdev_spent",
-            "admin_requested",
-            "admin_spent",
-            "days_vacation",
-            "profdev_days_away",
-            "admin_days_away",
-        )
-    )
-    return rows
+
+    data = {
+        eid: {year: _empty_rows([eid])[eid] for year in years} for eid in employee_ids
+    }
+    for row in branches[0].union(*branches[1:], all=True):
+        totals = data[row["eid"]][row["fy"]]
+        kind = "admin" if row["admin"] else "profdev"
+        totals[kind + "_requested"] += row["requested"] or 0
+        totals[kind + "_spent"] += row["spent"] or 0
+        totals[kind + "_days_away"] += row["days_away"] or 0
+        totals["days_vacation"] += row["days_vacation"] or 0
+    for rows in data.values():
+        for row in rows.values():
+            _add_row_totals(row)
+    return data
+
+
+def index_rows(rows):
+    # Evaluate an aggregate queryset once, keyed by id, instead of
+    # re-running it with rows.get(id=...) for every employee.
+    return {row["id"]: row for row in rows}
 
 
 def merge_data(rows, data):
+    rows = index_rows(rows)
     for subunit in data["subunits"].values():
         for employee in subunit["employees"].values():
             try:
-                employee.data = rows.get(id=employee.id)
+                employee.data = rows[employee.id]
                 employee.data["admin_requested"]
                 employee.data["profdev_requested"]
                 employee.data["total_requested"] = (
@@ -198,7 +344,7 @@ def merge_data(rows, data):
                     employee.data["profdev_days_away"]
                     + employee.data["admin_days_away"]
                 )
-            except ObjectDoesNotExist:
+            except KeyError:
                 employee.data = {
                     "admin_requested": 0,
                     "admin_spent": 0,
@@ -249,110 +395,116 @@ def calculate_totals(data):
     return data
 
 
-def unit_report(unit, start_date=None, end_date=None):
+def unit_report(unit, start_date=None, end_date=None, use_summary=False):
+    start_date, end_date = check_dates(start_date, end_date)
     data = get_subunits_and_employees(unit)
-    rows = get_individual_data(
-        [e.id for e in unit.all_employees()], start_date, end_date
+    get_data = get_summary_data if use_summary else get_individual_data
+    employee_ids = [
+        eid for subunit in data["subunits"].values() for eid in subunit["employees"]
+    ]
+    # Only the rows are cached; the org tree supplies the employees. The
+    # summaries give the same rows, so either source can fill the cache.
+    rows = cached_report(
+        "unit",
+        [unit.id, employee_ids, start_date, end_date],
+        lambda: get_data(employee_ids, start_date, end_date),
     )
     data = merge_data(rows, data)
     return calculate_totals(data)
 
 
-def get_treq_list(fund, start_date=None, end_date=None):
+def get_expenses_by_traveler(start_date=None, end_date=None):
+    """
+    The expenses paid in the date range as rows, with the trip, traveler,
+    unit and fund details the Actual Expense report shows, as
+    {traveler_id: [row]}.
+    """
     start_date, end_date = check_dates(start_date, end_date)
-    funding_rows = Funding.objects.filter(
-        fund=fund, treq__departure_date__gte=start_date, treq__return_date__lte=end_date
-    ).values(travel=F("treq"))
-
-    actual_expense_rows = ActualExpense.objects.filter(
-        fund=fund, date_paid__gte=start_date, date_paid__lte=end_date
-    ).values(travel=F("treq"))
-    treq_ids = set([e["travel"] for e in funding_rows.union(actual_expense_rows)])
-    return treq_ids
-
-
-def get_individual_data_for_treq(treq_ids, fund, start_date=None, end_date=None):
-    start_date, end_date = check_dates(start_date, end_date)
-
-    profdev_requested = (
-        Funding.objects.filter(
-            treq=OuterRef("pk"),
-            fund=fund,
-            treq__departure_date__gte=start_date,
-            treq__return_date__lte=end_date,
-            treq__administrative=False,
-        )
-        .values("treq__pk")
-        .annotate(profdev_requested=Sum("amount", filter=Q(fund=fund)))
-        .values("profdev_requested")
-    )
-
-    admin_requested = (
-        Funding.objects.filter(
-            treq=OuterRef("pk"),
-            fund=fund,
-            treq__departure_date__gte=start_date,
-            treq__return_date__lte=end_date,
-            treq__administrative=True,
-        )
-        .values("treq__pk")
-        .annotate(admin_requested=Sum("amount", filter=Q(fund=fund)))
-        .values("admin_requested")
-    )
-
-    profdev_spent = (
-        ActualExpense.objects.filter(
-            treq=OuterRef("pk"),
-            date_paid__lte=end_date,
-            date_paid__gte=start_date,
-            fund=fund,
-            treq__administrative=False,
-        )
-        .values("treq__pk")
-        .annotate(profdev_spent=Sum("total", filter=Q(fund=fund)))
-        .values("profdev_spent")
-    )
-
-    admin_spent = (
-        ActualExpense.objects.filter(
-            treq=OuterRef("pk"),
-            date_paid__lte=end_date,
-            date_paid__gte=start_date,
-            fund=fund,
-            treq__administrative=True,
+    expenses = (
+        ActualExpense.objects.filter(date_paid__gte=start_date, date_paid__lte=end_date)
+        .order_by("pk")
+        .values(
+            "id",
+            "treq_id",
+            "date_paid",
+            "reimbursed",
+            "total",
+            "treq__traveler",
+            "treq__traveler__uid",
+            "treq__traveler__type",
+            "treq__traveler__user__last_name",
+            "treq__traveler__user__first_name",
+            "treq__traveler__unit__name",
+            "treq__traveler__unit__manager__user__last_name",
+            "treq__traveler__unit__manager__user__first_name",
+            "treq__activity__name",
+            "treq__departure_date",
+            "treq__return_date",
+            "treq__days_ooo",
+            "treq__closed",
+            "fund__account",
+            "fund__cost_center",
+            "fund__fund",
         )
-        .values("treq__pk")
-        .annotate(admin_spent=Sum("total", filter=Q(fund=fund)))
-        .values("admin_spent")
     )
-
-    rows = TravelRequest.objects.filter(pk__in=treq_ids).annotate(
-        profdev_requested=Coalesce(
-            Subquery(
-                profdev_requested.values("profdev_requested"),
-                output_field=DecimalField(),
+    types = dict(EMPLOYEE_TYPES)
+    traveler = "treq__traveler__"
+    manager = traveler + "unit__manager__user__"
+    by_traveler = {}
+    for expense in expenses.iterator(chunk_size=2000):
+        row = {
+            "id": expense["id"],
+            "treq_id": expense["treq_id"],
+            "traveler_id": expense["treq__traveler"],
+            "uid": expense[traveler + "uid"],
+            "traveler": _full_name(
+                expense[traveler + "user__last_name"],
+                expense[traveler + "user__first_name"],
             ),
-            Decimal(0),
-        ),
-        admin_requested=Coalesce(
-            Subquery(
-                admin_requested.values("admin_requested"), output_field=DecimalField()
+            "type": types[expense[traveler + "type"]],
+            "unit": expense[traveler + "unit__name"],
+            "unit_manager": _full_name(
+                expense[manager + "last_name"], expense[manager + "first_name"]
             ),
-            Decimal(0),
-        ),
-        profdev_spent=Coalesce(
-            Subquery(
-                profdev_spent.values("profdev_spent"), output_field=DecimalField()
+            "activity": expense["treq__activity__name"],
+            "departure_date": expense["treq__departure_date"],
+            "return_date": expense["treq__return_date"],
+            "days_ooo": expense["treq__days_ooo"],
+            "closed": expense["treq__closed"],
+            "date_paid": expense["date_paid"],
+            "reimbursed": expense["reimbursed"],
+            "fund": "{}-{}-{}".format(
+                expense["fund__account"],
+                expense["fund__cost_center"],
+                expense["fund__fund"],
             ),
-            Decimal(0),
-        ),
-        admin_spent=Coalesce(
-            Subquery(admin_spent.values("admin_spent"), output_field=DecimalField()),
-            Decimal(0),
-        ),
-    )
+            "total": expense["total"],
+        }
+        by_traveler.setdefault(row["traveler_id"], []).append(row)
+    return by_traveler
 
-    return rows
+
+def actual_expense_report(unit, start_date=None, end_date=None, use_summary=False):
+    # The unit report with each employee's expense rows attached, so
+    # rendering is one pass over employees instead of employees x expenses.
+    start_date, end_date = check_dates(start_date, end_date)
+    report = unit_report(unit, start_date, end_date, use_summary)
+    expenses = cached_report(
+        "actual_expense",
+        [start_date, end_date],
+        lambda: get_expenses_by_traveler(start_date, end_date),
+    )
+    # The report shows each department's manager, so look them all up at once.
+    subunits = [subunit["subunit"] for subunit in report["subunits"].values()]
+    managers = Employee.objects.select_related("user").in_bulk(
+        {subunit.manager_id for subunit in subunits} - {None}
+    )
+    for subunit in subunits:
+        subunit.manager = managers.get(subunit.manager_id)
+    for subunit in report["subunits"].values():
+        for employee in subunit["employees"].values():
+            employee.expenses = expenses.get(employee.id, [])
+    return report
 
 
 def get_fund_employee_list(fund, start_date=None, end_date=None):
@@ -362,389 +514,284 @@ def get_fund_employee_list(fund, start_date=None, end_date=None):
     return set([e["eid"] for e in rows.union(rows2)])
 
 
-def get_individual_data_for_fund(employee_ids, fund, start_date=None, end_date=None):
-    start_date, end_date = check_dates(start_date, end_date)
+def _empty_fund_row():
+    return {
+        "profdev_requested": Decimal(0),
+        "profdev_spent": Decimal(0),
+        "admin_requested": Decimal(0),
+        "admin_spent": Decimal(0),
+    }
 
-    # 4 subqueries plugged into the final query
-    profdev_requested = (
-        TravelRequest.objects.filter(
-            traveler=OuterRef("pk"),
-            administrative=False,
-            departure_date__gte=start_date,
-            return_date__lte=end_date,
-            funding__fund=fund,
+
+def _add_fund_totals(row):
+    row["total_requested"] = row["profdev_requested"] + row["admin_requested"]
+    row["total_spent"] = row["profdev_spent"] + row["admin_spent"]
+    return row
+
+
+def get_fund_data(fund, start_date=None, end_date=None):
+    """
+    Funding and expenses on the fund as {employee_id: {treq_id: row}}, one
+    row per trip counted in the date range. Everyone with funding or
+    expenses on the fund in any year is included, with no trips if none
+    fall in the range.
+
+    Trips are grouped by traveler and trip in one UNION ALL, alongside the
+    fund's travelers, so this takes one round trip however busy the fund.
+    """
+    start_date, end_date = check_dates(start_date, end_date)
+    zero = Value(Decimal(0), output_field=DecimalField())
+    no_treq = Cast(Value(None), IntegerField())
+    funding = Funding.objects.filter(fund=fund)
+    expenses = ActualExpense.objects.filter(fund=fund)
+    # Every branch needs the same columns in the same order.
+    branches = [
+        funding.filter(
+            treq__departure_date__gte=start_date, treq__return_date__lte=end_date
         )
-        .values("traveler__pk")
-        .annotate(
-            profdev_requested=Sum("funding__amount", filter=Q(funding__fund=fund))
+        .values(
+            eid=F("treq__traveler"),
+            tid=F("treq"),
+            admin=F("treq__administrative"),
         )
-        .values("profdev_requested")
-    )
-
-    profdev_spent = (
-        TravelRequest.objects.filter(
-            traveler=OuterRef("pk"), administrative=False, actualexpense__fund=fund
+        .annotate(requested=Sum("amount"), spent=zero),
+        expenses.filter(date_paid__gte=start_date, date_paid__lte=end_date)
+        .values(
+            eid=F("treq__traveler"),
+            tid=F("treq"),
+            admin=F("treq__administrative"),
         )
-        .values("traveler__pk")
-        .annotate(
-            profdev_spent=Sum(
-                "actualexpense__total",
-                filter=Q(actualexpense__fund=fund)
-                & Q(actualexpense__date_paid__lte=end_date)
-                & Q(actualexpense__date_paid__gte=start_date),
-            )
+        .annotate(requested=zero, spent=Sum("total")),
+    ]
+    for rows in (funding, expenses):
+        branches.append(
+            rows.values(eid=F("treq__traveler"))
+            .annotate(tid=no_treq, admin=Value(False), requested=zero, spent=zero)
+            .distinct()
         )
-        .values("profdev_spent")
-    )
 
-    admin_requested = (
-        TravelRequest.objects.filter(
-            traveler=OuterRef("pk"),
-            administrative=True,
-            departure_date__gte=start_date,
-            return_date__lte=end_date,
-            funding__fund=fund,
-        )
-        .values("traveler__pk")
-        .annotate(admin_requested=Sum("funding__amount"), filter=Q(funding__fund=fund))
-        .values("admin_requested")
-    )
+    data = {}
+    for row in branches[0].union(*branches[1:], all=True):
+        treqs = data.setdefault(row["eid"], {})
+        if row["tid"] is None:
+            continue
+        totals = treqs.setdefault(row["tid"], _empty_fund_row())
+        kind = "admin" if row["admin"] else "profdev"
+        totals[kind + "_requested"] += row["requested"]
+        totals[kind + "_spent"] += row["spent"]
+    for treqs in data.values():
+        for row in treqs.values():
+            _add_fund_totals(row)
+    return data
 
-    admin_spent = (
+
+def _fund_report(fund, start_date, end_date):
+    data = get_fund_data(fund, start_date, end_date)
+    treqs = (
         TravelRequest.objects.filter(
-            traveler=OuterRef("pk"), administrative=True, actualexpense__fund=fund
+            pk__in=[treq_id for rows in data.values() for treq_id in rows]
         )
-        .values("traveler__pk")
-        .annotate(
-            admin_spent=Sum(
-                "actualexpense__total",
-                filter=Q(actualexpense__fund=fund)
-                & Q(actualexpense__date_paid__lte=end_date)
-                & Q(actualexpense__date_paid__gte=start_date),
-            )
-        )
-        .values("admin_spent")
+        .order_by("departure_date", "pk")
+        .values("id", "traveler_id", "activity__name")
     )
-
-    # final query
-    rows = Employee.objects.filter(pk__in=employee_ids).annotate(
-        profdev_requested=Coalesce(
-            Subquery(
-                profdev_requested.values("profdev_requested"),
-                output_field=DecimalField(),
-            ),
-            Decimal(0),
-        ),
-        profdev_spent=Coalesce(
-            Subquery(
-                profdev_spent.values("profdev_spent"), output_field=DecimalField()
-            ),
-            Decimal(0),
-        ),
-        admin_requested=Coalesce(
-            Subquery(
-                admin_requested.values("admin_requested"), output_field=DecimalField()
+    treqs_by_employee = {}
+    for treq in treqs:
+        row = {"id": treq["id"], "activity": treq["activity__name"]}
+        row.update(data[treq["traveler_id"]][treq["id"]])
+        treqs_by_employee.setdefault(treq["traveler_id"], []).append(row)
+
+    types = dict(EMPLOYEE_TYPES)
+    employees = []
+    totals = _empty_fund_row()
+    for employee in Employee.objects.filter(pk__in=data).values(
+        "id", "type", "user__last_name", "user__first_name"
+    ):
+        row = {
+            "id": employee["id"],
+            "name": _full_name(
+                employee["user__last_name"], employee["user__first_name"]
             ),
-            Decimal(0),
-        ),
-        admin_spent=Coalesce(
-            Subquery(admin_spent.values("admin_spent"), output_field=DecimalField()),
-            Decimal(0),
-        ),
+            "type": types[employee["type"]],
+            "treqs": treqs_by_employee.get(employee["id"], []),
+        }
+        subtotals = _empty_fund_row()
+        for treq in row["treqs"]:
+            for key in subtotals:
+                subtotals[key] += treq[key]
+        for key in totals:
+            totals[key] += subtotals[key]
+        row.update(_add_fund_totals(subtotals))
+        employees.append(row)
+    return employees, _add_fund_totals(totals)
+
+
+def fund_report(fund, start_date=None, end_date=None):
+    """
+    The fund's employees as rows with their subtotals, each with its trips
+    and their amounts under "treqs"; and the fund's totals. The subtotals
+    and totals are rolled up here from the per-trip rows, so the report
+    takes a fixed number of queries.
+    """
+    start_date, end_date = check_dates(start_date, end_date)
+    return cached_report(
+        "fund",
+        [fund.id, start_date, end_date],
+        lambda: _fund_report(fund, start_date, end_date),
     )
-    return rows
 
 
-def calculate_fund_totals(employees):
-    totals = {
-        "admin_requested": 0,
-        "admin_spent": 0,
-        "profdev_requested": 0,
-        "profdev_spent": 0,
-        "total_requested": 0,
-        "total_spent": 0,
-    }
-    for e in employees:
-        e.total_requested = e.profdev_requested + e.admin_requested
-        e.total_spent = e.profdev_spent + e.admin_spent
-        totals["profdev_requested"] += e.profdev_requested
-        totals["profdev_spent"] += e.profdev_spent
-        totals["admin_requested"] += e.admin_requested
-        totals["admin_spent"] += e.admin_spent
-    totals["total_requested"] = totals["admin_requested"] + totals["profdev_requested"]
-    totals["total_spent"] = totals["admin_spent"] + totals["profdev_spent"]
-    return employees, totals
+def _year_totals(rows_by_year, years):
+    # Adds up {fiscal_year: row} dicts column by column.
+    rows_by_year = list(rows_by_year)
+    return {year: _sum_rows(rows[year] for rows in rows_by_year) for year in years}
 
 
-def fund_report(fund, start_date=None, end_date=None):
-    eids = get_fund_employee_list(fund, start_date, end_date)
-    employee_data = get_individual_data_for_fund(eids, fund, start_date, end_date)
-    return calculate_fund_totals(employee_data)
-
-
-def get_type_and_employees():
-    type_dict = {
-        "University Librarian": [],
-        "Executive": [],
-        "Unit Head": [],
-        "Librarian": [],
-        "Sr. Exempt Staff": [],
-        "Other": [],
+def _range_totals(employee_ids, start_year, end_year):
+    # Each employee's row for the whole range, as the report for the range
+    # counts it. Unlike the sum of the years, this includes trips that
+    # depart in one fiscal year and return in the next.
+    start_date = fiscal_year_bookends(start_year)[0]
+    end_date = fiscal_year_bookends(end_year)[1]
+    return {
+        row["id"]: _add_row_totals(row)
+        for row in get_individual_data(employee_ids, start_date, end_date)
     }
-    employees = Employee.objects.order_by("unit")
-    for employee in employees:
-        if employee.get_type_display() in type_dict:
-            type_dict[employee.get_type_display()].append(employee)
 
-    return type_dict
 
+def employee_yearly_report(employee, start_year, end_year):
+    """
+    The employee's totals for each fiscal year, then for the whole range
+    under "all", matching the report for the range.
+    """
+    rows = get_yearly_data([employee.id], start_year, end_year)[employee.id]
+    rows["all"] = _range_totals([employee.id], start_year, end_year)[employee.id]
+    return rows
 
-def get_individual_data_type(employee_ids, start_date=None, end_date=None):
-    profdev_requested = (
-        TravelRequest.objects.filter(
-            traveler=OuterRef("pk"),
-            administrative=False,
-            departure_date__gte=start_date,
-            return_date__lte=end_date,
-        )
-        .values("traveler__pk")
-        .annotate(profdev_requested=Sum("funding__amount"))
-        .values("profdev_requested")
-    )
 
-    profdev_spent = (
-        TravelRequest.objects.filter(traveler=OuterRef("pk"), administrative=False)
-        .values("traveler__pk")
-        .annotate(
-            profdev_spent=Sum(
-                "actualexpense__total",
-                filter=Q(actualexpense__date_paid__lte=end_date)
-                & Q(actualexpense__date_paid__gte=start_date),
-            )
+def unit_yearly_report(unit, start_year, end_year):
+    """
+    The unit report with totals per fiscal year, and for the whole range
+    under "all", for each employee, subunit and the unit: in employee.years,
+    subunit_years and unit_years. The "all" totals match the unit report
+    for the range.
+    """
+    data = get_subunits_and_employees(unit)
+    employee_ids = [
+        eid for subunit in data["subunits"].values() for eid in subunit["employees"]
+    ]
+    rows = get_yearly_data(employee_ids, start_year, end_year)
+    totals = _range_totals(employee_ids, start_year, end_year)
+    years = [*range(start_year, end_year + 1), "all"]
+    for subunit in data["subunits"].values():
+        for employee in subunit["employees"].values():
+            employee.years = {**rows[employee.id], "all": totals[employee.id]}
+        subunit["subunit_years"] = _year_totals(
+            (e.years for e in subunit["employees"].values()), years
         )
-        .values("profdev_spent")
+    data["unit_years"] = _year_totals(
+        (subunit["subunit_years"] for subunit in data["subunits"].values()), years
     )
+    data["years"] = years
+    return data
 
-    admin_requested = (
-        TravelRequest.objects.filter(
-            traveler=OuterRef("pk"),
-            administrative=True,
-            departure_date__gte=start_date,
-            return_date__lte=end_date,
-        )
-        .values("traveler__pk")
-        .annotate(admin_requested=Sum("funding__amount"))
-        .values("admin_requested")
-    )
 
-    admin_spent = (
-        TravelRequest.objects.filter(traveler=OuterRef("pk"), administrative=True)
-        .values("traveler__pk")
-        .annotate(
-            admin_spent=Sum(
-                "actualexpense__total",
-                filter=Q(actualexpense__date_paid__lte=end_date)
-                & Q(actualexpense__date_paid__gte=start_date),
-            )
-        )
-        .values("admin_spent")
+def fund_yearly_report(fund, start_year, end_year):
+    """
+    The fund report's employees with their totals per fiscal year, and for
+    the whole range under "all", in employee.years; and the fund's totals.
+    The "all" totals match the fund report for the range.
+    """
+    employee_ids = get_fund_employee_list(fund)
+    rows = get_yearly_data(employee_ids, start_year, end_year, fund=fund)
+    start_date = fiscal_year_bookends(start_year)[0]
+    end_date = fiscal_year_bookends(end_year)[1]
+    totals = index_rows(fund_report(fund, start_date, end_date)[0])
+    years = [*range(start_year, end_year + 1), "all"]
+    employees = Employee.objects.filter(pk__in=employee_ids).select_related("user")
+    for employee in employees:
+        # The fund report's rows carry only amounts; the days stay at zero,
+        # as they do in each year's row.
+        total = _sum_rows([])
+        amounts = totals.get(employee.id, {})
+        total.update((key, value) for key, value in amounts.items() if key in total)
+        employee.years = {**rows[employee.id], "all": total}
+    return employees, _year_totals((e.years for e in employees), years)
+
+
+def _type_report_employees(employees):
+    # The employees' types and the names the Employee Type report shows,
+    # joined in rather than loaded employee by employee.
+    return employees.order_by("unit").values(
+        "id",
+        "type",
+        last_name=F("user__last_name"),
+        first_name=F("user__first_name"),
+        unit_name=F("unit__name"),
+        manager_last_name=F("unit__manager__user__last_name"),
+        manager_first_name=F("unit__manager__user__first_name"),
     )
 
-    days_vacation = TravelRequest.objects.filter(
-        traveler=OuterRef("pk"),
-        departure_date__gte=start_date,
-        return_date__lte=end_date,
-    ).annotate(days_vacation=Sum("vacation__duration"))
 
-    profdev_days_away = (
-        TravelRequest.objects.filter(
-            traveler=OuterRef("pk"),
-            departure_date__gte=start_date,
-            return_date__lte=end_date,
-            administrative=False,
-            canceled=False,
-        )
-        .values("traveler_id")
-        .annotate(profdev_days_away=Sum("days_ooo"))
-    )
-    admin_days_away = (
-        TravelRequest.objects.filter(
-            traveler=OuterRef("pk"),
-            departure_date__gte=start_date,
-            return_date__lte=end_date,
-            administrative=True,
-            canceled=False,
-        )
-        .values("traveler_id")
-        .annotate(admin_days_away=Sum("days_ooo"))
+def _type_report_row(row):
+    row["name"] = _full_name(row.pop("last_name"), row.pop("first_name"))
+    row["unit"] = row.pop("unit_name")
+    row["unit_manager"] = _full_name(
+        row.pop("manager_last_name"), row.pop("manager_first_name")
     )
-    # final query
-    rows = (
-        Employee.objects.filter(pk__in=employee_ids)
-        .annotate(
-            profdev_requested=Coalesce(
-                Subquery(profdev_requested, output_field=DecimalField()), Decimal(0)
-            ),
-            profdev_spent=Coalesce(
-                Subquery(profdev_spent, output_field=DecimalField()), Decimal(0)
-            ),
-            admin_requested=Coalesce(
-                Subquery(admin_requested, output_field=DecimalField()), Decimal(0)
-            ),
-            admin_spent=Coalesce(
-                Subquery(admin_spent, output_field=DecimalField()), Decimal(0)
-            ),
-            days_vacation=Coalesce(
-                Subquery(
-                    days_vacation.values("days_vacation")[:1],
-                    output_field=IntegerField(),
-                ),
-                Value(0),
-            ),
-            profdev_days_away=Coalesce(
-                Subquery(
-                    profdev_days_away.values("profdev_days_away")[:1],
-                    output_field=IntegerField(),
-                ),
-                Value(0),
-            ),
-            admin_days_away=Coalesce(
-                Subquery(
-                    admin_days_away.values("admin_days_away")[:1],
-                    output_field=IntegerField(),
-                ),
-                Value(0),
-            ),
-        )
-        .values(
-            "id",
-            "profdev_requested",
-            "profdev_spent",
-            "admin_requested",
-            "admin_spent",
-            "days_vacation",
-            "profdev_days_away",
-            "admin_days_away",
-        )
-    )
-    return rows
+    return _add_row_totals(row)
 
 
-def merge_data_type(employee_ids, start_date, end_date):
-    type_dict = get_type_and_employees()
-    rows = get_individual_data_type(employee_ids, start_date, end_date)
-    data = {
-        "type": {
-            "University Librarian": {"employees": [], "totals": {}},
-            "Executive": {"employees": [], "totals": {}},
-            "Unit Head": {"employees": [], "totals": {}},
-            "Librarian": {"employees": [], "totals": {}},
-            "Sr. Exempt Staff": {"employees": [], "totals": {}},
-            "Other": {"employees": [], "totals": {}},
-        },
-        "all_type_total": {},
-    }
+def _with_type_details(employee_ids, rows):
+    # The rows, keyed by employee, with the names and types the report
+    # groups by, in one more query.
+    rows = index_rows(rows)
+    employees = Employee.objects.filter(pk__in=employee_ids)
+    return [{**row, **rows[row["id"]]} for row in _type_report_employees(employees)]
 
-    for employee_type in type_dict:
-        for e in type_dict[employee_type]:
-            try:
-                employee = rows.get(id=e.id)
-                employee["name"] = e.__str__()
-                employee["unit"] = e.unit.__str__()
-                employee["unit_manager"] = e.unit.manager.__str__()
-                employee["admin_requested"]
-                employee["profdev_requested"]
-                employee["total_requested"] = (
-                    employee["admin_requested"] + employee["profdev_requested"]
-                )
-                employee["total_spent"] = (
-                    employee["admin_spent"] + employee["profdev_spent"]
-                )
-                employee["total_days_ooo"] = (
-                    employee["profdev_days_away"] + employee["admin_days_away"]
-                )
 
-            except ObjectDoesNotExist:
-                employee = {
-                    "admin_requested": 0,
-                    "admin_spent": 0,
-                    "profdev_requested": 0,
-                    "profdev_spent": 0,
-                    "total_spent": 0,
-                    "total_requested": 0,
-                    "profdev_days_away": 0,
-                    "admin_days_away": 0,
-                    "days_vacation": 0,
-                    "total_days_ooo": 0,
-                }
-            data["type"][employee_type]["employees"].append(employee)
-
-    for employee_type in data["type"]:
-        type_totals = {
-            "admin_requested": 0,
-            "admin_spent": 0,
-            "admin_days_away": 0,
-            "profdev_days_away": 0,
-            "days_vacation": 0,
-            "profdev_requested": 0,
-            "profdev_spent": 0,
-            "total_requested": 0,
-            "total_days_ooo": 0,
-            "total_spent": 0,
-        }
-        # add a totals dictionary for each employee type
-        for employee in data["type"][employee_type]["employees"]:
-            type_totals["admin_requested"] += employee["admin_requested"]
-            type_totals["admin_spent"] += employee["admin_spent"]
-            type_totals["profdev_days_away"] += employee["profdev_days_away"]
-            type_totals["admin_days_away"] += employee["admin_days_away"]
-            type_totals["days_vacation"] += employee["days_vacation"]
-            type_totals["profdev_requested"] += employee["profdev_requested"]
-            type_totals["profdev_spent"] += employee["profdev_spent"]
-            type_totals["total_requested"] += employee["total_requested"]
-            type_totals["total_days_ooo"] += employee["total_days_ooo"]
-            type_totals["total_spent"] += employee["total_spent"]
-        data["type"][employee_type]["totals"] = type_totals
-
-    complete_total = {
-        "admin_requested": 0,
-        "admin_spent": 0,
-        "profdev_days_away": 0,
-        "admin_days_away": 0,
-        "days_vacation": 0,
-        "profdev_requested": 0,
-        "profdev_spent": 0,
-        "total_requested": 0,
-        "total_days_ooo": 0,
-        "total_spent": 0,
-    }
+def get_individual_data_type(employee_ids, start_date=None, end_date=None):
+    start_date, end_date = check_dates(start_date, end_date)
+    employee_ids = list(dict.fromkeys(employee_ids))
+    return _with_type_details(
+        employee_ids, get_individual_data(employee_ids, start_date, end_date)
+    )
 
-    for t in data["type"]:
-        complete_total["admin_requested"] += data["type"][t]["totals"][
-            "admin_requested"
-        ]
-        complete_total["admin_spent"] += data["type"][t]["totals"]["admin_spent"]
-        complete_total["profdev_days_away"] += data["type"][t]["totals"][
-            "profdev_days_away"
-        ]
-        complete_total["admin_days_away"] += data["type"][t]["totals"][
-            "admin_days_away"
-        ]
-        complete_total["days_vacation"] += data["type"][t]["totals"]["days_vacation"]
-        complete_total["profdev_requested"] += data["type"][t]["totals"][
-            "profdev_requested"
-        ]
-        complete_total["profdev_spent"] += data["type"][t]["totals"]["profdev_spent"]
-        complete_total["total_requested"] += data["type"][t]["totals"][
-            "total_requested"
-        ]
-        complete_total["total_days_ooo"] += data["type"][t]["totals"]["total_days_ooo"]
-        complete_total["total_spent"] += data["type"][t]["totals"]["total_spent"]
-    data["all_type_total"] = complete_total
 
+def _merge_data_type(employee_ids, start_date, end_date, use_summary):
+    if use_summary:
+        rows = _with_type_details(
+            employee_ids, get_summary_data(employee_ids, start_date, end_date)
+        )
+    else:
+        rows = get_individual_data_type(employee_ids, start_date, end_date)
+
+    types = dict(EMPLOYEE_TYPES)
+    data = {"type": {name: {"employees": []} for name in types.values()}}
+    for row in rows:
+        employee_type = types[row.pop("type")]
+        data["type"][employee_type]["employees"].append(_type_report_row(row))
+    for value in data["type"].values():
+        value["totals"] = _sum_rows(value["employees"])
+    data["all_type_total"] = _sum_rows(
+        value["totals"] for value in data["type"].values()
+    )
     return data
 
 
+def merge_data_type(employee_ids, start_date, end_date, use_summary=False):
+    """
+    The Employee Type report: each type's employees, ordered by unit, with
+    the type's subtotals, then the totals across all types. Each employee's
+    row carries their name, unit and unit manager.
+    """
+    employee_ids = list(employee_ids)
+    return cached_report(
+        "employee_type",
+        [employee_ids, start_date, end_date],
+        lambda: _merge_data_type(employee_ids, start_date, end_date, use_summary),
+    )
+
+
 def get_individual_data_employee(employee_ids, start_date=None, end_date=None):
     start_date, end_date = check_dates(start_date, end_date)
 
@@ -898,13 +945,22 @@ def get_individual_data_employee(employee_ids, start_date=None, end_date=None):
     return rows
 
 
-def employee_total_report(employee_ids, start_date, end_date):
+def _employee_total_report(employee_ids, start_date, end_date, use_summary):
     employee_totals = {}
-    rows = get_individual_data_employee(employee_ids, start_date, end_date)
+    if use_summary:
+        rows = index_rows(get_summary_data(employee_ids, start_date, end_date))
+        for row in rows.values():
+            del row["days_vacation"]
+            row["total_requested"] = row["profdev_requested"] + row["admin_requested"]
+            row["total_spent"] = row["profdev_spent"] + row["admin_spent"]
+    else:
+        rows = index_rows(
+            get_individual_data_employee(employee_ids, start_date, end_date)
+        )
 
     for e in employee_ids:
         try:
-            employee = rows.get(id=e)
+            employee = rows[e]
             employee["total_requested"]
             employee["total_spent"]
             employee["total_days_away"] = (
@@ -917,7 +973,7 @@ def employee_total_report(employee_ids, start_date, end_date):
                 profdev_days_cap - employee["profdev_days_away"]
             )
 
-        except ObjectDoesNotExist:
+        except KeyError:
             employee = {
                 "profdev_requested": 0,
                 "profdev_spent": 0,
@@ -935,6 +991,15 @@ def employee_total_report(employee_ids, start_date, end_date):
     return employee_totals
 
 
+def employee_total_report(employee_ids, start_date, end_date, use_summary=False):
+    employee_ids = list(employee_ids)
+    return cached_report(
+        "employee_total",
+        [employee_ids, start_date, end_date],
+        lambda: _employee_total_report(employee_ids, start_date, end_date, use_summary),
+    )
+
+
 def get_individual_data_treq(treq_ids, start_date=None, end_date=None):
     actualexpenses_fy = (
         ActualExpense.objects.filter(treq=OuterRef("pk"))
@@ -986,3 +1051,22 @@ def get_individual_data_treq(treq_ids, start_date=None, end_date=None):
     ).values("id", "actualexpenses_fy", "funding_fy", "days_ooo_fy")
 
     return rows
+
+
+def employee_treq_report(employee, start_date=None, end_date=None):
+    start_date, end_date = check_dates(start_date, end_date)
+    # Only this traveler's requests are aggregated, so the cost of a personal
+    # report does not grow with the rest of the database.
+    treqs = employee.travelrequest_set.select_related("activity").order_by("pk")
+    rows = index_rows(
+        get_individual_data_treq(treqs.values("pk"), start_date, end_date)
+    )
+    treq_rows = {}
+    for treq in treqs:
+        row = rows[treq.id]
+        if row["actualexpenses_fy"] != 0 or (
+            treq.departure_date >= start_date and treq.return_date <= end_date
+        ):
+            row["treq"] = treq
+            treq_rows[treq.id] = row
+    return treq_rows
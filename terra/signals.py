@@ -0,0 +1,68 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+
+from django.contrib.auth.models import User
+
+from .models import ActualExpense, Employee, Funding, TravelRequest, Unit, Vacation
+from .orgtree import invalidate_org_tree
+from .report_cache import invalidate_reports, mark_snapshots_stale
+from .summaries import refresh_summaries, summary_keys
+
+SUMMARY_SOURCES = (TravelRequest, Funding, ActualExpense, Vacation)
+
+
+def stash_summary_keys(sender, instance, raw=False, **kwargs):
+    # Remember where the row was summarized before it changes, so the old
+    # buckets get recomputed too. Fixture loads skip this; rebuild after.
+    if raw or instance.pk is None:
+        instance._summary_keys = set()
+    else:
+        instance._summary_keys = summary_keys(sender, instance.pk)
+
+
+def update_summaries(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    keys = getattr(instance, "_summary_keys", set())
+    if kwargs.get("signal") is post_save:
+        keys = keys | summary_keys(sender, instance.pk)
+    refresh_summaries(keys)
+    # The same fiscal years' closed reports no longer match the travel data.
+    mark_snapshots_stale(fiscal_year for _, fiscal_year, _ in keys)
+
+
+for model in SUMMARY_SOURCES:
+    pre_save.connect(stash_summary_keys, sender=model)
+    pre_delete.connect(stash_summary_keys, sender=model)
+    post_save.connect(update_summaries, sender=model)
+    post_delete.connect(update_summaries, sender=model)
+
+
+# What logging in saves: the time, and the password when its hash is
+# upgraded. Neither reports nor the org tree show either.
+LOGIN_FIELDS = {"last_login", "password"}
+
+
+def ignoring_logins(receiver):
+    # Calls receiver for every save but those made by logging in.
+    def handler(sender, update_fields=None, **kwargs):
+        if update_fields is not None and set(update_fields) <= LOGIN_FIELDS:
+            return
+        receiver(sender=sender, update_fields=update_fields, **kwargs)
+
+    return handler
+
+
+# Employee names in the org tree snapshot come from their users.
+for model in (Unit, Employee):
+    post_save.connect(invalidate_org_tree, sender=model)
+    post_delete.connect(invalidate_org_tree, sender=model)
+post_save.connect(ignoring_logins(invalidate_org_tree), sender=User, weak=False)
+post_delete.connect(invalidate_org_tree, sender=User)
+
+
+# Cached reports hold totals and names from all of these.
+for model in (*SUMMARY_SOURCES, Unit, Employee):
+    post_save.connect(invalidate_reports, sender=model)
+    post_delete.connect(invalidate_reports, sender=model)
+post_save.connect(ignoring_logins(invalidate_reports), sender=User, weak=False)
+post_delete.connect(invalidate_reports, sender=User)
@@ -0,0 +1,202 @@
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .models import (
+    ActualExpense,
+    FiscalYearSummary,
+    Funding,
+    TravelRequest,
+    Vacation,
+)
+from .report_cache import invalidate_reports, mark_snapshots_stale
+
+
+def _zero_totals():
+    return {
+        "requested": Decimal(0),
+        "spent": Decimal(0),
+        "days_away": 0,
+        "vacation_days": 0,
+    }
+
+
+def compute_summaries(employee=None, fiscal_year=None, administrative=None):
+    """
+    Aggregates travel data into {(employee_id, fiscal_year, administrative): totals}.
+    Optionally narrowed to one employee, fiscal year and/or administrative flag.
+    """
+    trips = {}
+    if employee is not None:
+        trips["traveler"] = employee
+    if administrative is not None:
+        trips["administrative"] = administrative
+    # Trips belong to the fiscal year they return in, expenses to the one
+    # they were paid in; both are stored on the rows.
+    in_year = {}
+    if fiscal_year is not None:
+        in_year["fiscal_year"] = fiscal_year
+    treq_trips = {"treq__" + key: value for key, value in trips.items()}
+    treq_in_year = {"treq__" + key: value for key, value in in_year.items()}
+
+    sources = [
+        (
+            "requested",
+            Funding.objects.filter(**treq_trips, **treq_in_year),
+            "treq__",
+            "treq__fiscal_year",
+            Sum("amount"),
+        ),
+        (
+            "spent",
+            ActualExpense.objects.filter(**treq_trips, **in_year),
+            "treq__",
+            "fiscal_year",
+            Sum("total"),
+        ),
+        (
+            "days_away",
+            TravelRequest.objects.filter(canceled=False, **trips, **in_year),
+            "",
+            "fiscal_year",
+            Sum("days_ooo"),
+        ),
+        (
+            "vacation_days",
+            Vacation.objects.filter(**treq_trips, **treq_in_year),
+            "treq__",
+            "treq__fiscal_year",
+            Sum("duration"),
+        ),
+    ]
+    summaries = {}
+    for metric, queryset, prefix, fiscal_year_field, total in sources:
+        rows = queryset.values(
+            eid=F(prefix + "traveler"),
+            admin=F(prefix + "administrative"),
+            fy=F(fiscal_year_field),
+        ).annotate(total=total)
+        for row in rows:
+            key = (row["eid"], row["fy"], row["admin"])
+            if row["total"] is not None:
+                summaries.setdefault(key, _zero_totals())[metric] = row["total"]
+    return summaries
+
+
+def summary_keys(model, pk):
+    """
+    Returns the summary keys that row pk of model currently contributes to.
+    """
+    if model is ActualExpense:
+        rows = ActualExpense.objects.filter(pk=pk).values(
+            eid=F("treq__traveler"),
+            admin=F("treq__administrative"),
+            fy=F("fiscal_year"),
+        )
+    elif model is TravelRequest:
+        # A request's expenses are summarized under its traveler and flag.
+        rows = list(
+            TravelRequest.objects.filter(pk=pk).values(
+                eid=F("traveler"),
+                admin=F("administrative"),
+                fy=F("fiscal_year"),
+            )
+        )
+        rows.extend(
+            ActualExpense.objects.filter(treq=pk)
+            .values(
+                eid=F("treq__traveler"),
+                admin=F("treq__administrative"),
+                fy=F("fiscal_year"),
+            )
+            .distinct()
+        )
+    else:
+        rows = model.objects.filter(pk=pk).values(
+            eid=F("treq__traveler"),
+            admin=F("treq__administrative"),
+            fy=F("treq__fiscal_year"),
+        )
+    return {(row["eid"], row["fy"], row["admin"]) for row in rows}
+
+
+def refresh_summaries(keys):
+    """
+    Recomputes the given summary rows from travel data.
+    """
+    for key in keys:
+        employee_id, fiscal_year, administrative = key
+        totals = compute_summaries(employee_id, fiscal_year, administrative).get(key)
+        if totals is None or not any(totals.values()):
+            FiscalYearSummary.objects.filter(
+                employee_id=employee_id,
+                fiscal_year=fiscal_year,
+                administrative=administrative,
+            ).delete()
+        else:
+            FiscalYearSummary.objects.update_or_create(
+                employee_id=employee_id,
+                fiscal_year=fiscal_year,
+                administrative=administrative,
+                defaults=totals,
+            )
+
+
+def rebuild_summaries():
+    """
+    Replaces all summary rows with freshly computed ones.
+    """
+    summaries = compute_summaries()
+    with transaction.atomic():
+        changed = _changed_keys(summaries, _stored_summaries())
+        FiscalYearSummary.objects.all().delete()
+        FiscalYearSummary.objects.bulk_create(
+            [
+                FiscalYearSummary(
+                    employee_id=employee_id,
+                    fiscal_year=fiscal_year,
+                    administrative=administrative,
+                    **totals,
+                )
+                for (
+                    employee_id,
+                    fiscal_year,
+                    administrative,
+                ), totals in summaries.items()
+                if any(totals.values())
+            ],
+            batch_size=1000,
+        )
+        # Reports read from the summaries may come out differently now, and
+        # so may the closed years whose totals changed behind the signals.
+        invalidate_reports()
+        mark_snapshots_stale(fiscal_year for _, fiscal_year, _ in changed)
+    return len(summaries)
+
+
+def _stored_summaries():
+    return {
+        (s.employee_id, s.fiscal_year, s.administrative): {
+            "requested": s.requested,
+            "spent": s.spent,
+            "days_away": s.days_away,
+            "vacation_days": s.vacation_days,
+        }
+        for s in FiscalYearSummary.objects.all()
+    }
+
+
+def _changed_keys(live, stored):
+    zero = _zero_totals()
+    return sorted(
+        key
+        for key in live.keys() | stored.keys()
+        if live.get(key, zero) != stored.get(key, zero)
+    )
+
+
+def verify_summaries():
+    """
+    Returns the keys whose stored summary differs from the live travel data.
+    """
+    return _changed_keys(compute_summaries(), _stored_summaries())
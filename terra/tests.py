@@ -1,12 +1,27 @@
-from datetime import date
+import csv
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
 from decimal import Decimal
-
-from django.test import TestCase
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 
 
 from fiscalyear import FiscalYear
 
+from . import expressions, query_budget, report_cache, utils
+from .access import Access
 from .models import (
     Unit,
     Employee,
@@ -16,9 +31,20 @@ from .models import (
     Activity,
     Funding,
     ActualExpense,
+    FiscalYearSummary,
+    ImportCheckpoint,
+    ReportSnapshot,
 )
+from .management.commands import load_travel_data
+from .orgtree import VERSION_KEY, OrgTree, get_org_tree
+from .summaries import rebuild_summaries, verify_summaries
 from .templatetags.terra_extras import check_or_cross, currency, cap, days_cap
-from .utils import current_fiscal_year, in_fiscal_year, fiscal_year
+from .utils import (
+    current_fiscal_year,
+    in_fiscal_year,
+    fiscal_year,
+    fiscal_year_bookends,
+)
 from terra import reports
 
 
@@ -35,6 +61,18 @@ class ModelsTestCase(TestCase):
         u3 = Unit.objects.get(pk=3)
         self.assertEqual(len(u3.super_managers()), 3)
 
+    def test_unit_hierarchy_query_count(self):
+        library = Unit.objects.get(pk=1)
+        with self.assertNumQueries(1):
+            library.super_managers()
+        with self.assertNumQueries(2):
+            units, employees = library.subtree()
+        self.assertEqual(units[0], library)
+        self.assertEqual(
+            sorted(e.id for e in library.all_employees()),
+            list(Employee.objects.order_by("id").values_list("id", flat=True)),
+        )
+
     def test_employee(self):
         employee = Employee.objects.get(pk=3)
         self.assertEqual(str(employee), "Gomez, Joshua")
@@ -410,6 +448,38 @@ class UtilsTestCase(TestCase):
         self.assertTrue(in_fiscal_year(date(2018, 6, 30), 2018))
         self.assertFalse(in_fiscal_year(date(2018, 6, 30), 2019))
 
+    def test_fiscal_calendar_matches_fiscalyear(self):
+        calendar = utils.FiscalCalendar(2019, 2022)
+        day = date(2017, 1, 1)
+        while day < date(2024, 1, 1):
+            fy = FiscalYear(calendar.fiscal_year(day))
+            self.assertEqual(
+                calendar.bookends(fy.fiscal_year), (fy.start.date(), fy.end.date())
+            )
+            self.assertTrue(fy.start.date() <= day <= fy.end.date(), day)
+            day += timedelta(days=1)
+
+    def test_current_fiscal_year_changes_at_midnight(self):
+        class FakeDate(date):
+            day = date(2020, 6, 30)
+
+            @classmethod
+            def today(cls):
+                return cls.day
+
+        with patch.object(utils, "date", FakeDate), patch.object(
+            utils, "_today", (None, None)
+        ):
+            self.assertEqual(current_fiscal_year(), 2020)
+            with patch.object(utils.FiscalCalendar, "fiscal_year") as lookup:
+                self.assertEqual(current_fiscal_year(), 2020)
+                lookup.assert_not_called()
+            FakeDate.day = date(2020, 7, 1)
+            self.assertEqual(current_fiscal_year(), 2021)
+            self.assertEqual(
+                fiscal_year_bookends(), (date(2020, 7, 1), date(2021, 6, 30))
+            )
+
 
 class UnitReportsTestCase(TestCase):
 
@@ -608,25 +678,6 @@ class FundReportsTestCase(TestCase):
             with self.subTest(eid=eid):
                 self.assertTrue(eid in expected)
 
-    def test_get_treq_list(self):
-        fund = Fund.objects.get(pk=2)
-        treqs = reports.get_treq_list(fund, self.start_date, self.end_date)
-        expected = [1, 7]
-        for treq in treqs:
-            self.assertTrue(treq in expected)
-
-    def test_get_individual_data_for_treq(self):
-        fund = Fund.objects.get(pk=3)
-        treq_ids = reports.get_treq_list(fund, self.start_date, self.end_date)
-        actual = reports.get_individual_data_for_treq(
-            treq_ids, fund, self.start_date, self.end_date
-        )
-        for treq in actual:
-            self.assertEqual(treq.profdev_requested, Decimal(0))
-            self.assertEqual(treq.profdev_spent, Decimal(180))
-            self.assertEqual(treq.admin_requested, Decimal(0))
-            self.assertEqual(treq.admin_spent, Decimal(0))
-
     def test_fund_report(self):
         expected = {
             "admin_requested": Decimal("1050"),
@@ -643,6 +694,55 @@ class FundReportsTestCase(TestCase):
             with self.subTest(key=key, value=value):
                 self.assertEqual(totals[key], value)
 
+    def test_fund_report_treqs(self):
+        fund = Fund.objects.get(pk=2)
+        employees, totals = reports.fund_report(fund, self.start_date, self.end_date)
+        treqs = [treq["id"] for e in employees for treq in e["treqs"]]
+        self.assertEqual(sorted(treqs), [1, 7])
+
+    def test_fund_report_treq_amounts(self):
+        fund = Fund.objects.get(pk=3)
+        employees, totals = reports.fund_report(fund, self.start_date, self.end_date)
+        for treq in (treq for e in employees for treq in e["treqs"]):
+            self.assertEqual(treq["profdev_requested"], Decimal(0))
+            self.assertEqual(treq["profdev_spent"], Decimal(180))
+            self.assertEqual(treq["admin_requested"], Decimal(0))
+            self.assertEqual(treq["admin_spent"], Decimal(0))
+
+    def test_fund_report_subtotals_add_up(self):
+        fund = Fund.objects.get(pk=1)
+        employees, totals = reports.fund_report(fund, self.start_date, self.end_date)
+        for key in totals:
+            with self.subTest(key=key):
+                self.assertEqual(sum(e[key] for e in employees), totals[key])
+                for e in employees:
+                    self.assertEqual(sum(t[key] for t in e["treqs"]), e[key])
+
+    def test_fund_report_query_count_is_fixed(self):
+        fund = Fund.objects.get(pk=1)
+        # The grouped rows, the trips, the employees, and a look for a
+        # closed year's snapshot.
+        with self.assertNumQueries(4):
+            reports.fund_report(fund, self.start_date, self.end_date)
+        for treq in TravelRequest.objects.all():
+            copy = TravelRequest.objects.get(pk=treq.pk)
+            copy.pk = None
+            copy.return_date += timedelta(days=1)
+            copy.save()
+            for funding in treq.funding_set.all():
+                Funding.objects.create(
+                    treq=copy,
+                    fund=funding.fund,
+                    funded_by=funding.funded_by,
+                    amount=funding.amount,
+                )
+            for expense in treq.actualexpense_set.all():
+                expense.pk = None
+                expense.treq = copy
+                expense.save()
+        with self.assertNumQueries(4):
+            reports.fund_report(fund, self.start_date, self.end_date)
+
 
 class TestFundDetailView(TestCase):
 
@@ -671,6 +771,16 @@ class TestFundDetailView(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, "terra/fund.html")
 
+    def test_fund_detail_query_count_does_not_depend_on_trips(self):
+        self.client.login(username="aprigge", password="Staples50141")
+        counts = []
+        for url in ["/fund/1/2020-2020/", "/fund/1/2019-2019/", "/fund/3/2020-2020/"]:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(queries))
+        self.assertEqual(len(set(counts)), 1, counts)
+
 
 class TestFundListView(TestCase):
 
@@ -696,23 +806,27 @@ class EmployeeTypeReportsTestCase(TestCase):
         self.start_date = self.fy.start.date()
         self.end_date = self.fy.end.date()
 
-    def test_get_type_and_employees(self):
-
+    def test_type_report_groups_by_type(self):
         expected = {
-            "University Librarian": ["<Employee 4: Steel, Virginia>"],
-            "Executive": [],
-            "Unit Head": [
-                "<Employee 1: Grappone, Todd>",
-                "<Employee 6: Wang, Doris>",
-                "<Employee 3: Gomez, Joshua>",
-            ],
-            "Librarian": ["<Employee 2: Prigge, Ashton>"],
-            "Sr. Exempt Staff": ["<Employee 5: Awopetu, Tinu>"],
+            "University Librarian": ["Steel, Virginia"],
+            "Executive": ["Grappone, Todd"],
+            "Unit Head": ["Wang, Doris", "Gomez, Joshua"],
+            "Librarian": ["Prigge, Ashton"],
+            "Sr. Exempt Staff": ["Awopetu, Tinu"],
             "Other": [],
         }
-        actual = reports.get_type_and_employees()
-        for employee in expected:
-            self.assertTrue(employee in actual)
+        actual = reports.merge_data_type(
+            Employee.objects.values_list("pk", flat=True),
+            self.start_date,
+            self.end_date,
+        )
+        self.assertEqual(
+            {
+                employee_type: [e["name"] for e in value["employees"]]
+                for employee_type, value in actual["type"].items()
+            },
+            expected,
+        )
 
     def test_type_report(self):
         expected = {
@@ -941,6 +1055,52 @@ class EmployeeTypeReportsTestCase(TestCase):
                 actual["type"][employee_type]["employees"],
             )
 
+    def test_type_report_query_count(self):
+        # One grouped pass each over funding, trips, vacations and expenses,
+        # one for the names and types, and a look for a closed year's
+        # snapshot.
+        with self.assertNumQueries(6):
+            reports.merge_data_type(
+                employee_ids=[4, 1, 6, 3, 2, 5],
+                start_date=date(2019, 7, 1),
+                end_date=date(2020, 6, 30),
+            )
+
+    def test_type_data_checks_dates(self):
+        with self.assertRaises(Exception):
+            reports.get_individual_data_type([1], start_date=date(2019, 7, 1))
+        # Without dates, the current fiscal year, as in get_individual_data.
+        expected = reports.index_rows(reports.get_individual_data([1, 2]))
+        for row in reports.get_individual_data_type([1, 2]):
+            with self.subTest(eid=row["id"]):
+                self.assertEqual(row, {**row, **expected[row["id"]]})
+
+    def test_type_report_summary_matches(self):
+        rebuild_summaries()
+        employee_ids = Employee.objects.values_list("pk", flat=True)
+        start_date, end_date = date(2019, 7, 1), date(2020, 6, 30)
+        self.assertEqual(
+            reports.merge_data_type(employee_ids, start_date, end_date),
+            reports.merge_data_type(
+                employee_ids, start_date, end_date, use_summary=True
+            ),
+        )
+
+    def test_type_report_view_query_count_is_fixed(self):
+        self.client.login(username="doriswang", password="Staples50141")
+        url = "/employee_type_list/2019-2020/"
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as before:
+            self.client.get(url)
+        unit = Unit.objects.get(pk=1)
+        for i in range(10):
+            user = User.objects.create_user(f"extra{i}", last_name="Extra")
+            Employee.objects.create(user=user, unit=unit, uid=f"9000{i}")
+        with CaptureQueriesContext(connection) as after:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(after), len(before))
+
     def test_type_report_denies_anonymous(self):
         response = self.client.get("/employee_type_list/2020-2020/", follow=True)
         self.assertRedirects(
@@ -991,6 +1151,34 @@ class ReportTestCase(TestCase):
                 with self.subTest(key=key, value=value):
                     self.assertEqual(x[key], expected[key])
 
+    def test_individual_data_queries(self):
+        start_date = date(2019, 7, 1)
+        end_date = date(2020, 6, 30)
+        employee_ids = list(Employee.objects.values_list("pk", flat=True))
+        self.assertGreater(len(employee_ids), 1)
+        # One grouped query per source table, however many employees, and
+        # none with a subquery run per employee.
+        for ids in [employee_ids[:1], employee_ids]:
+            with self.subTest(employees=len(ids)):
+                with CaptureQueriesContext(connection) as queries:
+                    with self.assertNumQueries(4):
+                        reports.get_individual_data(ids, start_date, end_date)
+                for query in queries:
+                    self.assertEqual(query["sql"].upper().count("SELECT"), 1)
+                    self.assertIn("GROUP BY", query["sql"].upper())
+
+    def test_open_and_closed_request_for_one_activity(self):
+        # Requests 11 and 13 used to be the same trip, differing only in
+        # closed, which unique_travelrequest no longer allows. 13 now leaves a
+        # day later; no report boundary falls between the two dates, so the
+        # expected figures above didn't change.
+        treqs = TravelRequest.objects.filter(traveler=2, activity=5).order_by("pk")
+        self.assertEqual(
+            [(treq.pk, treq.departure_date, treq.closed) for treq in treqs],
+            [(11, date(2019, 8, 5), False), (13, date(2019, 8, 6), True)],
+        )
+        self.assertEqual({treq.fiscal_year for treq in treqs}, {2020})
+
 
 class EmployeeSubtotalTestCase(TestCase):
 
@@ -1046,6 +1234,16 @@ class EmployeeSubtotalTestCase(TestCase):
                 with self.subTest(key=key, value=value):
                     self.assertEqual(actual[employee][key], expected[employee][key])
 
+    def test_employee_total_report_query_count(self):
+        start_date = date(2019, 7, 1)
+        end_date = date(2020, 6, 30)
+        # One query for the rows, one to look for a closed year's snapshot.
+        with self.assertNumQueries(2):
+            actual = reports.employee_total_report(
+                [1, 2, 3, 4, 5, 6, 999], start_date, end_date
+            )
+        self.assertEqual(actual[999]["total_spent"], 0)
+
 
 class ActualExpenseTestCase(TestCase):
 
@@ -1096,6 +1294,36 @@ class ActualExpenseTestCase(TestCase):
                 expected["subunits"][key]["employees"].keys(),
             )
 
+    def test_actual_expense_report(self):
+        fy = fiscal_year(2020)
+        report = reports.actual_expense_report(
+            Unit.objects.get(pk=1), fy.start.date(), fy.end.date()
+        )
+        prigge = report["subunits"][2]["employees"][2]
+        self.assertEqual(
+            sorted(e["id"] for e in prigge.expenses),
+            list(
+                ActualExpense.objects.filter(
+                    treq__traveler=2,
+                    date_paid__gte=fy.start.date(),
+                    date_paid__lte=fy.end.date(),
+                )
+                .order_by("pk")
+                .values_list("pk", flat=True)
+            ),
+        )
+        self.assertEqual(
+            sum(e["total"] for e in prigge.expenses), prigge.data["total_spent"]
+        )
+        for row in prigge.expenses:
+            expense = ActualExpense.objects.get(pk=row["id"])
+            self.assertEqual(row["traveler"], str(expense.treq.traveler))
+            self.assertEqual(
+                row["unit_manager"], str(expense.treq.traveler.unit.manager)
+            )
+            self.assertEqual(row["activity"], str(expense.treq.activity))
+            self.assertEqual(row["fund"], str(expense.fund))
+
     def test_actual_expenses(self):
         actualexpense = ActualExpense.objects.get(pk=2)
         self.assertEqual(actualexpense.total, Decimal("325.00000"))
@@ -1149,6 +1377,155 @@ class TravelRequestReportTestCase(TestCase):
         for n in range(0, len(treq_list) - 1):
             self.assertEqual(actual[n], expected[n])
 
+    def test_employee_treq_report(self):
+        fy = fiscal_year(2020)
+        employee = Employee.objects.get(pk=2)
+        actual = reports.employee_treq_report(
+            employee, start_date=fy.start.date(), end_date=fy.end.date()
+        )
+        # Only Prigge's FY2020 requests, keyed by treq id.
+        self.assertEqual(list(actual.keys()), [1, 4, 5])
+        self.assertEqual(actual[1]["funding_fy"], Decimal("4000.00000"))
+        self.assertEqual(actual[5]["actualexpenses_fy"], Decimal("1420.00000"))
+        self.assertEqual(actual[5]["treq"].activity.name, "Summer Con")
+
+    def test_employee_export(self):
+        self.client.login(username="aprigge", password="Staples50141")
+        response = self.client.get("/employee/2/2020-2020/export/")
+        self.assertEqual(response.status_code, 200)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertTrue(any(line.startswith("Code4lib 2020,") for line in lines))
+        total = lines[-1].split(",")
+        self.assertEqual(total[0], "Total")
+        self.assertEqual(Decimal(total[5]), Decimal("4000"))
+        self.assertEqual(Decimal(total[6]), Decimal("1420"))
+        self.assertEqual(total[7], "15")
+
+    def test_exports_stream_csv(self):
+        self.client.login(username="doriswang", password="Staples50141")
+        for url in [
+            "/employee/2/2020-2020/export/",
+            "/unit/1/2020-2020/export/",
+            "/unit/1/2020-2020/org_export/",
+            "/fund/1/2020-2020/export/",
+            "/employee_type_list/2020-2020/export/",
+            "/actual_expense_report/2020-2020/export/",
+            "/employee/2/2019-2021/by_year/export/",
+            "/unit/1/2019-2021/by_year/export/",
+            "/fund/1/2019-2021/by_year/export/",
+        ]:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.streaming)
+                self.assertEqual(response["Content-Type"], "text/csv")
+                content = b"".join(response.streaming_content).decode()
+                self.assertGreater(len(content.splitlines()), 1)
+
+
+class YearlyReportTestCase(TestCase):
+    fixtures = ["sample_data.json"]
+
+    def test_years_match_single_year_reports(self):
+        employee_ids = list(Employee.objects.values_list("id", flat=True))
+        with self.assertNumQueries(1):
+            years = reports.get_yearly_data(employee_ids, 2018, 2021)
+        for year in range(2018, 2022):
+            with self.subTest(fiscal_year=year):
+                start_date, end_date = fiscal_year_bookends(year)
+                for row in reports.get_individual_data(
+                    employee_ids, start_date, end_date
+                ):
+                    self.assertEqual(
+                        row, {k: years[row["id"]][year][k] for k in row.keys()}
+                    )
+
+    def test_fund_years_match_fund_reports(self):
+        fund = Fund.objects.get(pk=1)
+        employees, totals = reports.fund_yearly_report(fund, 2018, 2021)
+        self.assertEqual(list(totals), [2018, 2019, 2020, 2021, "all"])
+        for year in range(2018, 2022):
+            start_date, end_date = fiscal_year_bookends(year)
+            expected = reports.fund_report(fund, start_date, end_date)[1]
+            self.assertEqual(expected, {k: totals[year][k] for k in expected})
+        expected = reports.fund_report(fund, date(2017, 7, 1), date(2021, 6, 30))[1]
+        self.assertEqual(expected, {k: totals["all"][k] for k in expected})
+
+    def test_total_matches_range_report(self):
+        # A trip that departs in FY2019 and returns in FY2020 counts in
+        # neither year, but does count in the report for both.
+        employee = Employee.objects.get(pk=2)
+        fund = Fund.objects.get(pk=1)
+        activity = Activity.objects.create(
+            name="Straddle", start=date(2019, 6, 28), end=date(2019, 7, 3)
+        )
+        treq = TravelRequest.objects.create(
+            traveler=employee,
+            activity=activity,
+            departure_date=activity.start,
+            return_date=activity.end,
+            days_ooo=4,
+        )
+        Funding.objects.create(
+            treq=treq, fund=fund, funded_by=employee, amount=Decimal("500")
+        )
+        start_date, end_date = date(2018, 7, 1), date(2020, 6, 30)
+        [expected] = reports.get_individual_data([employee.id], start_date, end_date)
+
+        years = reports.employee_yearly_report(employee, 2019, 2020)
+        self.assertEqual(years["all"], reports._add_row_totals(expected))
+        self.assertEqual(
+            years["all"]["profdev_requested"],
+            years[2019]["profdev_requested"] + years[2020]["profdev_requested"] + 500,
+        )
+
+        report = reports.unit_yearly_report(employee.unit, 2019, 2020)
+        [row] = [
+            e.years["all"]
+            for subunit in report["subunits"].values()
+            for e in subunit["employees"].values()
+            if e.id == employee.id
+        ]
+        self.assertEqual(row, expected)
+
+        employees, totals = reports.fund_yearly_report(fund, 2019, 2020)
+        expected = reports.fund_report(fund, start_date, end_date)[1]
+        self.assertEqual(expected, {k: totals["all"][k] for k in expected})
+        self.assertNotEqual(
+            totals["all"]["total_requested"],
+            totals[2019]["total_requested"] + totals[2020]["total_requested"],
+        )
+
+    def test_by_year_views(self):
+        self.client.login(username="doriswang", password="Staples50141")
+        for url, template in [
+            ("/employee/2/2019-2021/by_year/", "terra/employee_by_year.html"),
+            ("/unit/1/2019-2021/by_year/", "terra/unit_by_year.html"),
+            ("/fund/1/2019-2021/by_year/", "terra/fund_by_year.html"),
+        ]:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTemplateUsed(response, template)
+                self.assertContains(response, "FY2020")
+
+    def test_by_year_export(self):
+        self.client.login(username="doriswang", password="Staples50141")
+        response = self.client.get("/unit/1/2019-2021/by_year/export/")
+        content = b"".join(response.streaming_content).decode()
+        lines = list(csv.reader(content.splitlines()))
+        self.assertEqual(
+            lines[0][:5],
+            ["Employee", "Type", "FY2019 Requested", "FY2019 Spent", "FY2019 Days Out"],
+        )
+        self.assertEqual(lines[0][-1], "Total Days Out")
+        report = reports.unit_yearly_report(Unit.objects.get(pk=1), 2019, 2021)
+        totals = lines[-1]
+        self.assertEqual(totals[0], "Totals")
+        self.assertEqual(
+            Decimal(totals[5]), report["unit_years"][2020]["total_requested"]
+        )
+
 
 class OrgChartTestCase(TestCase):
 
@@ -1171,3 +1548,1249 @@ class OrgChartTestCase(TestCase):
         self.client.login(username="tgrappone", password="Staples50141")
         response = self.client.get("/unit/1/2020-2020/org_export/")
         self.assertEqual(response.status_code, 403)
+
+
+class FiscalYearSummaryTestCase(TestCase):
+    fixtures = ["sample_data.json"]
+
+    def setUp(self):
+        # Fixtures load without signals, so the summaries start empty.
+        rebuild_summaries()
+
+    def test_rebuild_matches_travel_data(self):
+        self.assertTrue(FiscalYearSummary.objects.exists())
+        self.assertEqual(verify_summaries(), [])
+        call_command("rebuild_summaries", "--verify-only", stdout=StringIO())
+
+    def test_summaries_follow_edits(self):
+        treq = TravelRequest.objects.get(pk=5)
+        Funding.objects.create(
+            funded_by=Employee.objects.get(pk=1),
+            treq=treq,
+            fund=Fund.objects.get(pk=1),
+            amount=Decimal("250"),
+        )
+        self.assertEqual(verify_summaries(), [])
+        expense = treq.actualexpense_set.first()
+        expense.date_paid = date(2021, 8, 1)
+        expense.save()
+        self.assertEqual(verify_summaries(), [])
+        treq.administrative = not treq.administrative
+        treq.return_date = date(2020, 8, 1)
+        treq.save()
+        self.assertEqual(verify_summaries(), [])
+        Vacation.objects.filter(treq__traveler=treq.traveler).delete()
+        self.assertEqual(verify_summaries(), [])
+        treq.actualexpense_set.all().delete()
+        self.assertEqual(verify_summaries(), [])
+
+    def test_summary_reports_match_live_reports(self):
+        unit = Unit.objects.get(pk=1)
+        employee_ids = list(Employee.objects.values_list("id", flat=True))
+        for start_year, end_year in [(2019, 2019), (2020, 2020), (2019, 2021)]:
+            with self.subTest(fiscal_years=(start_year, end_year)):
+                start_date = fiscal_year(start_year).start.date()
+                end_date = fiscal_year(end_year).end.date()
+                self.assertEqual(
+                    reports.get_summary_data(employee_ids, start_date, end_date),
+                    reports.get_individual_data(employee_ids, start_date, end_date),
+                )
+                self.assertEqual(
+                    reports.unit_report(unit, start_date, end_date, use_summary=True),
+                    reports.unit_report(unit, start_date, end_date),
+                )
+                self.assertEqual(
+                    reports.employee_total_report(
+                        employee_ids, start_date, end_date, use_summary=True
+                    ),
+                    reports.employee_total_report(employee_ids, start_date, end_date),
+                )
+
+
+class FiscalYearColumnsTestCase(TestCase):
+    fixtures = ["sample_data.json"]
+
+    def test_fiscal_year_expression(self):
+        treq = TravelRequest.objects.get(pk=1)
+        days = [date(2019, 6, 30), date(2019, 7, 1), date(2019, 12, 31)]
+        days += [date(2020, 1, 1), date(2020, 2, 29), date(2020, 8, 31)]
+        for day in days:
+            with self.subTest(day=day):
+                expense = ActualExpense.objects.create(
+                    treq=treq,
+                    type="OTH",
+                    total=Decimal("1"),
+                    fund=Fund.objects.get(pk=1),
+                    date_paid=day,
+                )
+                annotated = ActualExpense.objects.annotate(
+                    fy=expressions.FiscalYear("date_paid")
+                ).get(pk=expense.pk)
+                self.assertEqual(annotated.fy, current_fiscal_year(day))
+                self.assertEqual(annotated.fiscal_year, current_fiscal_year(day))
+                self.assertTrue(annotated.in_fiscal_year(annotated.fiscal_year))
+
+    def test_fiscal_year_expression_ignores_fiscalyear_start(self):
+        # The fiscalyear package starts years in October unless terra.utils
+        # has set it; the expression must not depend on that.
+        treq = TravelRequest.objects.get(pk=1)
+        with patch("fiscalyear.START_MONTH", 10):
+            self.assertEqual(expressions.FiscalYear("return_date").months(), 6)
+            annotated = TravelRequest.objects.annotate(
+                fy=expressions.FiscalYear("return_date")
+            ).get(pk=treq.pk)
+        self.assertEqual(annotated.fy, current_fiscal_year(treq.return_date))
+
+    def test_columns_follow_edits(self):
+        treq = TravelRequest.objects.get(pk=1)
+        treq.return_date = date(2020, 7, 3)
+        treq.save()
+        treq.refresh_from_db()
+        self.assertEqual(treq.fiscal_year, 2021)
+        self.assertIn(treq, treq.traveler.treqs_in_fiscal_year(2021))
+        vacation = Vacation.objects.get(pk=1)
+        vacation.end = date(2020, 3, 2)
+        vacation.save()
+        vacation.refresh_from_db()
+        self.assertEqual(vacation.duration, vacation.vacation_days())
+        self.assertEqual(vacation.duration, 15)
+
+
+class OrgTreeTestCase(TestCase):
+    fixtures = ["sample_data.json"]
+
+    def test_hierarchy_from_memory(self):
+        library = Unit.objects.get(pk=1)
+        fund = Fund.objects.get(pk=1)
+        head = Employee.objects.get(pk=4)
+        # Tests run inside a transaction, where the tree is normally skipped.
+        tree = OrgTree("test")
+        expected = reports.get_subunits_and_employees(library)
+        with patch("terra.models.get_org_tree", return_value=tree):
+            with self.assertNumQueries(0):
+                self.assertEqual([m.id for m in fund.super_managers()], [3, 1, 4])
+                self.assertEqual(len(Unit(pk=3).super_managers()), 3)
+                staff, mgrs = head.full_team()
+                self.assertEqual((len(staff), len(mgrs)), (6, 3))
+                self.assertEqual(len(Employee(pk=3).direct_reports()), 2)
+                actual = reports.get_subunits_and_employees(library)
+                for key, subunit in expected["subunits"].items():
+                    self.assertEqual(
+                        [str(e) for e in actual["subunits"][key]["employees"].values()],
+                        [str(e) for e in subunit["employees"].values()],
+                    )
+        self.assertIsNone(get_org_tree())
+
+    def test_edits_invalidate_tree(self):
+        version = cache.get(VERSION_KEY)
+        employee = Employee.objects.get(pk=2)
+        employee.supervisor_id = 4
+        with self.captureOnCommitCallbacks(execute=True):
+            employee.save()
+        self.assertIsNotNone(cache.get(VERSION_KEY))
+        self.assertNotEqual(cache.get(VERSION_KEY), version)
+
+    def test_logins_keep_tree(self):
+        cache.set(VERSION_KEY, "before", None)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.login(username="doriswang", password="Staples50141")
+        self.assertEqual(cache.get(VERSION_KEY), "before")
+
+
+class ReportCacheTestCase(TestCase):
+    fixtures = ["sample_data.json"]
+
+    def setUp(self):
+        # Tests run inside a transaction, where the cache is normally skipped.
+        for target in ["terra.report_cache.connection", "terra.orgtree.connection"]:
+            patcher = patch(target)
+            patcher.start().in_atomic_block = False
+            self.addCleanup(patcher.stop)
+        patcher = patch("terra.orgtree._tree", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.start_date, self.end_date = fiscal_year_bookends(2020)
+        self.employee_ids = [4, 1, 6, 3, 2, 5]
+
+    def reports(self):
+        return {
+            "unit": lambda: reports.unit_report(
+                Unit.objects.get(pk=1), self.start_date, self.end_date
+            )["unit_totals"],
+            "fund": lambda: reports.fund_report(
+                Fund.objects.get(pk=1), self.start_date, self.end_date
+            ),
+            "employee_type": lambda: reports.merge_data_type(
+                self.employee_ids, self.start_date, self.end_date
+            ),
+            "employee_total": lambda: reports.employee_total_report(
+                self.employee_ids, self.start_date, self.end_date
+            ),
+        }
+
+    def test_repeat_reports_come_from_cache(self):
+        for kind, report in self.reports().items():
+            with self.subTest(kind=kind):
+                expected = report()
+                with CaptureQueriesContext(connection) as queries:
+                    actual = report()
+                self.assertEqual(actual, expected)
+                for query in queries:
+                    if "terra_fund" in query["sql"] or "terra_unit" in query["sql"]:
+                        continue  # looking up the unit or fund itself
+                    self.assertIn("terra_cache", query["sql"])
+
+    def test_edits_retire_cached_reports(self):
+        before = {kind: report() for kind, report in self.reports().items()}
+        version = report_cache.report_version()
+        funding = Funding.objects.filter(fund=1, treq__traveler=2).first()
+        funding.amount += 100
+        with self.captureOnCommitCallbacks(execute=True):
+            funding.save()
+        self.assertNotEqual(report_cache.report_version(), version)
+        for kind, report in self.reports().items():
+            with self.subTest(kind=kind):
+                self.assertNotEqual(report(), before[kind])
+
+    def test_logins_keep_cached_reports(self):
+        version = report_cache.report_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.login(username="doriswang", password="Staples50141")
+        self.assertEqual(report_cache.report_version(), version)
+        user = User.objects.get(username="doriswang")
+        user.last_name = "Wong"
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        self.assertNotEqual(report_cache.report_version(), version)
+
+    def test_reports_skip_cache_in_transactions(self):
+        with patch("terra.report_cache.connection") as patched:
+            patched.in_atomic_block = True
+            with CaptureQueriesContext(connection) as queries:
+                for report in self.reports().values():
+                    report()
+        self.assertFalse(any("terra:report" in q["sql"] for q in queries))
+
+
+class ReportSingleFlightTestCase(TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        # A shared in-memory cache, which other threads can see as well.
+        settings = self.settings(
+            CACHES={
+                "default": {
+                    "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                    "LOCATION": "single-flight",
+                }
+            },
+            REPORT_LOCK_DIR=tmpdir.name,
+        )
+        self.lock_dir = tmpdir.name
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(cache.clear)
+        patcher = patch("terra.report_cache.connection")
+        patcher.start().in_atomic_block = False
+        self.addCleanup(patcher.stop)
+
+    def test_report_lock(self):
+        others = []
+
+        def other():
+            with report_cache.report_lock("test", 0) as locked:
+                others.append(locked)
+
+        with report_cache.report_lock("test", 0) as first:
+            thread = threading.Thread(target=other)
+            thread.start()
+            thread.join(5)
+            # A report built while building one that holds the lock.
+            with report_cache.report_lock("other", 0) as nested:
+                self.assertTrue(nested)
+        self.assertTrue(first)
+        self.assertEqual(others, [False])
+        with report_cache.report_lock("test", 0) as third:
+            self.assertTrue(third)
+
+    def test_report_lock_files_are_removed(self):
+        for n in range(5):
+            with report_cache.report_lock(f"test-{n}", 0) as locked:
+                self.assertTrue(locked)
+                self.assertEqual(len(os.listdir(self.lock_dir)), 1)
+        self.assertEqual(os.listdir(self.lock_dir), [])
+
+    def test_report_lock_waiters_take_turns(self):
+        taken = threading.Event()
+        holders = []
+        results = []
+
+        def other():
+            with report_cache.report_lock("test", 5) as locked:
+                # Whether it was taken, and by how many others at once.
+                results.append((locked, len(holders)))
+                holders.append(None)
+                taken.set()
+                time.sleep(0.2)
+                holders.pop()
+
+        with report_cache.report_lock("test", 0):
+            threads = [threading.Thread(target=other) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            time.sleep(0.2)
+            self.assertFalse(taken.is_set())
+        for thread in threads:
+            thread.join(5)
+        # Each waiter took the lock in turn, and the file went with the last.
+        self.assertEqual(results, [(True, 0), (True, 0)])
+        self.assertEqual(os.listdir(self.lock_dir), [])
+
+    def test_concurrent_requests_compute_once(self):
+        started = threading.Event()
+        release = threading.Event()
+        computed = []
+        results = []
+
+        def compute():
+            started.set()
+            release.wait(5)
+            computed.append(1)
+            return "report"
+
+        def request():
+            results.append(report_cache.cached_report("test", [1], compute))
+
+        threads = [threading.Thread(target=request) for _ in range(3)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(computed, [1])
+        self.assertEqual(results, ["report"] * 3)
+
+    def test_serve_stale_while_refreshing(self):
+        refreshes = []
+        with patch("terra.report_cache._in_background", refreshes.append):
+            report_cache.cached_report("test", [1], lambda: "old")
+            report_cache._bump_version()
+            with self.settings(REPORT_SERVE_STALE=False):
+                self.assertEqual(
+                    report_cache.cached_report("test", [2], lambda: "other"), "other"
+                )
+            with self.settings(REPORT_SERVE_STALE=True):
+                report = report_cache.cached_report("test", [1], lambda: "new")
+                self.assertEqual(report, "old")
+                self.assertEqual(len(refreshes), 1)
+                refreshes[0]()
+                report = report_cache.cached_report("test", [1], lambda: "newer")
+                self.assertEqual(report, "new")
+                self.assertEqual(len(refreshes), 1)
+
+
+class ReportSnapshotTestCase(TestCase):
+    fixtures = ["sample_data.json"]
+
+    def setUp(self):
+        self.start_date, self.end_date = fiscal_year_bookends(2020)
+        self.fund = Fund.objects.get(pk=1)
+        self.employee_ids = list(Employee.objects.values_list("pk", flat=True))
+
+    def close(self, *args):
+        call_command("close_fiscal_year", *args, stdout=StringIO())
+
+    def reports(self):
+        return {
+            "unit": reports.unit_report(
+                Unit.objects.get(pk=1), self.start_date, self.end_date
+            )["unit_totals"],
+            "fund": reports.fund_report(self.fund, self.start_date, self.end_date),
+            "employee_type": reports.merge_data_type(
+                self.employee_ids, self.start_date, self.end_date
+            ),
+            "employee_total": reports.employee_total_report(
+                [2], self.start_date, self.end_date
+            ),
+            "actual_expense": reports.get_expenses_by_traveler(
+                self.start_date, self.end_date
+            ),
+        }
+
+    def test_closed_year_reads_snapshots(self):
+        expected = self.reports()
+        self.close("2020")
+        self.assertEqual(
+            set(ReportSnapshot.objects.values_list("kind", flat=True)),
+            {"unit", "fund", "employee_type", "employee_total", "actual_expense"},
+        )
+        self.assertEqual(self.reports(), expected)
+        with CaptureQueriesContext(connection) as queries:
+            reports.fund_report(self.fund, self.start_date, self.end_date)
+        self.assertEqual(len(queries), 1)
+        self.assertIn("terra_reportsnapshot", queries[0]["sql"])
+
+    def test_views_read_snapshots(self):
+        self.close("2020")
+        self.client.login(username="doriswang", password="Staples50141")
+        for url in [
+            "/unit/1/2020-2020/",
+            "/unit/1/2020-2020/export/",
+            "/fund/1/2020-2020/",
+            "/fund/1/2020-2020/export/",
+            "/employee_type_list/2020-2020/",
+            "/actual_expense_report/2020-2020/export/",
+        ]:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                    b"".join(getattr(response, "streaming_content", []))
+                self.assertEqual(response.status_code, 200)
+                for query in queries:
+                    for table in ["terra_funding", "terra_actualexpense"]:
+                        self.assertNotIn(table, query["sql"])
+
+    def test_edits_mark_closed_years_stale(self):
+        self.close("2019", "2020")
+        expense = ActualExpense.objects.filter(
+            date_paid__gte=self.start_date, date_paid__lte=self.end_date
+        ).first()
+        expense.total += 100
+        expense.save()
+        self.assertEqual(
+            set(
+                ReportSnapshot.objects.filter(stale=True).values_list(
+                    "fiscal_year", flat=True
+                )
+            ),
+            {2020},
+        )
+        self.assertTrue(ReportSnapshot.objects.filter(fiscal_year=2019).exists())
+        self.assertFalse(
+            ReportSnapshot.objects.filter(fiscal_year=2019, stale=True).exists()
+        )
+        # Stale snapshots are passed over for the travel data.
+        live = reports.fund_report(self.fund, self.start_date, self.end_date)
+        self.close("--stale")
+        self.assertFalse(ReportSnapshot.objects.filter(stale=True).exists())
+        self.assertEqual(
+            reports.fund_report(self.fund, self.start_date, self.end_date), live
+        )
+
+    def test_reopen_and_open_years(self):
+        self.close("2020")
+        self.close("2020", "--reopen")
+        self.assertFalse(ReportSnapshot.objects.exists())
+        with self.assertRaises(CommandError):
+            self.close(str(current_fiscal_year()))
+
+
+class AccessTestCase(TestCase):
+    fixtures = ["sample_data.json"]
+
+    def can_view_employee(self, viewer, employee):
+        eligible = [employee, employee.supervisor] + employee.unit.super_managers()
+        return viewer in eligible or viewer.has_full_report_access()
+
+    def can_view_unit(self, viewer, unit):
+        return viewer in unit.super_managers() or viewer.has_full_report_access()
+
+    def test_access_matches_model_checks(self):
+        employees = list(Employee.objects.select_related("user"))
+        units = list(Unit.objects.all())
+        for viewer in employees:
+            for tree in [None, OrgTree("test")]:
+                with patch("terra.access.get_org_tree", return_value=tree):
+                    access = Access(viewer.user)
+                    self.assertEqual(
+                        access.full_access, viewer.has_full_report_access()
+                    )
+                    self.assertEqual(access.is_ul, bool(viewer.is_UL()))
+                    self.assertEqual(access.is_unit_manager, viewer.is_unit_manager())
+                    self.assertEqual(access.is_fund_manager, viewer.is_fund_manager())
+                    for employee in employees:
+                        self.assertEqual(
+                            access.can_view_employee(employee.pk),
+                            self.can_view_employee(viewer, employee),
+                        )
+                    for unit in units:
+                        self.assertEqual(
+                            access.can_view_unit(unit.pk),
+                            self.can_view_unit(viewer, unit),
+                        )
+
+    def test_access_query_count(self):
+        user = User.objects.get(username="tawopetu")
+        with self.assertNumQueries(1):
+            access = Access(user)
+            self.assertFalse(access.full_access)
+            self.assertTrue(access.is_unit_manager)
+        with self.assertNumQueries(2):
+            self.assertTrue(access.can_view_employee(5))
+            self.assertFalse(access.can_view_employee(3))
+            self.assertTrue(access.can_view_unit(access.employee.unit_id))
+
+    def test_anonymous_access(self):
+        self.client.logout()
+        response = self.client.get("/accounts/login/")
+        access = response.wsgi_request.access
+        self.assertIsNone(access.employee)
+        self.assertFalse(access.full_access)
+        self.assertFalse(access.can_view_employee(1))
+
+
+class AdminChangelistTestCase(TestCase):
+    fixtures = ["sample_data.json"]
+
+    changelists = [
+        "/admin/terra/unit/",
+        "/admin/terra/employee/",
+        "/admin/terra/travelrequest/",
+        "/admin/terra/vacation/",
+        "/admin/terra/fund/",
+        "/admin/terra/funding/",
+        "/admin/terra/actualexpense/",
+    ]
+
+    def setUp(self):
+        self.client.force_login(
+            User.objects.create_superuser("admin", "admin@example.com", "admin")
+        )
+
+    def query_counts(self):
+        counts = {}
+        for url in self.changelists:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            counts[url] = len(queries)
+        return counts
+
+    def test_changelist_query_counts_are_fixed(self):
+        before = self.query_counts()
+        for treq in TravelRequest.objects.all():
+            copy = TravelRequest.objects.get(pk=treq.pk)
+            copy.pk = None
+            copy.return_date += timedelta(days=1)
+            copy.save()
+            for funding in treq.funding_set.all():
+                Funding.objects.create(
+                    treq=copy,
+                    fund=funding.fund,
+                    funded_by=funding.funded_by,
+                    amount=funding.amount,
+                )
+            for expense in treq.actualexpense_set.all():
+                expense.pk = None
+                expense.treq = copy
+                expense.save()
+        self.assertEqual(self.query_counts(), before)
+
+    def test_travelrequest_totals(self):
+        response = self.client.get("/admin/terra/travelrequest/?o=11")
+        treqs = list(response.context["cl"].result_list)
+        self.assertEqual(
+            [t.funding_total for t in treqs],
+            sorted(t.total_funding() for t in treqs),
+        )
+        for treq in treqs:
+            self.assertEqual(treq.expense_total, treq.actual_expenses())
+        response = self.client.get("/admin/terra/unit/?o=3")
+        units = list(response.context["cl"].result_list)
+        self.assertEqual(
+            [u.num_employees for u in units],
+            sorted(u.employee_count() for u in units),
+        )
+
+
+@skipUnless(connection.vendor == "postgresql", "EXPLAIN output is PostgreSQL's")
+class ReportIndexTestCase(TransactionTestCase):
+    # Committed data, so the tables can be vacuumed as they would be in
+    # production. Inside a test transaction, dead rows left by earlier tests
+    # and an empty visibility map leave the planner's pick between similar
+    # indexes to chance.
+    fixtures = ["sample_data.json"]
+    # Restores the content types the fixture's permissions refer to.
+    serialized_rollback = True
+
+    index_scan = re.compile(r"Index (?:Only )?Scan (?:using|on) (\w+)")
+
+    def setUp(self):
+        # Twenty years of monthly trips up to this one, so each traveler has
+        # far more trips than any one report range covers, though the
+        # default range, the current fiscal year, still has some.
+        activity = Activity.objects.get(pk=1)
+        first_year = date.today().year - 19
+        TravelRequest.objects.bulk_create(
+            TravelRequest(
+                traveler=employee,
+                activity=activity,
+                departure_date=date(first_year + month // 12, month % 12 + 1, 1),
+                return_date=date(first_year + month // 12, month % 12 + 1, 3),
+                days_ooo=3,
+            )
+            for employee in Employee.objects.all()
+            for month in range(240)
+        )
+        # Each funded and paid from one of many funds.
+        Fund.objects.bulk_create(
+            Fund(account="605000", cost_center="LD", fund=f"{n:05d}", manager_id=3)
+            for n in range(20)
+        )
+        funds = list(Fund.objects.all())
+        treqs = list(TravelRequest.objects.filter(days_ooo=3, departure_date__day=1))
+        Funding.objects.bulk_create(
+            Funding(
+                treq=treq,
+                fund=funds[treq.pk % len(funds)],
+                funded_by_id=3,
+                amount=100,
+            )
+            for treq in treqs
+        )
+        ActualExpense.objects.bulk_create(
+            ActualExpense(
+                treq=treq,
+                type="LDG",
+                total=100,
+                fund=funds[treq.pk % len(funds)],
+                date_paid=treq.return_date,
+            )
+            for treq in treqs
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("VACUUM ANALYZE")
+
+    def indexes_used(self, report):
+        # In a transaction, so the reports skip the cache.
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as queries:
+                report()
+            used = set()
+            with connection.cursor() as cursor:
+                # The fixture tables are small; make the planner show which
+                # index it would pick once they aren't.
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                for query in queries:
+                    cursor.execute("EXPLAIN " + query["sql"])
+                    for (line,) in cursor.fetchall():
+                        used.update(self.index_scan.findall(line))
+        return used
+
+    def assertIndexesUsed(self, report, *indexes):
+        used = self.indexes_used(report)
+        self.assertLessEqual(set(indexes), used, f"plans used {sorted(used)}")
+
+    def test_unit_report(self):
+        unit = Unit.objects.get(pk=1)
+        self.assertIndexesUsed(
+            lambda: reports.unit_report(unit),
+            "treq_report_idx",
+            "funding_treq_idx",
+            "expense_paid_idx",
+        )
+
+    def test_fund_report(self):
+        fund = Fund.objects.get(pk=1)
+        self.assertIndexesUsed(
+            lambda: reports.fund_report(fund),
+            "funding_fund_treq_idx",
+            "expense_fund_paid_idx",
+        )
+
+    def test_employee_reports(self):
+        employee_ids = list(Employee.objects.values_list("pk", flat=True))
+        start_date, end_date = reports.check_dates(None, None)
+        self.assertIndexesUsed(
+            lambda: reports.employee_total_report(employee_ids, start_date, end_date),
+            "treq_report_idx",
+            "funding_treq_idx",
+            "expense_treq_paid_idx",
+        )
+        # The type report sums expenses in one grouped pass, like the unit
+        # report.
+        self.assertIndexesUsed(
+            lambda: reports.merge_data_type(employee_ids, start_date, end_date),
+            "treq_report_idx",
+            "funding_treq_idx",
+            "expense_paid_idx",
+        )
+
+    def test_treq_report(self):
+        employee = Employee.objects.get(pk=1)
+        self.assertIndexesUsed(
+            lambda: reports.employee_treq_report(employee),
+            "funding_treq_idx",
+            "expense_treq_paid_idx",
+        )
+
+
+TRAVEL_FILE = "terra/fixtures/test_travel_data.csv"
+
+
+class LoadTravelDataTestCase(TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.tmpdir = tmpdir.name
+        # load_units looks parents up by position in the file, which only
+        # works on an empty database, so create test_units.csv by hand.
+        library = Unit.objects.create(name="General Library", type="1")
+        for name in ["East Asian Library", "Library Business Services"]:
+            Unit.objects.create(name=name, type="2", parent_unit=library)
+        call_command(
+            "load_employees",
+            "terra/fixtures/test_employees.csv",
+            stdout=StringIO(),
+            stderr=StringIO(),
+        )
+
+    def travel_data(self):
+        # Everything the loader writes, without primary keys or timestamps.
+        return {
+            "users": sorted(
+                User.objects.values_list("username", "email", "last_name", "first_name")
+            ),
+            "employees": sorted(
+                Employee.objects.values_list("uid", "user__username", "unit__name")
+            ),
+            "activities": sorted(Activity.objects.values_list("name", "start", "end")),
+            "funds": sorted(
+                Fund.objects.values_list(
+                    "account", "cost_center", "fund", "manager__uid"
+                )
+            ),
+            "treqs": sorted(
+                TravelRequest.objects.values_list(
+                    "traveler__uid",
+                    "activity__name",
+                    "departure_date",
+                    "return_date",
+                    "days_ooo",
+                )
+            ),
+            "fundings": sorted(
+                Funding.objects.values_list(
+                    "treq__traveler__uid",
+                    "treq__activity__name",
+                    "fund__cost_center",
+                    "funded_by__uid",
+                    "amount",
+                )
+            ),
+            "expenses": sorted(
+                ActualExpense.objects.values_list(
+                    "treq__traveler__uid",
+                    "treq__activity__name",
+                    "fund__cost_center",
+                    "type",
+                    "total",
+                    "date_paid",
+                )
+            ),
+        }
+
+    def write_csv(self, name, lines):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, "w", newline="") as f:
+            f.write("\n".join(lines) + "\n")
+        return path
+
+    def load(self, *args, files=[TRAVEL_FILE]):
+        # Loads the files, then rolls back so each mode starts afresh.
+        savepoint = transaction.savepoint()
+        for travel_file in files:
+            call_command(
+                "load_travel_data",
+                travel_file,
+                *args,
+                stdout=StringIO(),
+                stderr=StringIO(),
+            )
+        data = self.travel_data()
+        self.assertEqual(verify_summaries(), [])
+        transaction.savepoint_rollback(savepoint)
+        return data
+
+    def test_bulk_load_matches_row_load(self):
+        # The second file repeats two trips, which are updated, not
+        # duplicated. Their amounts are new lines, so they are added.
+        lines = open(TRAVEL_FILE, encoding="utf-8-sig").read().splitlines()
+        lines[1] = lines[1].replace('"2","600001"', '"3","600001"')
+        files = [TRAVEL_FILE, self.write_csv("repeat.csv", lines[:3])]
+        expected = self.load(files=files)
+        self.assertEqual(len(expected["treqs"]), 3)
+        self.assertIn(3, [treq[-1] for treq in expected["treqs"]])
+        self.assertEqual(len(expected["activities"]), 2)
+        self.assertEqual(len(expected["expenses"]), 5)
+        self.assertEqual(self.load("--bulk", files=files), expected)
+
+    def test_natural_keys_are_unique(self):
+        activity = Activity.objects.create(
+            name="Conference", start=date(2020, 1, 1), end=date(2020, 1, 2)
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Activity.objects.create(
+                name="Conference", start=activity.start, end=activity.end
+            )
+        employee = Employee.objects.first()
+        Fund.objects.create(
+            account="600001", cost_center="PD", fund="19900", manager=employee
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Fund.objects.create(
+                account="600001", cost_center="PD", fund="19900", manager=employee
+            )
+        trip = {
+            "traveler": employee,
+            "activity": activity,
+            "departure_date": activity.start,
+            "return_date": activity.end,
+        }
+        TravelRequest.objects.create(days_ooo=2, **trip)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            TravelRequest.objects.create(days_ooo=1, **trip)
+        # The same trip can also have an administrative request.
+        TravelRequest.objects.create(days_ooo=2, administrative=True, **trip)
+
+    def test_check_natural_keys(self):
+        out = StringIO()
+        call_command("check_natural_keys", stdout=out)
+        self.assertIn("All natural-key constraints are in place", out.getvalue())
+
+    @skipUnless(connection.vendor == "postgresql", "COPY needs PostgreSQL")
+    def test_copy_load_matches_bulk_load(self):
+        lines = open(TRAVEL_FILE, encoding="utf-8-sig").read().splitlines()
+        lines[1] = lines[1].replace('"2","600001"', '"3","600001"')
+        bad_unit = lines[2].replace("East Asian Library", "Nowhere")
+        files = [TRAVEL_FILE, self.write_csv("repeat.csv", lines[:3] + [bad_unit])]
+        expected = self.load("--bulk", files=files)
+        self.assertEqual(self.load("--copy", files=files), expected)
+
+    @skipUnless(
+        connection.vendor == "postgresql" and os.getenv("TERRA_BENCHMARK"),
+        "set TERRA_BENCHMARK=1 to time --copy against --bulk on PostgreSQL",
+    )
+    def test_copy_benchmark(self):
+        unit = Unit.objects.get(name="East Asian Library")
+        users = User.objects.bulk_create(
+            User(username=f"bench{i}", email=f"bench{i}@example.com")
+            for i in range(500)
+        )
+        Employee.objects.bulk_create(
+            Employee(user=user, uid=f"{900000000 + i}", unit=unit)
+            for i, user in enumerate(users)
+        )
+        lines = [open(TRAVEL_FILE, encoding="utf-8-sig").readline().strip()]
+        for i in range(100000):
+            day = date(2015, 1, 1) + timedelta(days=i // 50)
+            lines.append(
+                f'"Bench,Person{i % 500}","bench{i % 500}@example.com",'
+                f'"{900000000 + i % 500}","East Asian Library","Event {i // 5}",'
+                f'"{day:%m/%d/%Y}","{day + timedelta(days=2):%m/%d/%Y}","3",'
+                f'"60{i % 20:04}","PD","19900",{i % 900}.50,{i % 700}.25,'
+                f'"{day + timedelta(days=30):%m/%d/%Y}"'
+            )
+        path = self.write_csv("benchmark.csv", lines)
+        timings = {}
+        data = {}
+        for mode in ["--bulk", "--copy"]:
+            savepoint = transaction.savepoint()
+            started = time.monotonic()
+            call_command("load_travel_data", path, mode, stdout=StringIO())
+            timings[mode] = time.monotonic() - started
+            data[mode] = self.travel_data()
+            transaction.savepoint_rollback(savepoint)
+        print(
+            f"\n100,000 rows: --bulk {timings['--bulk']:.1f}s, "
+            f"--copy {timings['--copy']:.1f}s "
+            f"({timings['--bulk'] / timings['--copy']:.1f}x)"
+        )
+        self.assertEqual(data["--copy"], data["--bulk"])
+        self.assertLess(timings["--copy"], timings["--bulk"])
+
+    def test_bulk_loads_mark_closed_years_stale(self):
+        edward = Employee.objects.get(uid="54321")
+        start_date, end_date = fiscal_year_bookends(2020)
+        modes = ["--bulk"]
+        if connection.vendor == "postgresql":
+            modes.append("--copy")
+        for mode in modes:
+            with self.subTest(mode=mode):
+                savepoint = transaction.savepoint()
+                call_command("close_fiscal_year", "2020", stdout=StringIO())
+                report = reports.employee_total_report(
+                    [edward.pk], start_date, end_date
+                )
+                self.assertEqual(report[edward.pk]["total_spent"], 0)
+                call_command("load_travel_data", TRAVEL_FILE, mode, stdout=StringIO())
+                self.assertFalse(
+                    ReportSnapshot.objects.filter(
+                        fiscal_year=2020, stale=False
+                    ).exists()
+                )
+                report = reports.employee_total_report(
+                    [edward.pk], start_date, end_date
+                )
+                self.assertEqual(report[edward.pk]["total_spent"], 100)
+                transaction.savepoint_rollback(savepoint)
+
+    def test_rebuild_summaries_marks_changed_years_stale(self):
+        call_command("load_travel_data", TRAVEL_FILE, stdout=StringIO())
+        call_command("close_fiscal_year", "2019", "2020", stdout=StringIO())
+        # Changed without the signals, as a fixture load would.
+        ActualExpense.objects.filter(treq__traveler__uid="54321").update(total=150)
+        rebuild_summaries()
+        self.assertEqual(
+            set(
+                ReportSnapshot.objects.filter(stale=True).values_list(
+                    "fiscal_year", flat=True
+                )
+            ),
+            {2020},
+        )
+
+    def test_bulk_load_reports_rate(self):
+        out = StringIO()
+        call_command("load_travel_data", TRAVEL_FILE, "--bulk", stdout=out)
+        self.assertIn("Loaded 3 rows", out.getvalue())
+        self.assertIn("rows/sec", out.getvalue())
+        self.assertNotIn("Processing row", out.getvalue())
+
+    def test_bulk_load_skips_bad_rows(self):
+        expected = self.load()
+        lines = open(TRAVEL_FILE, encoding="utf-8-sig").read().splitlines()
+        bad_date = lines[1].replace("1/7/2019", "13/7/2019")
+        bad_unit = lines[2].replace("East Asian Library", "Nowhere")
+        path = self.write_csv(
+            "bad.csv", [lines[0], bad_date, lines[1], bad_unit] + lines[2:]
+        )
+        error_file = os.path.join(self.tmpdir, "errors.csv")
+        err = StringIO()
+        call_command(
+            "load_travel_data",
+            path,
+            "--bulk",
+            f"--error-file={error_file}",
+            stdout=StringIO(),
+            stderr=err,
+        )
+        self.assertEqual(self.travel_data(), expected)
+        self.assertIn("line 1: ValueError", err.getvalue())
+        self.assertIn("line 3: unit Nowhere not found", err.getvalue())
+        with open(error_file, newline="") as f:
+            self.assertEqual([row[0] for row in csv.reader(f)], ["line", "1", "3"])
+
+    def test_resume_after_failure(self):
+        expected = self.load()
+        path = self.write_csv(
+            "travel.csv", open(TRAVEL_FILE, encoding="utf-8-sig").read().splitlines()
+        )
+        load_chunk = load_travel_data._load_chunk
+        calls = []
+
+        def fail_second_chunk(*args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise RuntimeError("database went away")
+            return load_chunk(*args)
+
+        with patch.object(load_travel_data, "_load_chunk", fail_second_chunk):
+            with self.assertRaises(RuntimeError):
+                call_command(
+                    "load_travel_data",
+                    path,
+                    "--bulk",
+                    "--chunk-size=1",
+                    stdout=StringIO(),
+                )
+        self.assertEqual(ImportCheckpoint.objects.get().last_line, 1)
+        self.assertEqual(ActualExpense.objects.count(), 1)
+
+        with self.assertRaises(CommandError):
+            call_command("load_travel_data", path, "--bulk", stdout=StringIO())
+        out = StringIO()
+        call_command("load_travel_data", path, "--resume", stdout=out)
+        self.assertIn("Resuming", out.getvalue())
+        self.assertIn("Loaded 2 rows", out.getvalue())
+        self.assertEqual(self.travel_data(), expected)
+        self.assertEqual(ImportCheckpoint.objects.get().last_line, 3)
+
+        # Resuming a finished load doesn't add anything.
+        out = StringIO()
+        call_command("load_travel_data", path, "--resume", stdout=out)
+        self.assertIn("Loaded 0 rows", out.getvalue())
+        self.assertEqual(self.travel_data(), expected)
+
+    def test_resume_after_fixing_bad_lines(self):
+        expected = self.load()
+        lines = open(TRAVEL_FILE, encoding="utf-8-sig").read().splitlines()
+        bad_date = lines[2].replace("4/1/2019", "13/1/2019")
+        path = self.write_csv("travel.csv", [lines[0], lines[1], bad_date, lines[3]])
+        err = StringIO()
+        call_command("load_travel_data", path, "--bulk", stdout=StringIO(), stderr=err)
+        self.assertIn("line 2: ValueError", err.getvalue())
+        self.assertEqual(ImportCheckpoint.objects.get().skipped_lines, [2])
+        self.assertEqual(ActualExpense.objects.count(), 2)
+
+        self.write_csv("travel.csv", lines)
+        out = StringIO()
+        call_command("load_travel_data", path, "--resume", stdout=out)
+        self.assertIn("retrying 1 skipped lines", out.getvalue())
+        self.assertIn("Loaded 1 rows", out.getvalue())
+        self.assertEqual(self.travel_data(), expected)
+        self.assertEqual(ImportCheckpoint.objects.get().skipped_lines, [])
+
+    def test_resume_refuses_a_different_file(self):
+        lines = open(TRAVEL_FILE, encoding="utf-8-sig").read().splitlines()
+        bad_date = lines[2].replace("4/1/2019", "13/1/2019")
+        path = self.write_csv("travel.csv", [lines[0], lines[1], bad_date])
+        call_command(
+            "load_travel_data", path, "--bulk", stdout=StringIO(), stderr=StringIO()
+        )
+        expected = self.travel_data()
+
+        # Another file in its place: its first line was never loaded.
+        self.write_csv("travel.csv", [lines[0], lines[3], lines[2]])
+        with self.assertRaisesMessage(CommandError, "can't be resumed"):
+            call_command("load_travel_data", path, "--resume", stdout=StringIO())
+        self.assertEqual(self.travel_data(), expected)
+
+    def test_identical_lines_are_all_loaded(self):
+        # Two payments of the same amount on the same day are both spent.
+        lines = open(TRAVEL_FILE, encoding="utf-8-sig").read().splitlines()
+        files = [self.write_csv("twice.csv", lines[:2] + lines[1:2])]
+        modes = [[], ["--bulk"]]
+        if connection.vendor == "postgresql":
+            modes.append(["--copy"])
+        for mode in modes:
+            with self.subTest(mode=mode):
+                self.assertEqual(len(self.load(*mode, files=files)["expenses"]), 2)
+
+
+class LoadEmployeesTestCase(TestCase):
+    header = "employee_name,ucla_id,email,supervisor,department,staff_type"
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.tmpdir = tmpdir.name
+        library = Unit.objects.create(name="General Library", type="1")
+        Unit.objects.create(name="East Asian Library", type="2", parent_unit=library)
+
+    def write_csv(self, name, lines):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, "w", newline="") as f:
+            f.write("\n".join([self.header] + lines) + "\n")
+        return path
+
+    def staff_file(self, name, count):
+        lines = ['"Head,Hanna",100000000,hanna@example.com,,General Library,Librarian']
+        for i in range(1, count):
+            lines.append(
+                f'"Staff,Member{i}",{100000000 + i},staff{i}@example.com,'
+                f'"Head,Hanna",East Asian Library,Other'
+            )
+        return self.write_csv(name, lines)
+
+    def load(self, path):
+        out = StringIO()
+        err = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command("load_employees", path, stdout=out, stderr=err)
+        return len(queries), out.getvalue(), err.getvalue()
+
+    def test_load_employees(self):
+        self.load("terra/fixtures/test_employees.csv")
+        self.assertEqual(Employee.objects.count(), 2)
+        employee = Employee.objects.get(user__last_name="Employee")
+        self.assertEqual(employee.uid, "54321")
+        self.assertEqual(employee.type, "OTHR")
+        self.assertEqual(employee.unit.name, "East Asian Library")
+        self.assertEqual(employee.supervisor.user.first_name, "Sally")
+        self.assertEqual(employee.user.email, "edward@example.com")
+
+    def test_query_count_is_fixed(self):
+        savepoint = transaction.savepoint()
+        small, out, err = self.load(self.staff_file("small.csv", 3))
+        self.assertIn("Loaded 3 employees", out)
+        self.assertIn("3 new", out)
+        transaction.savepoint_rollback(savepoint)
+        large, out, err = self.load(self.staff_file("large.csv", 300))
+        self.assertIn("300 new", out)
+        self.assertEqual(err, "")
+        # Only the number of bulk insert batches grows, and only on SQLite,
+        # which limits the parameters per query.
+        self.assertLess(large, small + 10)
+        self.assertEqual(
+            Employee.objects.filter(supervisor__user__last_name="Head").count(), 299
+        )
+        # Reloading the same staff changes nothing.
+        reload, out, err = self.load(self.staff_file("large.csv", 300))
+        self.assertIn("0 new, 0 updated", out)
+
+    def test_problems_are_reported(self):
+        path = self.write_csv(
+            "problems.csv",
+            [
+                '"Twin,Tess",1,tess1@example.com,,General Library,Other',
+                '"Twin,Tess",2,tess2@example.com,,General Library,Other',
+                '"Staff,Sam",3,sam@example.com,"Twin,Tess",General Library,Other',
+                '"Staff,Sid",4,sid@example.com,"Nobody,Here",General Library,Other',
+                '"Staff,Stu",5,stu@example.com,,Nowhere,Other',
+            ],
+        )
+        count, out, err = self.load(path)
+        self.assertIn("line 3: supervisor Twin,Tess is ambiguous", err)
+        self.assertIn("line 4: supervisor Nobody,Here not found", err)
+        self.assertIn("line 5: unit Nowhere not found", err)
+        self.assertIn("Loaded 4 employees", out)
+        self.assertIsNone(Employee.objects.get(uid="3").supervisor)
+
+
+class QueryBudgetTestCase(TestCase):
+    fixtures = ["sample_data.json"]
+
+    # Most queries each report page and export may run. The same bounds
+    # hold with ten times the employees and travel, so a page whose query
+    # count grows with the data fails here.
+    budgets = {
+        "/employee/1/2019-2020/": 9,
+        "/employee/1/2019-2020/export/": 8,
+        "/employee/1/2019-2020/by_year/": 11,
+        "/employee/1/2019-2020/by_year/export/": 10,
+        "/treq/1/": 7,
+        "/unit/": 13,
+        "/unit/1/2019-2020/": 13,
+        "/unit/1/2019-2020/export/": 10,
+        "/unit/1/2019-2020/by_year/": 14,
+        "/unit/1/2019-2020/by_year/export/": 11,
+        "/unit/1/2019-2020/org_export/": 12,
+        "/fund/": 4,
+        "/fund/1/2019-2020/": 10,
+        "/fund/1/2019-2020/export/": 7,
+        "/fund/1/2019-2020/by_year/": 13,
+        "/fund/1/2019-2020/by_year/export/": 10,
+        "/employee_type_list/2019-2020/": 9,
+        "/employee_type_list/2019-2020/export/": 9,
+        "/actual_expense_report/2019-2020/": 12,
+        "/actual_expense_report/2019-2020/export/": 12,
+    }
+
+    def setUp(self):
+        self.client.login(username="doriswang", password="Staples50141")
+
+    def scale_data(self, factor):
+        # Adds factor - 1 copies of every unit below the top, fund and
+        # employee, each employee with a copy of the original's travel.
+        # The copied travel is still paid from the original funds.
+        units = list(Unit.objects.exclude(parent_unit=None))
+        employees = list(Employee.objects.select_related("user"))
+        funds = list(Fund.objects.all())
+        treqs = list(TravelRequest.objects.all())
+        related = [
+            (row.treq_id, row)
+            for model in [Funding, ActualExpense, Vacation]
+            for row in model.objects.all()
+        ]
+        for copy in range(1, factor):
+            unit_clones = {}
+            for unit in units:
+                unit_clones[unit.pk] = Unit.objects.create(
+                    name=f"{unit.name} {copy}",
+                    type=unit.type,
+                    parent_unit_id=unit.parent_unit_id,
+                )
+            clones = {}
+            for employee in employees:
+                user = User.objects.create_user(
+                    f"{employee.user.username}{copy}",
+                    first_name=employee.user.first_name,
+                    last_name=employee.user.last_name,
+                )
+                clones[employee.pk] = Employee.objects.create(
+                    user=user,
+                    unit=unit_clones.get(employee.unit_id, employee.unit),
+                    type=employee.type,
+                    supervisor_id=employee.supervisor_id,
+                    uid=f"9{copy}{employee.pk:07d}",
+                )
+            for unit in units:
+                unit_clones[unit.pk].manager = clones.get(unit.manager_id)
+                unit_clones[unit.pk].save()
+            for fund in funds:
+                Fund.objects.create(
+                    account=fund.account,
+                    cost_center=f"C{copy}",
+                    fund=fund.fund,
+                    manager=clones[fund.manager_id],
+                    unit=unit_clones.get(fund.unit_id, fund.unit),
+                )
+            treq_clones = {}
+            for treq in treqs:
+                clone = TravelRequest.objects.get(pk=treq.pk)
+                clone.pk = None
+                clone.traveler = clones[treq.traveler_id]
+                clone.save()
+                treq_clones[treq.pk] = clone
+            for treq_id, row in related:
+                row.pk = None
+                row.treq = treq_clones[treq_id]
+                row.save()
+
+    def check_budgets(self):
+        for url, budget in self.budgets.items():
+            with self.subTest(url=url):
+                with query_budget.record_queries() as stats:
+                    response = self.client.get(url)
+                    # Exports run their queries as the rows are streamed.
+                    if response.streaming:
+                        b"".join(response.streaming_content)
+                self.assertEqual(response.status_code, 200)
+                self.assertLessEqual(stats.count, budget, stats)
+                self.assertEqual(stats.duplicates, 0, stats)
+
+    def test_budgets(self):
+        self.check_budgets()
+
+    def test_budgets_with_ten_times_the_data(self):
+        self.scale_data(10)
+        self.assertEqual(Employee.objects.count(), 60)
+        self.assertEqual(Fund.objects.count(), 30)
+        self.assertEqual(TravelRequest.objects.count(), 90)
+        self.assertEqual(Funding.objects.count(), 60)
+        self.check_budgets()
+        self.assertContains(self.client.get("/unit/1/2019-2020/"), "DIIT 9")
+
+    def test_record_queries(self):
+        with query_budget.record_queries() as stats:
+            for pk in [1, 2, 1]:
+                Unit.objects.get(pk=pk)
+        self.assertEqual(stats.count, 3)
+        self.assertEqual(stats.duplicates, 1)
+        self.assertGreater(stats.time, 0)
+        self.assertTrue(str(stats).startswith("3 queries, 1 duplicates, "))
+
+    def test_middleware_logs_queries(self):
+        with self.settings(QUERY_BUDGET_LOG=True):
+            with self.assertLogs("terra.query_budget") as logs:
+                self.client.get("/fund/")
+        self.assertEqual(len(logs.output), 1)
+        self.assertRegex(
+            logs.output[0], r"GET /fund/ \(fund_list\): 4 queries, 0 duplicates"
+        )
+
+    def test_middleware_logs_streamed_queries(self):
+        with self.settings(QUERY_BUDGET_LOG=True):
+            with self.assertLogs("terra.query_budget") as logs:
+                response = self.client.get("/unit/1/2019-2020/org_export/")
+                self.assertEqual(logs.output, [])
+                b"".join(response.streaming_content)
+                with query_budget.record_queries() as stats:
+                    response = self.client.get("/unit/1/2019-2020/org_export/")
+                    b"".join(response.streaming_content)
+        self.assertEqual(len(logs.output), 2)
+        for output in logs.output:
+            self.assertIn(f"(org_csv): {stats.count} queries", output)
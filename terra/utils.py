@@ -1,11 +1,16 @@
+from bisect import bisect_right
 from datetime import date
+from functools import lru_cache
 from django.conf import settings
 
 import fiscalyear as FY
 import locale
 
 
-FY.START_MONTH = 7
+# Fiscal years start in July. Read this rather than FY.START_MONTH, which
+# only holds it once this module has been imported.
+FISCAL_YEAR_START_MONTH = 7
+FY.START_MONTH = FISCAL_YEAR_START_MONTH
 
 profdev_spending_cap = 3500
 profdev_warning = 2800
@@ -17,14 +22,69 @@ def format_currency(value, grouping=True):
     return locale.currency(value, grouping=grouping)
 
 
+class FiscalCalendar:
+    """
+    Start and end dates of the fiscal years from first_year through
+    last_year, so lookups are a bisect or an index instead of building
+    fiscalyear objects. Dates and years outside the range fall back to
+    the fiscalyear package.
+    """
+
+    def __init__(self, first_year, last_year):
+        self.first_year = first_year
+        self.last_year = last_year
+        self.starts = []
+        self.ends = []
+        for year in range(first_year, last_year + 1):
+            fy = FY.FiscalYear(year)
+            self.starts.append(fy.start.date())
+            self.ends.append(fy.end.date())
+
+    def fiscal_year(self, day):
+        # The last fiscal year starting on or before day, if it covers day.
+        index = bisect_right(self.starts, day) - 1
+        if index >= 0 and day <= self.ends[index]:
+            return self.first_year + index
+        return FY.FiscalDate(day.year, day.month, day.day).fiscal_year
+
+    def bookends(self, fiscal_year):
+        index = fiscal_year - self.first_year
+        if 0 <= index < len(self.starts):
+            return (self.starts[index], self.ends[index])
+        fy = FY.FiscalYear(fiscal_year)
+        return (fy.start.date(), fy.end.date())
+
+
+_calendar = None
+# (date, fiscal year) of the last current_fiscal_year() call without a date.
+_today = (None, None)
+
+
+def fiscal_calendar():
+    global _calendar
+    if _calendar is None:
+        today = date.today()
+        last_year = FY.FiscalDate(today.year, today.month, today.day).fiscal_year
+        _calendar = FiscalCalendar(
+            settings.INCEPTION_DATE, last_year + settings.FISCAL_CALENDAR_HORIZON
+        )
+    return _calendar
+
+
 def current_fiscal_year(today=None):
-    today = date.today() if today is None else today
-    return FY.FiscalDate(today.year, today.month, today.day).fiscal_year
+    global _today
+    if today is not None:
+        return fiscal_calendar().fiscal_year(today)
+    # Only changes at midnight.
+    today = date.today()
+    if _today[0] != today:
+        _today = (today, fiscal_calendar().fiscal_year(today))
+    return _today[1]
 
 
 def current_fiscal_year_object(today=None):
     year = current_fiscal_year(today=today)
-    return FY.FiscalYear(year)
+    return fiscal_year(year)
 
 
 def current_fiscal_year_int(today=None):
@@ -35,26 +95,25 @@ def current_fiscal_year_int(today=None):
 def fiscal_year_bookends(fiscal_year=None):
     if fiscal_year is None:
         fiscal_year = current_fiscal_year()
-    fy = FY.FiscalYear(fiscal_year)
-    return (fy.start.date(), fy.end.date())
+    return fiscal_calendar().bookends(fiscal_year)
 
 
 def fiscal_year(fiscal_year=None):
     if fiscal_year is None:
         fiscal_year = current_fiscal_year()
+    return _fiscal_year_object(fiscal_year)
+
+
+@lru_cache(maxsize=None)
+def _fiscal_year_object(fiscal_year):
     return FY.FiscalYear(fiscal_year)
 
 
 def in_fiscal_year(date, fiscal_year=None):
     if fiscal_year is None:
         fiscal_year = current_fiscal_year()
-    fiscal_date = FY.FiscalDate(date.year, date.month, date.day)
-    return fiscal_date.fiscal_year == fiscal_year
+    return fiscal_calendar().fiscal_year(date) == fiscal_year
 
 
 def fiscal_year_list():
-    current_fiscal_year = current_fiscal_year_int()
-    fiscal_years = []
-    for year in range(settings.INCEPTION_DATE, (current_fiscal_year + 1)):
-        fiscal_years.append(year)
-    return fiscal_years
+    return list(range(settings.INCEPTION_DATE, current_fiscal_year() + 1))
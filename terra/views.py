@@ -1,5 +1,7 @@
 import csv
-from django.http import HttpResponseRedirect, HttpResponse
+from django.conf import settings
+from django.db.models import Prefetch
+from django.http import HttpResponseRedirect, StreamingHttpResponse
 from django.urls import reverse
 from django.views.generic.list import ListView
 from django.views.generic import DetailView
@@ -7,16 +9,17 @@ from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
 
-from .models import TravelRequest, Unit, Employee, Fund, ActualExpense
+from .models import TravelRequest, Unit, Employee, Fund, Funding, ActualExpense
 from .reports import (
     unit_report,
     fund_report,
     merge_data_type,
     employee_total_report,
-    get_subunits_and_employees,
-    get_individual_data_treq,
-    get_treq_list,
-    get_individual_data_for_treq,
+    employee_treq_report,
+    employee_yearly_report,
+    unit_yearly_report,
+    fund_yearly_report,
+    actual_expense_report,
 )
 from .utils import fiscal_year, current_fiscal_year_int, fiscal_year_list
 
@@ -53,19 +56,78 @@ def release_notes(request):
     return render(request, "terra/release_notes.html")
 
 
+class Echo:
+    # File-like object for csv.writer that hands each line back instead of
+    # storing it.
+    def write(self, value):
+        return value
+
+
+def csv_response(rows, filename):
+    """
+    Streams rows as a CSV download, formatting each row only as it is sent.
+    """
+    writer = csv.writer(Echo())
+    response = StreamingHttpResponse(
+        (writer.writerow(row) for row in rows), content_type="text/csv"
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+YEARLY_METRICS = (
+    ("Prof Dev Requested", "profdev_requested"),
+    ("Prof Dev Spent", "profdev_spent"),
+    ("Prof Dev Days Out", "profdev_days_away"),
+    ("Admin Requested", "admin_requested"),
+    ("Admin Spent", "admin_spent"),
+    ("Admin Days Out", "admin_days_away"),
+    ("Total Requested", "total_requested"),
+    ("Total Spent", "total_spent"),
+    ("Total Days Out", "total_days_ooo"),
+)
+
+# The unit and fund breakdowns show the totals for each year; fund reports
+# have no days out.
+UNIT_YEARLY_METRICS = (
+    ("Requested", "total_requested"),
+    ("Spent", "total_spent"),
+    ("Days Out", "total_days_ooo"),
+)
+FUND_YEARLY_METRICS = UNIT_YEARLY_METRICS[:2]
+
+
+def year_heading(year):
+    return "Total" if year == "all" else f"FY{year}"
+
+
+def yearly_headings(years, metrics):
+    return [f"{year_heading(year)} {label}" for year in years for label, _ in metrics]
+
+
+def yearly_cells(rows_by_year, metrics):
+    # One cell per fiscal year and metric, in the order of yearly_headings.
+    return [row[key] for row in rows_by_year.values() for _, key in metrics]
+
+
+def yearly_csv_rows(rows_by_year):
+    # A single employee's years, one metric per line.
+    yield ["", *(year_heading(year) for year in rows_by_year)]
+    for label, key in YEARLY_METRICS:
+        yield [label, *(row[key] for row in rows_by_year.values())]
+
+
 class EmployeeDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
 
     model = Employee
     context_object_name = "employee"
     login_url = "/accounts/login/"
     redirect_field_name = "next"
+    # Break the range down by fiscal year instead of totalling it.
+    by_year = False
 
     def test_func(self):
-        user = self.request.user
-        employee = self.get_object()
-        eligible_users = [employee, employee.supervisor]
-        eligible_users.extend(employee.unit.super_managers())
-        return user.employee in eligible_users or user.employee.has_full_report_access()
+        return self.request.access.can_view_employee(self.kwargs["pk"])
 
     def get_context_data(self, *args, **kwargs):
         context = super().get_context_data(*args, **kwargs)
@@ -74,144 +136,117 @@ class EmployeeDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
         end_fy = fiscal_year(fiscal_year=self.kwargs["end_year"])
         context["start_fy"] = self.kwargs["start_year"]
         context["end_fy"] = self.kwargs["end_year"]
-        id_list = []
-        for employee in Employee.objects.all():
-            id_list.append(employee.id)
-        treq_ids = []
-        for treq in TravelRequest.objects.all():
-            treq_ids.append(treq.id)
-        context["report"] = employee_total_report(
-            employee_ids=id_list,
+        context["fiscalyear"] = "{} - {}".format(start_fy, end_fy)
+        context["fiscal_year_list"] = fiscal_year_list()
+        if self.by_year:
+            context["years"] = employee_yearly_report(
+                employee=self.object,
+                start_year=self.kwargs["start_year"],
+                end_year=self.kwargs["end_year"],
+            )
+            return context
+        context["totals"] = employee_total_report(
+            employee_ids=[self.object.id],
             start_date=start_fy.start.date(),
             end_date=end_fy.end.date(),
-        )
+            use_summary=settings.REPORT_SUMMARIES,
+        )[self.object.id]
         context["fy_start"] = start_fy.start.date()
         context["fy_end"] = end_fy.end.date()
-        context["fiscal_year_list"] = fiscal_year_list()
-        context["actualexpenses_fy"] = get_individual_data_treq(
-            treq_ids=treq_ids,
+        context["treq_report"] = employee_treq_report(
+            employee=self.object,
             start_date=start_fy.start.date(),
             end_date=end_fy.end.date(),
         )
-        context["fiscalyear"] = "{} - {}".format(start_fy, end_fy)
         return context
 
 
 class EmployeeDetailExportView(EmployeeDetailView):
     def render_to_response(self, context, **response_kwargs):
         employee = context.get("employee")
-        report = context.get("report")
-        actualexpenses_fy = context.get("actualexpenses_fy")
-        fy_start = context.get("fy_start")
-        fy_end = context.get("fy_end")
         start_fy = fiscal_year(fiscal_year=self.kwargs["start_year"])
         end_fy = fiscal_year(fiscal_year=self.kwargs["end_year"])
-        response = HttpResponse(content_type="text/csv")
-        response[
-            "Content-Disposition"
-        ] = f'attachment; filename="{employee}_{start_fy}_{end_fy}.csv"'
-        writer = csv.writer(response)
-        writer.writerow(
-            [
-                "Activity",
-                "Departure Date",
-                "Return Date",
-                "Closed",
-                "Canceled",
-                "Amount Requested",
-                "Amount Spent",
-                "Days Out",
-            ]
+        return csv_response(
+            self.csv_rows(context), f"{employee}_{start_fy}_{end_fy}.csv"
         )
-        writer.writerow(["Professional Development"])
-        for treq in employee.travelrequest_set.all():
-            for i in actualexpenses_fy:
-                if i["id"] == treq.id:
-                    if treq.administrative == False:
-                        if i["actualexpenses_fy"] != 0 or (
-                            treq.departure_date >= fy_start
-                            and treq.return_date <= fy_end
-                        ):
-                            writer.writerow(
-                                [
-                                    treq.activity.name,
-                                    treq.departure_date,
-                                    treq.return_date,
-                                    treq.closed,
-                                    treq.canceled,
-                                    i["funding_fy"],
-                                    i["actualexpenses_fy"],
-                                    i["days_ooo_fy"],
-                                ]
-                            )
-
-        writer.writerow([""])
-        for employee_id, totals in report.items():
-            if employee_id == employee.id:
-                writer.writerow(
-                    [
-                        "Professional Development Subtotal",
-                        "",
-                        "",
-                        "",
-                        "",
-                        totals["profdev_requested"],
-                        totals["profdev_spent"],
-                        totals["profdev_days_away"],
-                    ]
-                )
-        writer.writerow([""])
-        writer.writerow(["Administrative"])
-        for treq in employee.travelrequest_set.all():
-            for i in actualexpenses_fy:
-                if i["id"] == treq.id:
-                    if treq.administrative == True:
-                        if i["actualexpenses_fy"] != 0 or (
-                            treq.departure_date >= fy_start
-                            and treq.return_date <= fy_end
-                        ):
-                            writer.writerow(
-                                [
-                                    treq.activity.name,
-                                    treq.departure_date,
-                                    treq.return_date,
-                                    treq.closed,
-                                    treq.canceled,
-                                    i["funding_fy"],
-                                    i["actualexpenses_fy"],
-                                    i["days_ooo_fy"],
-                                ]
-                            )
-        writer.writerow([""])
-        for employee_id, totals in report.items():
-            if employee_id == employee.id:
-                writer.writerow(
-                    [
-                        "Administrative Subtotal",
-                        "",
-                        "",
-                        "",
-                        "",
-                        totals["admin_requested"],
-                        totals["admin_spent"],
-                        totals["admin_days_away"],
-                    ]
-                )
-                writer.writerow([""])
-                writer.writerow(
-                    [
-                        "Total",
-                        "",
-                        "",
-                        "",
-                        "",
-                        totals["total_requested"],
-                        totals["total_spent"],
-                        totals["total_days_away"],
-                    ]
-                )
 
-        return response
+    def csv_rows(self, context):
+        if self.by_year:
+            yield from yearly_csv_rows(context["years"])
+            return
+        totals = context.get("totals")
+        treq_report = context.get("treq_report")
+        yield [
+            "Activity",
+            "Departure Date",
+            "Return Date",
+            "Closed",
+            "Canceled",
+            "Amount Requested",
+            "Amount Spent",
+            "Days Out",
+        ]
+        yield ["Professional Development"]
+        for row in treq_report.values():
+            if row["treq"].administrative == False:
+                yield [
+                    row["treq"].activity.name,
+                    row["treq"].departure_date,
+                    row["treq"].return_date,
+                    row["treq"].closed,
+                    row["treq"].canceled,
+                    row["funding_fy"],
+                    row["actualexpenses_fy"],
+                    row["days_ooo_fy"],
+                ]
+
+        yield [""]
+        yield [
+            "Professional Development Subtotal",
+            "",
+            "",
+            "",
+            "",
+            totals["profdev_requested"],
+            totals["profdev_spent"],
+            totals["profdev_days_away"],
+        ]
+        yield [""]
+        yield ["Administrative"]
+        for row in treq_report.values():
+            if row["treq"].administrative == True:
+                yield [
+                    row["treq"].activity.name,
+                    row["treq"].departure_date,
+                    row["treq"].return_date,
+                    row["treq"].closed,
+                    row["treq"].canceled,
+                    row["funding_fy"],
+                    row["actualexpenses_fy"],
+                    row["days_ooo_fy"],
+                ]
+        yield [""]
+        yield [
+            "Administrative Subtotal",
+            "",
+            "",
+            "",
+            "",
+            totals["admin_requested"],
+            totals["admin_spent"],
+            totals["admin_days_away"],
+        ]
+        yield [""]
+        yield [
+            "Total",
+            "",
+            "",
+            "",
+            "",
+            totals["total_requested"],
+            totals["total_spent"],
+            totals["total_days_away"],
+        ]
 
 
 class TreqDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
@@ -222,17 +257,27 @@ class TreqDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
     redirect_field_name = "next"
 
     def test_func(self):
-        user = self.request.user
-        treq = self.get_object()
+        return self.request.access.can_view_treq(self.get_object())
 
-        eligible_users = [treq.traveler, treq.traveler.supervisor]
-        eligible_users.extend(treq.traveler.unit.super_managers())
-        for funding in treq.funding_set.all():
-            eligible_users.append(funding.fund.manager)
-        for actualexpense in treq.actualexpense_set.all():
-            eligible_users.append(actualexpense.fund.manager)
+    def get_queryset(self):
+        return TravelRequest.objects.select_related(
+            "traveler__user", "traveler__unit", "activity", "approved_by__user"
+        ).prefetch_related(
+            Prefetch(
+                "funding_set",
+                queryset=Funding.objects.select_related("fund", "funded_by__user"),
+            ),
+            Prefetch(
+                "actualexpense_set",
+                queryset=ActualExpense.objects.select_related("fund"),
+            ),
+        )
 
-        return user.employee in eligible_users or user.employee.has_full_report_access()
+    def get_object(self, queryset=None):
+        # test_func has usually looked the request up already.
+        if getattr(self, "object", None) is None:
+            self.object = super().get_object(queryset)
+        return self.object
 
 
 class UnitDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
@@ -241,12 +286,10 @@ class UnitDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
     context_object_name = "unit"
     login_url = "/accounts/login/"
     redirect_field_name = "next"
+    by_year = False
 
     def test_func(self):
-        if self.request.user.employee.has_full_report_access():
-            return True
-        unit = self.get_object()
-        return self.request.user.employee in unit.super_managers()
+        return self.request.access.can_view_unit(self.kwargs["pk"])
 
     def get_context_data(self, *args, **kwargs):
         context = super().get_context_data(*args, **kwargs)
@@ -254,11 +297,19 @@ class UnitDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
         end_fy = fiscal_year(fiscal_year=self.kwargs["end_year"])
         context["start_fy"] = self.kwargs["start_year"]
         context["end_fy"] = self.kwargs["end_year"]
-        context["report"] = unit_report(
-            unit=self.object,
-            start_date=start_fy.start.date(),
-            end_date=end_fy.end.date(),
-        )
+        if self.by_year:
+            context["report"] = unit_yearly_report(
+                unit=self.object,
+                start_year=self.kwargs["start_year"],
+                end_year=self.kwargs["end_year"],
+            )
+        else:
+            context["report"] = unit_report(
+                unit=self.object,
+                start_date=start_fy.start.date(),
+                end_date=end_fy.end.date(),
+                use_summary=settings.REPORT_SUMMARIES,
+            )
         context["fiscalyear"] = "{} - {}".format(start_fy, end_fy)
         context["fiscal_year_list"] = fiscal_year_list()
         return context
@@ -269,78 +320,87 @@ class UnitExportView(UnitDetailView):
         unit = context.get("unit")
         start_fy = fiscal_year(fiscal_year=self.kwargs["start_year"])
         end_fy = fiscal_year(fiscal_year=self.kwargs["end_year"])
-        response = HttpResponse(content_type="text/csv")
-        response[
-            "Content-Disposition"
-        ] = f'attachment; filename="{unit}_{start_fy}_{end_fy}.csv"'
-        writer = csv.writer(response)
-        writer.writerow(
-            [
-                "Employee",
-                "Type",
-                "Prof Dev Requested",
-                "Prof Dev Spent",
-                "Prof Dev Days Out",
-                "Admin Requested",
-                "Admin Spent",
-                "Admin Days Out",
-                "Total Requested",
-                "Total Spent",
-                "Total Days Out",
-            ]
-        )
+        return csv_response(self.csv_rows(context), f"{unit}_{start_fy}_{end_fy}.csv")
+
+    def csv_rows(self, context):
+        if self.by_year:
+            yield from self.yearly_csv_rows(context["report"])
+            return
+        yield [
+            "Employee",
+            "Type",
+            "Prof Dev Requested",
+            "Prof Dev Spent",
+            "Prof Dev Days Out",
+            "Admin Requested",
+            "Admin Spent",
+            "Admin Days Out",
+            "Total Requested",
+            "Total Spent",
+            "Total Days Out",
+        ]
         for subunit in context["report"]["subunits"].values():
-            writer.writerow([])
-            writer.writerow([subunit["subunit"]])
+            yield []
+            yield [subunit["subunit"]]
             for employee in subunit["employees"].values():
-                writer.writerow(
-                    [
-                        employee,
-                        employee.get_type_display(),
-                        employee.data["profdev_requested"],
-                        employee.data["profdev_spent"],
-                        employee.data["profdev_days_away"],
-                        employee.data["admin_requested"],
-                        employee.data["admin_spent"],
-                        employee.data["admin_days_away"],
-                        employee.data["total_requested"],
-                        employee.data["total_spent"],
-                        employee.data["total_days_ooo"],
-                    ]
-                )
-            writer.writerow(
-                [
-                    "Subtotals",
-                    "",
-                    subunit["subunit_totals"]["profdev_requested"],
-                    subunit["subunit_totals"]["profdev_spent"],
-                    subunit["subunit_totals"]["profdev_days_away"],
-                    subunit["subunit_totals"]["admin_requested"],
-                    subunit["subunit_totals"]["admin_spent"],
-                    subunit["subunit_totals"]["admin_days_away"],
-                    subunit["subunit_totals"]["total_requested"],
-                    subunit["subunit_totals"]["total_spent"],
-                    subunit["subunit_totals"]["total_days_ooo"],
+                yield [
+                    employee,
+                    employee.get_type_display(),
+                    employee.data["profdev_requested"],
+                    employee.data["profdev_spent"],
+                    employee.data["profdev_days_away"],
+                    employee.data["admin_requested"],
+                    employee.data["admin_spent"],
+                    employee.data["admin_days_away"],
+                    employee.data["total_requested"],
+                    employee.data["total_spent"],
+                    employee.data["total_days_ooo"],
                 ]
-            )
-        writer.writerow([])
-        writer.writerow([])
-        writer.writerow(
-            [
-                "Totals",
+            yield [
+                "Subtotals",
                 "",
-                context["report"]["unit_totals"]["profdev_requested"],
-                context["report"]["unit_totals"]["profdev_spent"],
-                context["report"]["unit_totals"]["profdev_days_away"],
-                context["report"]["unit_totals"]["admin_requested"],
-                context["report"]["unit_totals"]["admin_spent"],
-                context["report"]["unit_totals"]["admin_days_away"],
-                context["report"]["unit_totals"]["total_requested"],
-                context["report"]["unit_totals"]["total_spent"],
-                context["report"]["unit_totals"]["total_days_ooo"],
+                subunit["subunit_totals"]["profdev_requested"],
+                subunit["subunit_totals"]["profdev_spent"],
+                subunit["subunit_totals"]["profdev_days_away"],
+                subunit["subunit_totals"]["admin_requested"],
+                subunit["subunit_totals"]["admin_spent"],
+                subunit["subunit_totals"]["admin_days_away"],
+                subunit["subunit_totals"]["total_requested"],
+                subunit["subunit_totals"]["total_spent"],
+                subunit["subunit_totals"]["total_days_ooo"],
             ]
-        )
-        return response
+        yield []
+        yield []
+        yield [
+            "Totals",
+            "",
+            context["report"]["unit_totals"]["profdev_requested"],
+            context["report"]["unit_totals"]["profdev_spent"],
+            context["report"]["unit_totals"]["profdev_days_away"],
+            context["report"]["unit_totals"]["admin_requested"],
+            context["report"]["unit_totals"]["admin_spent"],
+            context["report"]["unit_totals"]["admin_days_away"],
+            context["report"]["unit_totals"]["total_requested"],
+            context["report"]["unit_totals"]["total_spent"],
+            context["report"]["unit_totals"]["total_days_ooo"],
+        ]
+
+    def yearly_csv_rows(self, report):
+        metrics = UNIT_YEARLY_METRICS
+        yield ["Employee", "Type", *yearly_headings(report["years"], metrics)]
+        for subunit in report["subunits"].values():
+            yield []
+            yield [subunit["subunit"]]
+            for employee in subunit["employees"].values():
+                yield [
+                    employee,
+                    employee.get_type_display(),
+                    *yearly_cells(employee.years, metrics),
+                ]
+            yield ["Subtotals", "", *yearly_cells(subunit["subunit_years"], metrics)]
+        yield []
+        yield []
+        yield ["Totals", "", *yearly_cells(report["unit_years"], metrics)]
 
 
 class UnitListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
@@ -351,15 +411,20 @@ class UnitListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
     redirect_field_name = "next"
 
     def test_func(self):
-        return (
-            self.request.user.employee.has_full_report_access()
-            or self.request.user.employee.is_unit_manager()
-        )
+        access = self.request.access
+        return access.full_access or access.is_unit_manager
 
     def get_queryset(self):
-        if self.request.user.employee.has_full_report_access():
-            return Unit.objects.filter(type="1")
-        return Unit.objects.filter(manager=self.request.user.employee)
+        if self.request.access.full_access:
+            units = Unit.objects.filter(type="1")
+        else:
+            units = Unit.objects.filter(manager=self.request.access.employee)
+        # The template shows four levels of units and their managers.
+        return units.select_related("manager__user").prefetch_related(
+            "subunits__manager__user",
+            "subunits__subunits__manager__user",
+            "subunits__subunits__subunits__manager__user",
+        )
 
     def get_context_data(self, *args, **kwargs):
         context = super().get_context_data(*args, **kwargs)
@@ -373,10 +438,10 @@ class FundDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
     context_object_name = "fund"
     login_url = "/accounts/login/"
     redirect_field_name = "next"
+    by_year = False
 
     def test_func(self):
-        if self.request.user.employee.has_full_report_access():
-            return True
+        return self.request.access.full_access
 
     def get_context_data(self, *args, **kwargs):
         context = super().get_context_data(*args, **kwargs)
@@ -384,26 +449,20 @@ class FundDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
         end_fy = fiscal_year(fiscal_year=self.kwargs["end_year"])
         context["start_fy"] = self.kwargs["start_year"]
         context["end_fy"] = self.kwargs["end_year"]
-        context["employees"], context["totals"] = fund_report(
-            fund=self.object,
-            start_date=start_fy.start.date(),
-            end_date=end_fy.end.date(),
-        )
         context["fiscalyear"] = "{} - {}".format(start_fy, end_fy)
         context["fiscal_year_list"] = fiscal_year_list()
-        treq_ids = get_treq_list(
-            fund=self.object,
-            start_date=start_fy.start.date(),
-            end_date=end_fy.end.date(),
-        )
-        context["treq_ids"] = treq_ids
-        context["treq_funds"] = get_individual_data_for_treq(
-            treq_ids=treq_ids,
+        if self.by_year:
+            context["employees"], context["totals"] = fund_yearly_report(
+                fund=self.object,
+                start_year=self.kwargs["start_year"],
+                end_year=self.kwargs["end_year"],
+            )
+            return context
+        context["employees"], context["totals"] = fund_report(
             fund=self.object,
             start_date=start_fy.start.date(),
             end_date=end_fy.end.date(),
         )
-
         return context
 
 
@@ -412,67 +471,72 @@ class FundExportView(FundDetailView):
         fund = context.get("fund")
         start_fy = fiscal_year(fiscal_year=self.kwargs["start_year"])
         end_fy = fiscal_year(fiscal_year=self.kwargs["end_year"])
-        totals = context.get("totals")
-        response = HttpResponse(content_type="text/csv")
-        response[
-            "Content-Disposition"
-        ] = f'attachment; filename="{fund}_FY{start_fy}_FY{end_fy}.csv"'
-        writer = csv.writer(response)
-        writer.writerow(
-            [
-                "Employee",
-                "Type",
-                "Activity",
-                "Prof Dev Requested",
-                "Prof Dev Spent",
-                "Admin Requested",
-                "Admin Spent",
-                "Total Requested",
-                "Total Spent",
-            ]
+        return csv_response(
+            self.csv_rows(context), f"{fund}_FY{start_fy}_FY{end_fy}.csv"
         )
+
+    def csv_rows(self, context):
+        if self.by_year:
+            yield from self.yearly_csv_rows(context)
+            return
+        totals = context.get("totals")
+        yield [
+            "Employee",
+            "Type",
+            "Activity",
+            "Prof Dev Requested",
+            "Prof Dev Spent",
+            "Admin Requested",
+            "Admin Spent",
+            "Total Requested",
+            "Total Spent",
+        ]
         for e in context["employees"]:
-            writer.writerow(
-                [
-                    f"{e.user.last_name}, {e.user.first_name} Total",
-                    e.get_type_display(),
+            yield [
+                f"{e['name']} Total",
+                e["type"],
+                "",
+                e["profdev_requested"],
+                e["profdev_spent"],
+                e["admin_requested"],
+                e["admin_spent"],
+                e["total_requested"],
+                e["total_spent"],
+            ]
+            for t in e["treqs"]:
+                yield [
+                    e["name"],
                     "",
-                    e.profdev_requested,
-                    e.profdev_spent,
-                    e.admin_requested,
-                    e.admin_spent,
-                    e.total_requested,
-                    e.total_spent,
+                    t["activity"],
+                    t["profdev_requested"],
+                    t["profdev_spent"],
+                    t["admin_requested"],
+                    t["admin_spent"],
                 ]
-            )
-            for t in context["treq_funds"]:
-                if e.id == t.traveler.id:
-                    writer.writerow(
-                        [
-                            f"{e.user.last_name}, {e.user.first_name}",
-                            "",
-                            t.activity,
-                            t.profdev_requested,
-                            t.profdev_spent,
-                            t.admin_requested,
-                            t.admin_spent,
-                        ]
-                    )
-
-        writer.writerow(
-            [
-                "Totals",
-                "",
-                "",
-                totals["profdev_requested"],
-                totals["profdev_spent"],
-                totals["admin_requested"],
-                totals["admin_spent"],
-                totals["total_requested"],
-                totals["total_spent"],
+
+        yield [
+            "Totals",
+            "",
+            "",
+            totals["profdev_requested"],
+            totals["profdev_spent"],
+            totals["admin_requested"],
+            totals["admin_spent"],
+            totals["total_requested"],
+            totals["total_spent"],
+        ]
+
+    def yearly_csv_rows(self, context):
+        metrics = FUND_YEARLY_METRICS
+        years = context["totals"].keys()
+        yield ["Employee", "Type", *yearly_headings(years, metrics)]
+        for e in context["employees"]:
+            yield [
+                f"{e.user.last_name}, {e.user.first_name}",
+                e.get_type_display(),
+                *yearly_cells(e.years, metrics),
             ]
-        )
-        return response
+        yield ["Totals", "", *yearly_cells(context["totals"], metrics)]
 
 
 class FundListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
@@ -483,14 +547,16 @@ class FundListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
     redirect_field_name = "next"
 
     def test_func(self):
-        return self.request.user.employee.has_full_report_access()
+        return self.request.access.full_access
 
     def get_queryset(self):
-        if self.request.user.employee.has_full_report_access():
+        if self.request.access.full_access:
             funds = Fund.objects.all()
         else:
-            funds = Fund.objects.filter(manager=self.request.user.employee)
-        return funds.order_by("unit__name", "account", "cost_center", "fund")
+            funds = Fund.objects.filter(manager=self.request.access.employee)
+        return funds.select_related("unit", "manager__user").order_by(
+            "unit__name", "account", "cost_center", "fund"
+        )
 
     def get_context_data(self, *args, **kwargs):
         context = super().get_context_data(*args, **kwargs)
@@ -507,10 +573,8 @@ class EmployeeTypeListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
     template_name = "terra/employee_type_list.html"
 
     def test_func(self):
-        return (
-            self.request.user.employee.has_full_report_access()
-            or self.request.user.employee.is_UL()
-        )
+        access = self.request.access
+        return access.full_access or access.is_ul
 
     def get_context_data(self, *args, **kwargs):
         context = super().get_context_data(*args, **kwargs)
@@ -518,13 +582,11 @@ class EmployeeTypeListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
         end_fy = fiscal_year(fiscal_year=self.kwargs["end_year"])
         context["start_fy"] = self.kwargs["start_year"]
         context["end_fy"] = self.kwargs["end_year"]
-        id_list = []
-        for employee in Employee.objects.all():
-            id_list.append(employee.id)
         context["merge"] = merge_data_type(
-            employee_ids=id_list,
+            employee_ids=Employee.objects.values_list("pk", flat=True),
             start_date=start_fy.start.date(),
             end_date=end_fy.end.date(),
+            use_summary=settings.REPORT_SUMMARIES,
         )
         context["fiscalyear"] = "{} - {}".format(start_fy, end_fy)
         context["fiscal_year_list"] = fiscal_year_list()
@@ -536,82 +598,73 @@ class EmployeeTypeExportView(EmployeeTypeListView):
     def render_to_response(self, context, **response_kwargs):
         start_fy = fiscal_year(fiscal_year=self.kwargs["start_year"])
         end_fy = fiscal_year(fiscal_year=self.kwargs["end_year"])
-        response = HttpResponse(content_type="text/csv")
-        response[
-            "Content-Disposition"
-        ] = f'attachment; filename="Employee_Type_{start_fy}_{end_fy}.csv"'
-        writer = csv.writer(response)
-        writer.writerow(
-            [
-                "Unit",
-                "Unit Manager",
-                "Employee",
-                "Prof Dev Requested",
-                "Prof Dev Spent",
-                "Prof Dev Days Out",
-                "Admin Requested",
-                "Admin Spent",
-                "Admin Days Out",
-                "Total Requested",
-                "Total Spent",
-                "Total Days Out",
-            ]
+        return csv_response(
+            self.csv_rows(context), f"Employee_Type_{start_fy}_{end_fy}.csv"
         )
+
+    def csv_rows(self, context):
+        yield [
+            "Unit",
+            "Unit Manager",
+            "Employee",
+            "Prof Dev Requested",
+            "Prof Dev Spent",
+            "Prof Dev Days Out",
+            "Admin Requested",
+            "Admin Spent",
+            "Admin Days Out",
+            "Total Requested",
+            "Total Spent",
+            "Total Days Out",
+        ]
         for key, value in context["merge"]["type"].items():
-            writer.writerow([])
-            writer.writerow([key])
+            yield []
+            yield [key]
             for employee in value["employees"]:
-                writer.writerow(
-                    [
-                        employee["unit"],
-                        employee["unit_manager"],
-                        employee["name"],
-                        employee["profdev_requested"],
-                        employee["profdev_spent"],
-                        employee["profdev_days_away"],
-                        employee["admin_requested"],
-                        employee["admin_spent"],
-                        employee["admin_days_away"],
-                        employee["total_requested"],
-                        employee["total_spent"],
-                        employee["total_days_ooo"],
-                    ]
-                )
-            writer.writerow(
-                [
-                    "Subtotals",
-                    "",
-                    "",
-                    value["totals"]["profdev_requested"],
-                    value["totals"]["profdev_spent"],
-                    value["totals"]["profdev_days_away"],
-                    value["totals"]["admin_requested"],
-                    value["totals"]["admin_spent"],
-                    value["totals"]["admin_days_away"],
-                    value["totals"]["total_requested"],
-                    value["totals"]["total_spent"],
-                    value["totals"]["total_days_ooo"],
+                yield [
+                    employee["unit"],
+                    employee["unit_manager"],
+                    employee["name"],
+                    employee["profdev_requested"],
+                    employee["profdev_spent"],
+                    employee["profdev_days_away"],
+                    employee["admin_requested"],
+                    employee["admin_spent"],
+                    employee["admin_days_away"],
+                    employee["total_requested"],
+                    employee["total_spent"],
+                    employee["total_days_ooo"],
                 ]
-            )
-        writer.writerow([])
-        writer.writerow([])
-        writer.writerow(
-            [
-                "Totals",
+            yield [
+                "Subtotals",
                 "",
                 "",
-                context["merge"]["all_type_total"]["profdev_requested"],
-                context["merge"]["all_type_total"]["profdev_spent"],
-                context["merge"]["all_type_total"]["profdev_days_away"],
-                context["merge"]["all_type_total"]["admin_requested"],
-                context["merge"]["all_type_total"]["admin_spent"],
-                context["merge"]["all_type_total"]["admin_days_away"],
-                context["merge"]["all_type_total"]["total_requested"],
-                context["merge"]["all_type_total"]["total_spent"],
-                context["merge"]["all_type_total"]["total_days_ooo"],
+                value["totals"]["profdev_requested"],
+                value["totals"]["profdev_spent"],
+                value["totals"]["profdev_days_away"],
+                value["totals"]["admin_requested"],
+                value["totals"]["admin_spent"],
+                value["totals"]["admin_days_away"],
+                value["totals"]["total_requested"],
+                value["totals"]["total_spent"],
+                value["totals"]["total_days_ooo"],
             ]
-        )
-        return response
+        yield []
+        yield []
+        yield [
+            "Totals",
+            "",
+            "",
+            context["merge"]["all_type_total"]["profdev_requested"],
+            context["merge"]["all_type_total"]["profdev_spent"],
+            context["merge"]["all_type_total"]["profdev_days_away"],
+            context["merge"]["all_type_total"]["admin_requested"],
+            context["merge"]["all_type_total"]["admin_spent"],
+            context["merge"]["all_type_total"]["admin_days_away"],
+            context["merge"]["all_type_total"]["total_requested"],
+            context["merge"]["all_type_total"]["total_spent"],
+            context["merge"]["all_type_total"]["total_days_ooo"],
+        ]
 
 
 class ActualExpenseListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
@@ -622,8 +675,7 @@ class ActualExpenseListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
     redirect_field_name = "next"
 
     def test_func(self):
-        if self.request.user.employee.has_full_report_access():
-            return True
+        return self.request.access.full_access
 
     def get_context_data(self, *args, **kwargs):
 
@@ -632,14 +684,11 @@ class ActualExpenseListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
         end_fy = fiscal_year(fiscal_year=self.kwargs["end_year"])
         context["start_fy"] = self.kwargs["start_year"]
         context["end_fy"] = self.kwargs["end_year"]
-        context["report"] = get_subunits_and_employees(Unit.objects.get(pk=1))
-        context["actualexpenses"] = ActualExpense.objects.filter(
-            date_paid__gte=start_fy.start.date(), date_paid__lte=end_fy.end.date()
-        )
-        context["unit_totals"] = unit_report(
-            unit=(Unit.objects.get(pk=1)),
+        context["report"] = actual_expense_report(
+            unit=Unit.objects.get(pk=1),
             start_date=start_fy.start.date(),
             end_date=end_fy.end.date(),
+            use_summary=settings.REPORT_SUMMARIES,
         )
         context["fiscalyear"] = "{} - {}".format(start_fy, end_fy)
         context["fiscal_year_list"] = fiscal_year_list()
@@ -648,148 +697,123 @@ class ActualExpenseListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
 
 class ActualExpenseExportView(ActualExpenseListView):
     def render_to_response(self, context, **response_kwargs):
-
-        response = HttpResponse(content_type="text/csv")
         start_fy = fiscal_year(fiscal_year=self.kwargs["start_year"])
         end_fy = fiscal_year(fiscal_year=self.kwargs["end_year"])
-        response[
-            "Content-Disposition"
-        ] = f'attachment; filename="Actual_Expense_report_{start_fy}_{end_fy}.csv"'
-        writer = csv.writer(response)
-        writer.writerow(
-            [
-                "AUL",
-                "Department",
-                "Department Manager",
-                "UID",
-                "Employee",
-                "Type",
-                "Activity",
-                "Departure Date",
-                "Return Date",
-                "Days Out",
-                "Date Paid",
-                "Closed",
-                "Reimbursed",
-                "Fund",
-                "Amount",
-                "Employee Total",
-            ]
+        return csv_response(
+            self.csv_rows(context), f"Actual_Expense_report_{start_fy}_{end_fy}.csv"
         )
+
+    def csv_rows(self, context):
+        yield [
+            "AUL",
+            "Department",
+            "Department Manager",
+            "UID",
+            "Employee",
+            "Type",
+            "Activity",
+            "Departure Date",
+            "Return Date",
+            "Days Out",
+            "Date Paid",
+            "Closed",
+            "Reimbursed",
+            "Fund",
+            "Amount",
+            "Employee Total",
+        ]
         for v in context["report"]["subunits"].values():
-            writer.writerow([])
+            yield []
             for e in v["employees"].values():
-                for actualexpense in context["actualexpenses"]:
-                    if actualexpense.treq.traveler == e:
-                        if v["subunit"].manager.type == "EXEC":
-                            writer.writerow(
-                                [
-                                    v["subunit"].manager,
-                                    actualexpense.treq.traveler.unit,
-                                    actualexpense.treq.traveler.unit.manager,
-                                    actualexpense.treq.traveler.uid,
-                                    actualexpense.treq.traveler,
-                                    actualexpense.treq.traveler.get_type_display(),
-                                    actualexpense.treq.activity,
-                                    actualexpense.treq.departure_date,
-                                    actualexpense.treq.return_date,
-                                    actualexpense.treq.days_ooo,
-                                    actualexpense.date_paid,
-                                    actualexpense.treq.closed,
-                                    actualexpense.reimbursed,
-                                    actualexpense.fund,
-                                    actualexpense.total,
-                                ]
-                            )
-                        elif v["subunit"].manager.type != "EXEC":
-                            writer.writerow(
-                                [
-                                    "",
-                                    actualexpense.treq.traveler.unit,
-                                    actualexpense.treq.traveler.unit.manager,
-                                    actualexpense.treq.traveler.uid,
-                                    actualexpense.treq.traveler,
-                                    actualexpense.treq.traveler.get_type_display(),
-                                    actualexpense.treq.activity,
-                                    actualexpense.treq.departure_date,
-                                    actualexpense.treq.return_date,
-                                    actualexpense.treq.days_ooo,
-                                    actualexpense.date_paid,
-                                    actualexpense.treq.closed,
-                                    actualexpense.reimbursed,
-                                    actualexpense.fund,
-                                    actualexpense.total,
-                                ]
-                            )
-
-                for subunit in context["unit_totals"]["subunits"].values():
-                    for employee in subunit["employees"].values():
-                        if employee == e and employee.data["total_spent"] != 0:
-                            writer.writerow(
-                                [
-                                    "",
-                                    "",
-                                    "",
-                                    "",
-                                    f"{employee} ({employee.get_type_display()}) Total",
-                                    "",
-                                    "",
-                                    "",
-                                    "",
-                                    "",
-                                    "",
-                                    "",
-                                    "",
-                                    "",
-                                    "",
-                                    employee.data["total_spent"],
-                                ]
-                            )
-                            writer.writerow([])
-        writer.writerow(
-            [
-                "Library Total",
-                "",
-                "",
-                "",
-                "",
-                "",
-                "",
-                "",
-                "",
-                "",
-                "",
-                "",
-                "",
-                "",
-                "",
-                context["unit_totals"]["unit_totals"]["total_spent"],
-            ]
-        )
-
-        return response
+                for actualexpense in e.expenses:
+                    yield [
+                        (
+                            v["subunit"].manager
+                            if v["subunit"].manager.type == "EXEC"
+                            else ""
+                        ),
+                        actualexpense["unit"],
+                        actualexpense["unit_manager"],
+                        actualexpense["uid"],
+                        actualexpense["traveler"],
+                        actualexpense["type"],
+                        actualexpense["activity"],
+                        actualexpense["departure_date"],
+                        actualexpense["return_date"],
+                        actualexpense["days_ooo"],
+                        actualexpense["date_paid"],
+                        actualexpense["closed"],
+                        actualexpense["reimbursed"],
+                        actualexpense["fund"],
+                        actualexpense["total"],
+                    ]
+                if e.data["total_spent"] != 0:
+                    yield [
+                        "",
+                        "",
+                        "",
+                        "",
+                        f"{e} ({e.get_type_display()}) Total",
+                        "",
+                        "",
+                        "",
+                        "",
+                        "",
+                        "",
+                        "",
+                        "",
+                        "",
+                        "",
+                        e.data["total_spent"],
+                    ]
+                    yield []
+        yield [
+            "Library Total",
+            "",
+            "",
+            "",
+            "",
+            "",
+            "",
+            "",
+            "",
+            "",
+            "",
+            "",
+            "",
+            "",
+            "",
+            context["report"]["unit_totals"]["total_spent"],
+        ]
 
 
 class UnitOrgExportView(UnitDetailView):
     def test_func(self):
-        return self.request.user.employee.has_full_report_access()
+        return self.request.access.full_access
 
     def render_to_response(self, context, **response_kwargs):
         unit = context.get("unit")
         start_fy = fiscal_year(fiscal_year=self.kwargs["start_year"])
         end_fy = fiscal_year(fiscal_year=self.kwargs["end_year"])
-        response = HttpResponse(content_type="text/csv")
-        response[
-            "Content-Disposition"
-        ] = f'attachment; filename="{unit}_Org_Chart_{start_fy}_{end_fy}.csv"'
-        writer = csv.writer(response)
-        writer.writerow(["Employee", "Email", "Supervisor", "Department"])
-        for subunit in context["report"]["subunits"].values():
-            writer.writerow([])
-            writer.writerow([subunit["subunit"]])
-            for employee in subunit["employees"].values():
-                writer.writerow(
-                    [employee, employee.user.email, employee.supervisor, employee.unit]
-                )
+        return csv_response(
+            self.csv_rows(context), f"{unit}_Org_Chart_{start_fy}_{end_fy}.csv"
+        )
 
-        return response
+    def csv_rows(self, context):
+        subunits = context["report"]["subunits"].values()
+        employees = [e for s in subunits for e in s["employees"].values()]
+        supervisors = Employee.objects.select_related("user").in_bulk(
+            {e.supervisor_id for e in employees} - {None}
+        )
+        units = Unit.objects.in_bulk({e.unit_id for e in employees})
+        yield ["Employee", "Email", "Supervisor", "Department"]
+        for subunit in subunits:
+            yield []
+            yield [subunit["subunit"]]
+            for employee in subunit["employees"].values():
+                yield [
+                    employee,
+                    employee.user.email,
+                    supervisors.get(employee.supervisor_id),
+                    units[employee.unit_id],
+                ]